@@ -2,14 +2,21 @@ __version__ = "0.3.2"
 
 import os
 import os.path
+import sys
+import signal
 import ctypes
 import shutil
 import argparse
 import contextlib
 
 from heroed.editor import Editor
+from heroed.index import QueryError
 from heroed import hero
-from heroed.ui import UI
+import heroed.cli
+import heroed.project
+import heroed.journal
+import heroed.autosave
+import heroed.watcher
 
 DEFAULT_MOD_NAME = "MY FIRST MOD"
 
@@ -38,6 +45,37 @@ def handle_init_exceptions(parser):
         raise
 
 
+def recover_journal(editor):
+    """If the last session didn't end well, offer to recover its unsaved
+    modifications from the journal"""
+    romfile = editor.hero_ed_rom.name
+    filename = heroed.journal.journal_filename(romfile)
+    if not os.path.isfile(filename):
+        return
+    try:
+        journal_data = heroed.journal.read_journal(filename)
+    except heroed.journal.JournalError:
+        return
+    if not journal_data.records:
+        return
+    if journal_data.rom_sha1 != heroed.project.rom_sha1(romfile):
+        print(
+            "The ROM file has been modified after the last session, its "
+            "journal is ignored."
+        )
+        return
+    answer = input(
+        "The last session didn't end well. Recover its unsaved modifications "
+        "(%d screens%s)? (y/N) "
+        % (
+            len(journal_data.screens),
+            ", level layout" if journal_data.layout else "",
+        )
+    )
+    if answer.strip().lower() == "y":
+        heroed.journal.replay_journal(editor, journal_data)
+
+
 class ArgumentParserExcept(argparse.ArgumentParser):
     def error(self, message):
         """raise exception instead of exiting
@@ -47,54 +85,252 @@ class ArgumentParserExcept(argparse.ArgumentParser):
 
 
 def main_editor():
+    if len(sys.argv) > 1 and sys.argv[1] in heroed.cli.COMMANDS:
+        sys.exit(heroed.cli.main(sys.argv[1:]))
+
+    # the command line tools don't need the UI (nor blessed)
+    from heroed.ui import UI
+    from heroed.ui.graphics import PROTOCOLS as GRAPHICS_PROTOCOLS
+    from heroed.ui.output import FRAME_BUDGET
+
     parser = ArgumentParserExcept(
         "heroed",
         description="HEROED - MSX H.E.R.O. Editor",
+        epilog="There are also some command line tools: %s. Run "
+        "'heroed <command> -h' to learn more."
+        % ", ".join(heroed.cli.COMMANDS),
     )
     parser.add_argument(
-        "romfile", metavar="romfile", help="The MSX H.E.R.O. ROM file to edit"
+        "romfile",
+        metavar="romfile",
+        help="The MSX H.E.R.O. ROM file to edit, or a %s project file"
+        % heroed.project.PROJECT_EXTENSION,
     )
     parser.add_argument(
         "-v", "--version", action="version", version=__version__
     )
+    parser.add_argument(
+        "--autosave-interval",
+        type=int,
+        default=heroed.autosave.AUTOSAVE_INTERVAL,
+        metavar="SECONDS",
+        help="autosave the unsaved modifications to a project file every "
+        "SECONDS (default %d, 0 disables autosave)"
+        % heroed.autosave.AUTOSAVE_INTERVAL,
+    )
+    parser.add_argument(
+        "--autosave-edits",
+        type=int,
+        default=heroed.autosave.AUTOSAVE_EDITS,
+        metavar="N",
+        help="also autosave after N modifications (default %d)"
+        % heroed.autosave.AUTOSAVE_EDITS,
+    )
+
+    parser.add_argument(
+        "--true-color",
+        action="store_true",
+        help="draw the other screens (level view, prior and next screens "
+        "and browser) with the real MSX palette, in 24-bit color",
+    )
+    parser.add_argument(
+        "--graphics",
+        choices=GRAPHICS_PROTOCOLS,
+        help="also show an image of the screen, with sixel or kitty "
+        "graphics, if the terminal is large enough",
+    )
+    parser.add_argument(
+        "--low-bandwidth",
+        action="store_true",
+        help="send only the changes of the screen, for slow remote "
+        "sessions, and show the bytes sent for each keystroke",
+    )
+    parser.add_argument(
+        "--frame-budget",
+        type=int,
+        default=FRAME_BUDGET,
+        metavar="BYTES",
+        help="in the low bandwidth mode, send at most BYTES at once, and "
+        "the rest when no key is pressed (default %d, 0 is unlimited)"
+        % FRAME_BUDGET,
+    )
 
     with handle_init_exceptions(parser):
         args = parser.parse_args()
+        if args.low_bandwidth and args.graphics:
+            parser.error("--graphics can't be used with --low-bandwidth")
         if not os.path.isfile(args.romfile):
             raise FileNotFoundError('"%s" file not found' % args.romfile)
-        editor = Editor(open(args.romfile, "r+b"))
-        ui = UI()
+        if args.romfile.lower().endswith(heroed.project.PROJECT_EXTENSION):
+            project_file = args.romfile
+            project = heroed.project.load_project(project_file)
+            editor = Editor(open(project.romfile, "r+b"))
+            state = heroed.project.restore_project(editor, project)
+        else:
+            project_file = heroed.project.project_filename(args.romfile)
+            editor = Editor(open(args.romfile, "r+b"))
+            state = heroed.project.EditorState()
+        recover_journal(editor)
+        ui = UI(
+            true_color=args.true_color,
+            graphics=args.graphics,
+            low_bandwidth=args.low_bandwidth,
+            frame_budget=args.frame_budget,
+        )
 
     ui.version = __version__
     # fmt: off
-    if (message_0 := editor.read_title_screen_message(0)) ==\
+    if (message_0 := editor.get_title_screen_message(0)) ==\
             hero.TITLE_SCREEN_MESSAGE_0:
         ui.mod_name = DEFAULT_MOD_NAME
     else:
         ui.mod_name = message_0[10:25].rstrip()
     # fmt: on
 
+    def level_screens():
+        """returns the screens of the level of the selected screen"""
+        level, _ = hero.get_levelscr_from_absscr(
+            editor.selected_screen,
+            editor.level_initial_screens,
+            editor.level_screen_count,
+        )
+        if level is None:
+            return ()
+        initial_screen = editor.level_initial_screens[level - 1]
+        return tuple(
+            range(
+                initial_screen,
+                initial_screen + editor.level_screen_count[level - 1],
+            )
+        )
+
+    def update_minimap(reload=False):
+        """show the level of the selected screen in the minimap, reading
+        its screens if the level has changed (or reload)"""
+        screens = level_screens()
+        if reload or screens != ui.minimap.screens:
+            ui.minimap.set_level(
+                [(n, editor.get_screen_data(n)) for n in screens]
+            )
+        ui.minimap.select(editor.selected_screen)
+
     def on_selected_screen_changed():
         ui.screen_number = editor.selected_screen
         ui.set_screen_data(editor.screen_data, editor.prior_screen_data)
+        update_minimap()
 
     def on_level_layout_changed():
         ui.set_level_layout(
             editor.level_initial_screens, editor.level_screen_count
         )
+        if editor.selected_screen is not None:
+            update_minimap(reload=True)
+        errors = [
+            issue for issue in editor.check_level_layout() if issue.is_error
+        ]
+        if errors and ui.confirm_message(
+            ("Level layout %s" % str(errors[0]))[:60] + ". Repair?"
+        ):
+            editor.repair_level_layout()
 
     editor.signals.connect(
         "selected_screen_changed", on_selected_screen_changed
     )
     editor.signals.connect("level_layout_changed", on_level_layout_changed)
+    editor.signals.connect("screen_modified", ui.minimap.update_screen)
+    editor.signals.connect("screen_modified", ui.neighbours.update_screen)
+    ui.neighbours.get_screen_data = editor.get_screen_data
+
+    # screens copied with C, as a list of 8 slices of the screens tables
+    clipboard = []
+
+    def input_screen_count(message):
+        """ask for a number of screens, returns 0 if cancelled"""
+        count = ui.input(message, default="1", max_length=3)
+        if count.isnumeric() and 1 <= int(count) <= 256:
+            return int(count)
+        return 0
+
+    # last search, and the screens that matched it
+    search = {"query": "", "matches": []}
+
+    def go_to_match(forward=True):
+        matches = search["matches"]
+        if not matches:
+            ui.information_message("No matching screens")
+            return
+        if forward:
+            following = [n for n in matches if n > editor.selected_screen]
+            editor.selected_screen = (following or matches)[0]
+        else:
+            previous = [n for n in matches if n < editor.selected_screen]
+            editor.selected_screen = (previous or matches)[-1]
+        ui.information_message(
+            "Match %d/%d"
+            % (matches.index(editor.selected_screen) + 1, len(matches)),
+            timeout=1,
+        )
+
+    def editor_state():
+        return heroed.project.EditorState(
+            editor.selected_screen, *ui.get_cursors()
+        )
+
+    autosave = None
+    if args.autosave_interval > 0:
+        autosave = heroed.autosave.Autosave(
+            editor,
+            editor_state,
+            args.autosave_interval,
+            args.autosave_edits,
+        )
+
+    def reload_rom_file():
+        """reload the ROM file, modified by another program"""
+        editor.screen_data = ui.screen_data
+        reloaded_screens, conflicts = editor.reload_file()
+        # closing the file to reopen it is also a modification
+        watcher.reset()
+        update_minimap(reload=True)
+        ui.neighbours.reload()
+        sha1 = heroed.project.rom_sha1(editor.hero_ed_rom.name)
+        journal.clear(sha1)
+        journal.append_editor(editor)
+        if autosave:
+            autosave.rom_changed()
+        if conflicts:
+            ui.information_message(
+                "ROM file reloaded: %d screens, %d conflicts (kept yours)"
+                % (len(reloaded_screens), len(conflicts))
+            )
+        elif reloaded_screens:
+            ui.information_message(
+                "ROM file reloaded: %d screens" % len(reloaded_screens)
+            )
+
+    # reload the ROM file when it's modified by another program
+    watcher = heroed.watcher.FileWatcher(editor.hero_ed_rom.name)
+
+    # a terminal disconnect exits (so the journal is synced)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: sys.exit(1))
 
     # run main loop
-    with ui.run():
+    with ui.run(), heroed.journal.journaling(editor) as journal:
         on_level_layout_changed()
-        editor.selected_screen = 0
+        editor.selected_screen = state.selected_screen
+        ui.set_cursors(state.mode, state.terrain_cursor, state.objects_cursor)
         while True:
-            keystroke = ui.process_keystroke()
+            if autosave:
+                autosave.update()
+            if watcher.changed():
+                reload_rom_file()
+            keystroke = ui.process_keystroke(
+                timeout=heroed.watcher.POLL_INTERVAL
+            )
             if not keystroke:
+                # store (and journal) the edits of the screen
+                editor.screen_data = ui.screen_data
                 continue
 
             if keystroke.lower() == "q":
@@ -137,10 +373,15 @@ def main_editor():
                 editor.screen_data = ui.screen_data
                 editor.save_modified_screens_to_file()
                 editor.save_level_layout_to_file()
-                editor.write_title_screen_message(
-                    0, "H.E.R.O.tm%s=HEROED" % ui.mod_name.ljust(15)
+                editor.set_title_screen_message(
+                    0, hero.mod_title_screen_message(ui.mod_name)
                 )
+                editor.save_title_screen_messages_to_file()
                 editor.hero_ed_rom.flush()
+                watcher.reset()
+                journal.clear(heroed.project.rom_sha1(editor.hero_ed_rom.name))
+                if autosave:
+                    autosave.rom_saved()
                 ui.information_message("===========  Saved!  ===========")
 
             elif keystroke.lower() == "h":
@@ -158,10 +399,128 @@ def main_editor():
                     char if char in hero.HERO_TO_ASCII else " "
                     for char in ui.mod_name
                 )
+                editor.set_title_screen_message(
+                    0, hero.mod_title_screen_message(ui.mod_name)
+                )
                 ui.draw_mod_name()
 
+            elif keystroke.lower() == "f":
+                # Find screens by attributes
+                query = ui.input(
+                    "Find:", default=search["query"], max_length=40
+                )
+                if query:
+                    editor.screen_data = ui.screen_data
+                    try:
+                        matches = editor.screen_index.query(query)
+                    except QueryError as err:
+                        ui.information_message("Invalid search: %s" % err)
+                    else:
+                        search["query"] = query
+                        search["matches"] = matches
+                        go_to_match()
+
+            elif keystroke in (".", ","):
+                editor.screen_data = ui.screen_data
+                go_to_match(forward=keystroke == ".")
+
+            elif keystroke.lower() == "c":
+                # Copy screens, from the current one
+                count = input_screen_count("Number of screens to copy:")
+                if count:
+                    editor.screen_data = ui.screen_data
+                    clipboard[:] = editor.copy_screens(
+                        editor.selected_screen, count
+                    )
+                    ui.information_message(
+                        "%d screens copied" % len(clipboard[0])
+                    )
+
+            elif keystroke.lower() in ("v", "i") and clipboard:
+                # Paste (overwrite) or insert the copied screens
+                editor.screen_data = ui.screen_data
+                if keystroke.lower() == "v":
+                    editor.paste_screens(editor.selected_screen, clipboard)
+                elif ui.confirm_message(
+                    "Insert %d screens? The last ones will be lost"
+                    % len(clipboard[0])
+                ):
+                    editor.insert_screens(editor.selected_screen, clipboard)
+
+            elif keystroke.lower() == "d":
+                # Delete screens, from the current one
+                count = input_screen_count("Number of screens to delete:")
+                if count and ui.confirm_message(
+                    "Delete %d screens from screen %d?"
+                    % (count, editor.selected_screen)
+                ):
+                    editor.screen_data = ui.screen_data
+                    if not editor.delete_screens(
+                        editor.selected_screen, count
+                    ):
+                        ui.information_message(
+                            "A level can't lose all its screens"
+                        )
+
+            elif keystroke.lower() == "k":
+                # Compact the levels, moving the free screens to the end
+                if ui.confirm_message("Move all the free screens to the end?"):
+                    editor.screen_data = ui.screen_data
+                    reclaimed = editor.compact_level_layout()
+                    if reclaimed is None:
+                        ui.information_message(
+                            "The level layout must be repaired first"
+                        )
+                    else:
+                        ui.information_message(
+                            "%d free screens reclaimed" % reclaimed
+                        )
+
+            elif keystroke.lower() == "u":
+                editor.screen_data = ui.screen_data
+                if not editor.undo():
+                    ui.information_message("Nothing to undo")
+
+            elif keystroke.lower() == "p":
+                # Save the project, to continue later
+                editor.screen_data = ui.screen_data
+                heroed.project.save_project(
+                    project_file, editor, editor_state()
+                )
+                ui.information_message(
+                    "Project saved to %s" % os.path.basename(project_file)
+                )
+
+            elif keystroke.lower() == "l":
+                # Show the level as a continuous strip
+                editor.screen_data = ui.screen_data
+                screens = level_screens()
+                if not screens:
+                    ui.information_message(
+                        "The screen doesn't belong to any level"
+                    )
+                else:
+                    screen_number = ui.show_level_view(
+                        screens, editor.get_screen_data, editor.selected_screen
+                    )
+                    if screen_number is not None:
+                        editor.selected_screen = screen_number
+
+            elif keystroke.lower() == "b":
+                # Browse the screens
+                editor.screen_data = ui.screen_data
+                screen_number = ui.show_browser(
+                    editor.screens_tables(), editor.selected_screen
+                )
+                if screen_number is not None:
+                    editor.selected_screen = screen_number
+
             elif keystroke.lower() == "z":
                 editor.define_current_screen_as_initial()
 
             elif keystroke.lower() == "x":
                 editor.define_current_screen_as_final()
+
+    watcher.close()
+    if autosave:
+        autosave.stop()
@@ -0,0 +1,218 @@
+"""Render the 256 screens to an atlas image: a 16x16 grid, in screen order.
+
+The screens are separated by lines (of one cell), white where the
+neighbour screen belongs to another level, and the tiles of the initial and
+final screens of the levels are marked at their top left corner (green and
+red). The tiles are rendered by heroed.render in a process pool, and
+copied into a single buffer of cells through memoryviews, whose rows are
+written to the image without copying them again.
+
+In incremental mode, the tiles are cached in a file next to the image,
+with the data they're rendered from (the screen, its prior screen and its
+place in the level layout), so only the screens changed since the last
+atlas are rendered again.
+"""
+
+import os
+import concurrent.futures
+
+from heroed import hero
+import heroed.render
+from heroed.render import SCREEN_ROWS, SCREEN_COLUMNS
+
+GRID = 16
+CACHE_SUFFIX = ".cache"
+CACHE_MAGIC = b"HEROEDA\x00"
+# screen data, prior screen data, level, level screen, initial and final
+TILE_KEY_SIZE = 20
+TILE_SIZE = SCREEN_ROWS * SCREEN_COLUMNS
+
+SEPARATOR = heroed.render.BLACK
+LEVEL_SEPARATOR = 15  # white
+INITIAL_MARK = 3  # light green
+FINAL_MARK = 9  # light red
+MARK_ROWS = 2
+MARK_COLUMNS = 4
+
+ROW_CELLS = GRID * (SCREEN_COLUMNS + 1) + 1
+ATLAS_ROWS = GRID * (SCREEN_ROWS + 1) + 1
+
+
+def cache_filename(imagefile):
+    return imagefile + CACHE_SUFFIX
+
+
+def tile_key(screen_number, tables, level_initial_screens, level_screen_count):
+    """returns the bytes that a tile is rendered from"""
+    level, levelscr = hero.get_levelscr_from_absscr(
+        screen_number, level_initial_screens, level_screen_count
+    )
+    return (
+        bytes(table[screen_number] for table in tables)
+        + (
+            bytes(table[screen_number - 1] for table in tables)
+            if screen_number > 0
+            else bytes(8)
+        )
+        + bytes(
+            (
+                level or 0,
+                levelscr or 0,
+                screen_number in level_initial_screens,
+                screen_number
+                in hero.final_screens(
+                    level_initial_screens, level_screen_count
+                ),
+            )
+        )
+    )
+
+
+def _render_tiles(tasks, level_initial_screens, level_screen_count):
+    """render tiles in a worker process. tasks is a list of (screen_number,
+    tile_key), returns a list of (screen_number, tile bytes)"""
+    tiles = []
+    for screen_number, key in tasks:
+        cells = heroed.render.screen_cells(
+            screen_number,
+            key[:8],
+            key[8:16] if screen_number > 0 else None,
+            level_initial_screens,
+            level_screen_count,
+        )
+        tiles.append((screen_number, b"".join(cells)))
+    return tiles
+
+
+def read_cache(filename):
+    """returns a dict {screen number: (tile key, tile bytes)}, empty if the
+    cache file doesn't exist or is not valid"""
+    record_size = TILE_KEY_SIZE + TILE_SIZE
+    try:
+        with open(filename, "rb") as f:
+            data = f.read()
+    except OSError:
+        return {}
+    if (
+        not data.startswith(CACHE_MAGIC)
+        or len(data) != len(CACHE_MAGIC) + 256 * record_size
+    ):
+        return {}
+    view = memoryview(data)[len(CACHE_MAGIC) :]
+    cache = {}
+    for screen_number in range(256):
+        record = view[screen_number * record_size :]
+        cache[screen_number] = (
+            bytes(record[:TILE_KEY_SIZE]),
+            record[TILE_KEY_SIZE:record_size],
+        )
+    return cache
+
+
+def write_cache(filename, tiles):
+    """tiles is a dict {screen number: (tile key, tile bytes)}"""
+    with open(filename, "wb") as f:
+        f.write(CACHE_MAGIC)
+        for screen_number in range(256):
+            f.writelines(tiles[screen_number])
+
+
+def render_tiles(editor, cache=None, jobs=None):
+    """returns a dict {screen number: (tile key, tile bytes)}, and the number
+    of tiles rendered. The tiles of the cache with the same key are not
+    rendered again."""
+    tables = editor.screens_tables()
+    layout = (editor.level_initial_screens, editor.level_screen_count)
+    tiles = {}
+    tasks = []
+    for screen_number in range(256):
+        key = tile_key(screen_number, tables, *layout)
+        if cache and cache[screen_number][0] == key:
+            tiles[screen_number] = cache[screen_number]
+        else:
+            tasks.append((screen_number, key))
+    keys = dict(tasks)
+
+    if jobs == 1 or len(tasks) <= GRID:
+        results = [_render_tiles(tasks, *layout)]
+    else:
+        chunks = [tasks[n : n + GRID] for n in range(0, len(tasks), GRID)]
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = executor.map(
+                _render_tiles,
+                chunks,
+                *([item] * len(chunks) for item in layout)
+            )
+            results = list(results)
+    for result in results:
+        for screen_number, tile in result:
+            tiles[screen_number] = (keys[screen_number], tile)
+    return tiles, len(tasks)
+
+
+def _screen_level(screen_number, level_initial_screens, level_screen_count):
+    return hero.get_levelscr_from_absscr(
+        screen_number, level_initial_screens, level_screen_count
+    )[0]
+
+
+def assemble_atlas(editor, tiles):
+    """returns the cell rows of the atlas, as memoryviews of one buffer"""
+    layout = (editor.level_initial_screens, editor.level_screen_count)
+    levels = [_screen_level(n, *layout) for n in range(256)]
+    final_screens = hero.final_screens(*layout)
+    atlas = bytearray((SEPARATOR,)) * (ATLAS_ROWS * ROW_CELLS)
+    view = memoryview(atlas)
+
+    for screen_number in range(256):
+        grid_y, grid_x = divmod(screen_number, GRID)
+        x = grid_x * (SCREEN_COLUMNS + 1) + 1
+        y = grid_y * (SCREEN_ROWS + 1) + 1
+        tile = memoryview(tiles[screen_number][1])
+        for row in range(SCREEN_ROWS):
+            offset = (y + row) * ROW_CELLS + x
+            view[offset : offset + SCREEN_COLUMNS] = tile[
+                row * SCREEN_COLUMNS : (row + 1) * SCREEN_COLUMNS
+            ]
+
+        # level boundaries at the right and below
+        level = levels[screen_number]
+        if grid_x < GRID - 1 and levels[screen_number + 1] != level:
+            for row in range(y - 1, y + SCREEN_ROWS + 1):
+                atlas[row * ROW_CELLS + x + SCREEN_COLUMNS] = LEVEL_SEPARATOR
+        if grid_y < GRID - 1 and levels[screen_number + GRID] != level:
+            offset = (y + SCREEN_ROWS) * ROW_CELLS + x - 1
+            view[offset : offset + SCREEN_COLUMNS + 2] = bytes(
+                (LEVEL_SEPARATOR,)
+            ) * (SCREEN_COLUMNS + 2)
+
+        # initial and final screens marks
+        mark = None
+        if screen_number in layout[0]:
+            mark = INITIAL_MARK
+        elif screen_number in final_screens:
+            mark = FINAL_MARK
+        if mark is not None:
+            for row in range(y, y + MARK_ROWS):
+                offset = row * ROW_CELLS + x
+                view[offset : offset + MARK_COLUMNS] = (
+                    bytes((mark,)) * MARK_COLUMNS
+                )
+
+    return [
+        view[row * ROW_CELLS : (row + 1) * ROW_CELLS]
+        for row in range(ATLAS_ROWS)
+    ]
+
+
+def export_atlas(editor, imagefile, incremental=False, jobs=None):
+    """write the atlas image, returns the number of tiles rendered"""
+    cachefile = cache_filename(imagefile)
+    cache = None
+    if incremental and os.path.isfile(imagefile):
+        cache = read_cache(cachefile)
+    tiles, rendered = render_tiles(editor, cache, jobs)
+    heroed.render.write_image(imagefile, assemble_atlas(editor, tiles))
+    if incremental:
+        write_cache(cachefile, tiles)
+    return rendered
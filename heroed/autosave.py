@@ -0,0 +1,135 @@
+"""Autosave the unsaved modifications to a project file (see
+heroed.project), next to the ROM file, that can be opened to continue
+editing.
+
+The modifications are counted as the editor emits its signals. After each
+keystroke, the main loop calls Autosave.update(), which takes a snapshot
+(a heroed.project.Project, made of immutable data) if there are new
+modifications. A background thread packs and writes the last snapshot
+every AUTOSAVE_INTERVAL seconds, or as soon as there are AUTOSAVE_EDITS
+new modifications, so the keystrokes never wait for it. Nothing is written
+if there are no new modifications since the last autosave.
+"""
+
+import os
+import threading
+
+import heroed.project
+
+AUTOSAVE_INTERVAL = 60  # seconds
+AUTOSAVE_EDITS = 50
+
+
+def autosave_filename(romfile):
+    return (
+        os.path.splitext(romfile)[0]
+        + ".autosave"
+        + heroed.project.PROJECT_EXTENSION
+    )
+
+
+class Autosave:
+    def __init__(
+        self,
+        editor,
+        get_state,
+        interval=AUTOSAVE_INTERVAL,
+        edits=AUTOSAVE_EDITS,
+    ):
+        """get_state is a function that returns the current
+        heroed.project.EditorState"""
+        self.filename = autosave_filename(editor.hero_ed_rom.name)
+        self._editor = editor
+        self._get_state = get_state
+        self._interval = interval
+        self._edits = edits
+        self._rom_sha1 = heroed.project.rom_sha1(editor.hero_ed_rom.name)
+        # modifications counter, and its value in the last snapshot and in
+        # the last autosave
+        self._modifications = 0
+        self._snapshot_modifications = 0
+        self._saved_modifications = 0
+        self._snapshot = None
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._stopped = False
+        for signal in (
+            "screen_modified",
+            "level_layout_changed",
+            "title_message_modified",
+        ):
+            editor.signals.connect(signal, self._on_modified)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _on_modified(self, *args):
+        self._modifications += 1
+
+    def update(self):
+        """take a snapshot of the modifications, if there are new ones, and
+        wake up the thread if there are enough of them"""
+        if self._modifications == self._snapshot_modifications:
+            return
+        self._snapshot_modifications = self._modifications
+        snapshot = heroed.project.make_project(
+            self.filename, self._editor, self._get_state(), self._rom_sha1
+        )
+        with self._condition:
+            self._snapshot = (self._modifications, snapshot)
+            if self._modifications - self._saved_modifications >= self._edits:
+                self._condition.notify()
+
+    def rom_saved(self):
+        """the ROM file has been saved, so there is nothing to autosave"""
+        self._rom_sha1 = heroed.project.rom_sha1(self._editor.hero_ed_rom.name)
+        with self._write_lock:
+            with self._condition:
+                self._snapshot = None
+                self._saved_modifications = self._modifications
+                self._snapshot_modifications = self._modifications
+            if os.path.isfile(self.filename):
+                os.remove(self.filename)
+
+    def rom_changed(self):
+        """the ROM file has been modified by another program (and reloaded),
+        so the autosave must be written again with its new SHA-1"""
+        if not self._editor.are_there_modifications():
+            self.rom_saved()
+            return
+        self._rom_sha1 = heroed.project.rom_sha1(self._editor.hero_ed_rom.name)
+        self._modifications += 1
+
+    def _pending(self):
+        """if the snapshot has not been written"""
+        return (
+            self._snapshot is not None
+            and self._snapshot[0] != self._saved_modifications
+        )
+
+    def _must_write(self):
+        return self._stopped or (
+            self._pending()
+            and self._snapshot[0] - self._saved_modifications >= self._edits
+        )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(self._must_write, self._interval)
+                if self._stopped and not self._pending():
+                    return
+            with self._write_lock:
+                with self._condition:
+                    if not self._pending():
+                        continue
+                    modifications, project = self._snapshot
+                heroed.project.write_project(self.filename, project)
+                with self._condition:
+                    self._saved_modifications = modifications
+
+    def stop(self):
+        """write the pending snapshot, if any, and stop the thread"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
@@ -0,0 +1,561 @@
+"""Command line tools. These work without the terminal UI:
+
+    heroed <command> [options]
+
+Run "heroed <command> -h" to see the options of each command.
+"""
+
+import os
+import os.path
+import sys
+import signal
+import argparse
+import socketserver
+import concurrent.futures
+
+from heroed.editor import Editor
+from heroed.layout import repair_level_layout
+from heroed import hero
+import heroed.diff
+import heroed.merge
+import heroed.duplicates
+import heroed.levels
+import heroed.render
+import heroed.atlas
+import heroed.patch
+import heroed.rompatch
+
+
+def open_editor(romfile, mode="rb"):
+    if not os.path.isfile(romfile):
+        raise FileNotFoundError('"%s" file not found' % romfile)
+    return Editor(open(romfile, mode))
+
+
+def screen_label(editor, screen_number):
+    """returns a str with the screen number, and its level and level screen"""
+    level, levelscr = hero.get_levelscr_from_absscr(
+        screen_number, editor.level_initial_screens, editor.level_screen_count
+    )
+    if level is None:
+        return "%3d (lost)" % screen_number
+    return "%3d (L%d S%d)" % (screen_number, level, levelscr)
+
+
+def all_screens_data(editor):
+    """returns a list with the data of the 256 screens"""
+    tables = editor.screens_tables()
+    return [bytearray(table[n] for table in tables) for n in range(256)]
+
+
+def dupes(args):
+    """Report duplicated and near-duplicated screens"""
+    editor = open_editor(args.romfile)
+    fingerprints = {
+        screen_number: heroed.duplicates.fingerprint(screen_data)
+        for screen_number, screen_data in enumerate(all_screens_data(editor))
+    }
+
+    print("Duplicated screens:")
+    groups = heroed.duplicates.find_duplicates(fingerprints)
+    for screens in groups:
+        print("  " + ", ".join(screen_label(editor, n) for n in screens))
+    if not groups:
+        print("  None")
+
+    print("Near-duplicated screens (distance <= %d):" % args.distance)
+    pairs = heroed.duplicates.find_near_duplicates(fingerprints, args.distance)
+    for screen_number, other, distance in pairs:
+        print(
+            "  %s ~ %s  distance %d"
+            % (
+                screen_label(editor, screen_number),
+                screen_label(editor, other),
+                distance,
+            )
+        )
+    if not pairs:
+        print("  None")
+    return 0
+
+
+def check(args):
+    """Check the level layout, and optionally repair it"""
+    editor = open_editor(args.romfile, "r+b" if args.repair else "rb")
+    issues = editor.check_level_layout()
+    for issue in issues:
+        print(issue)
+    if not any(issue.is_error for issue in issues):
+        print("The level layout is valid")
+        return 0
+
+    level_initial_screens, level_screen_count = repair_level_layout(
+        editor.level_initial_screens, editor.level_screen_count
+    )
+    print("Proposed level layout:")
+    for level, (initial_screen, screen_count) in enumerate(
+        zip(level_initial_screens, level_screen_count), 1
+    ):
+        print(
+            "  Level %2d: screens %3d-%3d (%d screens)"
+            % (
+                level,
+                initial_screen,
+                initial_screen + screen_count - 1,
+                screen_count,
+            )
+        )
+    if not args.repair:
+        return 1
+    editor.repair_level_layout()
+    editor.save_level_layout_to_file()
+    print("The level layout has been repaired")
+    return 0
+
+
+def apply(args):
+    """Apply a patch to many ROM files, using a process pool"""
+    patch = heroed.patch.load_patch(args.patchfile)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        output_files = [
+            os.path.join(args.output_dir, os.path.basename(romfile))
+            for romfile in args.romfiles
+        ]
+    else:
+        output_files = args.romfiles
+
+    errors = 0
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as executor:
+        futures = {
+            executor.submit(
+                heroed.patch.apply_patch_to_file, patch, romfile, output_file
+            ): romfile
+            for romfile, output_file in zip(args.romfiles, output_files)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                print("Patched %s" % future.result())
+            except (OSError, heroed.patch.PatchError) as err:
+                print("Error patching %s: %s" % (futures[future], err))
+                errors += 1
+    return 1 if errors else 0
+
+
+def _read_rom(romfile):
+    if not os.path.isfile(romfile):
+        raise FileNotFoundError('"%s" file not found' % romfile)
+    with open(romfile, "rb") as f:
+        return bytearray(f.read())
+
+
+def export_patch(args):
+    """Write an IPS or BPS patch with the modifications of a ROM"""
+    source = _read_rom(args.basefile)
+    target = _read_rom(args.romfile)
+    if len(source) != len(target):
+        print("The ROM files have different sizes")
+        return 1
+    outside = sum(
+        a != b
+        for a, b in zip(heroed.rompatch.patch_target(source, target), target)
+    )
+    if outside:
+        print(
+            "Warning: %d modified bytes outside the editable regions are "
+            "not in the patch" % outside
+        )
+    heroed.rompatch.make_patch(args.patchfile, source, target)
+    print("Patch written to %s" % args.patchfile)
+    return 0
+
+
+def import_patch(args):
+    """Apply an IPS or BPS patch to a ROM"""
+    rom = _read_rom(args.romfile)
+    try:
+        heroed.rompatch.apply_patch_file(args.patchfile, rom)
+    except heroed.rompatch.RomPatchError as err:
+        print("Error: %s" % err)
+        return 1
+    output_file = args.output or args.romfile
+    with open(output_file, "wb") as f:
+        f.write(rom)
+    print("Patched ROM written to %s" % output_file)
+    return 0
+
+
+def diff(args):
+    """Report the differences between a ROM and another one, or all the
+    files of a directory"""
+    base = heroed.diff.read_rom_data(args.romfile)
+    if os.path.isdir(args.other):
+        otherfiles = sorted(
+            os.path.join(args.other, name)
+            for name in os.listdir(args.other)
+            if os.path.isfile(os.path.join(args.other, name))
+        )
+    else:
+        otherfiles = [args.other]
+
+    for otherfile in otherfiles:
+        try:
+            other = heroed.diff.read_rom_data(otherfile)
+        except ValueError as err:
+            print(err)
+            continue
+        lines = heroed.diff.format_diff(base, other) or ["no differences"]
+        if len(otherfiles) > 1:
+            print("%s:" % otherfile)
+            lines = ["  " + line for line in lines]
+        for line in lines:
+            print(line)
+    return 0
+
+
+def merge(args):
+    """Merge two modified ROMs against the original one"""
+    base, ours, theirs = (
+        _read_rom(romfile)
+        for romfile in (args.basefile, args.ours, args.theirs)
+    )
+    merged, conflicts, layout_errors = heroed.merge.merge_roms(
+        base, ours, theirs, args.prefer
+    )
+    with open(args.output, "wb") as f:
+        f.write(merged)
+
+    report = ["Merged ROM written to %s" % args.output]
+    if conflicts:
+        report.append(
+            "%d conflicts (using %s values):" % (len(conflicts), args.prefer)
+        )
+        report.extend("  " + str(conflict) for conflict in conflicts)
+    if layout_errors:
+        report.append(
+            "The merged level layout is not valid, repair it with "
+            "'heroed check --repair':"
+        )
+        report.extend("  " + str(issue) for issue in layout_errors)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write("\n".join(report) + "\n")
+    print("\n".join(report))
+    return 1 if conflicts or layout_errors else 0
+
+
+def export_levels(args):
+    """Write the decoded screens to a JSON or TOML file"""
+    editor = open_editor(args.romfile)
+    heroed.levels.export_levels(editor, args.levelsfile)
+    print("Screens written to %s" % args.levelsfile)
+    return 0
+
+
+def import_levels(args):
+    """Read the decoded screens of a JSON or TOML file, and write them to a
+    ROM"""
+    try:
+        patch = heroed.patch.parse_patch(
+            heroed.levels.import_levels(args.levelsfile)
+        )
+        output_file = heroed.patch.apply_patch_to_file(
+            patch, args.romfile, args.output
+        )
+    except (heroed.patch.PatchError, heroed.levels.LevelsFileError) as err:
+        print("Error: %s" % err)
+        return 1
+    print("%d screens written to %s" % (len(patch["screens"]), output_file))
+    return 0
+
+
+def level_map(args):
+    """Render the screens of levels, stacked in flow order, to images"""
+    editor = open_editor(args.romfile)
+    if args.level is None:
+        name, extension = os.path.splitext(args.imagefile)
+        images = [
+            (level, "%s%02d%s" % (name, level, extension))
+            for level in range(1, 21)
+        ]
+    elif 1 <= args.level <= 20:
+        images = [(args.level, args.imagefile)]
+    else:
+        print("Error: the level must be 1 to 20")
+        return 1
+    try:
+        for level, imagefile in images:
+            heroed.render.write_image(
+                imagefile, heroed.render.render_level(editor, level)
+            )
+            print("Level %d written to %s" % (level, imagefile))
+    except heroed.render.ImageFormatError as err:
+        print("Error: %s" % err)
+        return 1
+    return 0
+
+
+def atlas(args):
+    """Render the 256 screens to an atlas image"""
+    editor = open_editor(args.romfile)
+    try:
+        rendered = heroed.atlas.export_atlas(
+            editor, args.imagefile, args.incremental, args.jobs
+        )
+    except heroed.render.ImageFormatError as err:
+        print("Error: %s" % err)
+        return 1
+    print(
+        "Atlas written to %s (%d screens rendered)"
+        % (args.imagefile, rendered)
+    )
+    return 0
+
+
+def serve(args):
+    """Serve the editor over a Unix domain socket with JSON-RPC"""
+    import heroed.server
+    import heroed.journal
+    import heroed.project
+
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        print("Error: Unix domain sockets are not available")
+        return 1
+    journal_file = heroed.journal.journal_filename(args.romfile)
+    if os.path.isfile(journal_file):
+        try:
+            records = heroed.journal.read_journal(journal_file).records
+        except heroed.journal.JournalError:
+            records = 0
+        if records:
+            print(
+                "Error: the last session didn't end well, open the ROM file "
+                "with the editor to recover its unsaved modifications"
+            )
+            return 1
+
+    editor = open_editor(args.romfile, "r+b")
+    socket_file = args.socket or heroed.server.socket_filename(args.romfile)
+    with heroed.journal.journaling(editor) as journal:
+        service = heroed.server.EditorService(
+            editor,
+            on_saved=lambda: journal.clear(
+                heroed.project.rom_sha1(editor.hero_ed_rom.name)
+            ),
+        )
+        with heroed.server.make_server(service, socket_file) as server:
+            print("Serving %s at %s" % (args.romfile, socket_file))
+            # stop it like Ctrl+C
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(socket_file)
+                with service.lock:
+                    modified = editor.are_there_modifications()
+            if modified:
+                print("The unsaved modifications are kept in the journal")
+                # exiting with an exception keeps the journal
+                raise SystemExit(1)
+    return 0
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        "heroed", description="HEROED - MSX H.E.R.O. Editor tools"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sub = subparsers.add_parser(
+        "dupes", help="report duplicated and near-duplicated screens"
+    )
+    sub.add_argument("romfile", help="The MSX H.E.R.O. ROM file")
+    sub.add_argument(
+        "-d",
+        "--distance",
+        type=int,
+        default=4,
+        help="max. different bits of near-duplicated screens (default 4)",
+    )
+    sub.set_defaults(func=dupes)
+
+    sub = subparsers.add_parser(
+        "check", help="check (and repair) the level layout"
+    )
+    sub.add_argument("romfile", help="The MSX H.E.R.O. ROM file")
+    sub.add_argument(
+        "--repair",
+        action="store_true",
+        help="write the proposed level layout to the ROM file",
+    )
+    sub.set_defaults(func=check)
+
+    sub = subparsers.add_parser(
+        "apply", help="apply a JSON patch to many ROM files"
+    )
+    sub.add_argument("patchfile", help="The JSON patch file")
+    sub.add_argument(
+        "romfiles", nargs="+", help="The MSX H.E.R.O. ROM files to patch"
+    )
+    sub.add_argument(
+        "-o",
+        "--output-dir",
+        help="write the patched ROM files to this directory, instead of "
+        "overwriting them",
+    )
+    sub.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of processes (default: number of CPUs)",
+    )
+    sub.set_defaults(func=apply)
+
+    sub = subparsers.add_parser(
+        "export-patch",
+        help="write an IPS or BPS patch with the modifications of a ROM",
+    )
+    sub.add_argument("basefile", help="The original ROM file")
+    sub.add_argument("romfile", help="The modified ROM file")
+    sub.add_argument(
+        "patchfile", help="The patch file to write (.ips or .bps)"
+    )
+    sub.set_defaults(func=export_patch)
+
+    sub = subparsers.add_parser(
+        "import-patch", help="apply an IPS or BPS patch to a ROM"
+    )
+    sub.add_argument("romfile", help="The original ROM file")
+    sub.add_argument("patchfile", help="The patch file (.ips or .bps)")
+    sub.add_argument(
+        "-o",
+        "--output",
+        help="write the patched ROM to this file, instead of overwriting "
+        "the original one",
+    )
+    sub.set_defaults(func=import_patch)
+
+    sub = subparsers.add_parser(
+        "diff", help="report the differences between ROM files"
+    )
+    sub.add_argument("romfile", help="The base ROM file")
+    sub.add_argument(
+        "other",
+        help="The ROM file to compare, or a directory to compare all its "
+        "files",
+    )
+    sub.set_defaults(func=diff)
+
+    sub = subparsers.add_parser(
+        "merge", help="merge two modified ROM files against the original"
+    )
+    sub.add_argument("basefile", help="The original ROM file")
+    sub.add_argument("ours", help="A modified ROM file")
+    sub.add_argument("theirs", help="Another modified ROM file")
+    sub.add_argument(
+        "-o", "--output", required=True, help="The merged ROM file to write"
+    )
+    sub.add_argument(
+        "--prefer",
+        choices=(heroed.merge.OURS, heroed.merge.THEIRS),
+        default=heroed.merge.OURS,
+        help="the ROM whose values are used in conflicts (default: ours)",
+    )
+    sub.add_argument("--report", help="write the conflicts to this file")
+    sub.set_defaults(func=merge)
+
+    sub = subparsers.add_parser(
+        "export", help="write the decoded screens to a JSON or TOML file"
+    )
+    sub.add_argument("romfile", help="The MSX H.E.R.O. ROM file")
+    sub.add_argument("levelsfile", help="The file to write (.json or .toml)")
+    sub.set_defaults(func=export_levels)
+
+    sub = subparsers.add_parser(
+        "import", help="write the screens of a JSON or TOML file to a ROM"
+    )
+    sub.add_argument("romfile", help="The MSX H.E.R.O. ROM file")
+    sub.add_argument(
+        "levelsfile", help="The file with the screens (.json or .toml)"
+    )
+    sub.add_argument(
+        "-o",
+        "--output",
+        help="write the ROM to this file, instead of overwriting it",
+    )
+    sub.set_defaults(func=import_levels)
+
+    sub = subparsers.add_parser(
+        "map", help="render the screens of a level to a PNG or PPM image"
+    )
+    sub.add_argument("romfile", help="The MSX H.E.R.O. ROM file")
+    sub.add_argument("imagefile", help="The image to write (.png or .ppm)")
+    sub.add_argument(
+        "-l",
+        "--level",
+        type=int,
+        help="the level to render (1 to 20). By default every level is "
+        "rendered, adding its number to the name of the image",
+    )
+    sub.set_defaults(func=level_map)
+
+    sub = subparsers.add_parser(
+        "atlas", help="render the 256 screens to a PNG or PPM image"
+    )
+    sub.add_argument("romfile", help="The MSX H.E.R.O. ROM file")
+    sub.add_argument("imagefile", help="The image to write (.png or .ppm)")
+    sub.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="only render the screens changed since the last atlas, caching "
+        "them next to the image",
+    )
+    sub.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of processes (default: number of CPUs)",
+    )
+    sub.set_defaults(func=atlas)
+
+    sub = subparsers.add_parser(
+        "serve",
+        help="serve the editor over a Unix domain socket with JSON-RPC",
+    )
+    sub.add_argument("romfile", help="The MSX H.E.R.O. ROM file")
+    sub.add_argument(
+        "-s",
+        "--socket",
+        help="The socket file (default: the ROM file with .sock)",
+    )
+    sub.set_defaults(func=serve)
+
+    return parser, tuple(subparsers.choices)
+
+
+parser, COMMANDS = _build_parser()
+
+
+def main(argv):
+    """run a command. argv[0] is the command name"""
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (
+        OSError,
+        heroed.patch.PatchError,
+        heroed.rompatch.RomPatchError,
+        heroed.levels.LevelsFileError,
+        ValueError,
+    ) as err:
+        # like the usage errors of argparse, without a traceback
+        print(
+            "%s %s: error: %s" % (parser.prog, args.command, err),
+            file=sys.stderr,
+        )
+        return 2
@@ -0,0 +1,190 @@
+"""Compare the screens, level layout and title screen messages of two ROMs.
+
+The 8 screens tables are a contiguous block of 2048 bytes in the ROM, so
+they're compared at once: the xor of both blocks (as ints) has non-zero
+bytes only where the screens differ.
+"""
+
+import re
+from typing import NamedTuple
+
+from heroed import hero
+from heroed.screen import screen_attributes, TERRAIN_BYTES_NAMES
+
+# names of the 8 data bytes of a screen
+SCREEN_DATA_BYTES_NAMES = (
+    "enemy low",
+    "enemy middle",
+    "lantern",
+    "middle lateral terrain",
+    "lower lateral terrain",
+    "middle center terrain",
+    "lower center terrain",
+    "wall & misc",
+)
+
+_SCREENS_TABLES_SIZE = 8 * 256
+_NON_ZERO_BYTE = re.compile(b"[^\x00]")
+
+
+class RomData(NamedTuple):
+    """the editable regions of a ROM"""
+
+    screens_tables: bytes  # the 8 tables, one after the other
+    level_initial_screens: tuple
+    level_screen_count: tuple
+    title_messages: tuple  # 4 bytes objects (HERO encoded)
+
+    def screen_data(self, screen_number):
+        return bytes(self.screens_tables[screen_number::256])
+
+
+class ScreenDiff(NamedTuple):
+    screen_number: int
+    bytes: tuple  # indexes of the data bytes that differ
+    attributes: tuple  # (name, old value, new value) of changed attributes
+
+
+def read_rom_data(romfile):
+    """read the editable regions of a ROM file"""
+    with open(romfile, "rb") as f:
+        rom = f.read()
+    if len(rom) < hero.MIN_ROM_SIZE:
+        raise ValueError("%s: not a H.E.R.O. ROM file" % romfile)
+    offset = hero.SCREENS_TABLES_ADDRESSES[0]
+    title_messages = tuple(
+        rom[address : address + 32]
+        for address in hero.TITLE_SCREEN_MESSAGES_ADDRESSES
+    )
+    initial_screens = hero.LEVEL_INITIAL_SCREEN_ADDRESS
+    screen_count = hero.LEVEL_SCREEN_COUNT_ADDRESS
+    return RomData(
+        rom[offset : offset + _SCREENS_TABLES_SIZE],
+        tuple(rom[initial_screens : initial_screens + 20]),
+        tuple(b + 1 for b in rom[screen_count : screen_count + 20]),
+        title_messages,
+    )
+
+
+def diff_screens(rom_a, rom_b):
+    """returns a list of ScreenDiff, sorted by screen number"""
+    xor = (
+        int.from_bytes(rom_a.screens_tables, "big")
+        ^ int.from_bytes(rom_b.screens_tables, "big")
+    ).to_bytes(_SCREENS_TABLES_SIZE, "big")
+
+    different_bytes = {}
+    for match in _NON_ZERO_BYTE.finditer(xor):
+        byte, screen_number = divmod(match.start(), 256)
+        different_bytes.setdefault(screen_number, []).append(byte)
+
+    diffs = []
+    for screen_number in sorted(different_bytes):
+        attributes_a = screen_attributes(rom_a.screen_data(screen_number))
+        attributes_b = screen_attributes(rom_b.screen_data(screen_number))
+        diffs.append(
+            ScreenDiff(
+                screen_number,
+                tuple(different_bytes[screen_number]),
+                tuple(
+                    (name, value, attributes_b[name])
+                    for name, value in attributes_a.items()
+                    if attributes_b[name] != value
+                ),
+            )
+        )
+    return diffs
+
+
+def diff_levels(rom_a, rom_b):
+    """returns a list of (level, (initial, count), (initial, count)) for
+    the levels that differ"""
+    return [
+        (level, layout_a, layout_b)
+        for level, (layout_a, layout_b) in enumerate(
+            zip(
+                zip(rom_a.level_initial_screens, rom_a.level_screen_count),
+                zip(rom_b.level_initial_screens, rom_b.level_screen_count),
+            ),
+            1,
+        )
+        if layout_a != layout_b
+    ]
+
+
+def diff_title_messages(rom_a, rom_b):
+    """returns a list of (message number, message, message) for the title
+    screen messages that differ, decoded to ascii"""
+    return [
+        (
+            message_number,
+            "".join(hero.HERO_TO_ASCII[char & 0x7F] for char in message_a),
+            "".join(hero.HERO_TO_ASCII[char & 0x7F] for char in message_b),
+        )
+        for message_number, (message_a, message_b) in enumerate(
+            zip(rom_a.title_messages, rom_b.title_messages)
+        )
+        if message_a != message_b
+    ]
+
+
+_TERRAIN_BYTES_NAMES = tuple(name for name, _ in TERRAIN_BYTES_NAMES)
+
+
+def _format_value(name, value):
+    if value is None:
+        return "none"
+    elif name in _TERRAIN_BYTES_NAMES:
+        return "%02X" % value
+    return str(value)
+
+
+def format_diff(rom_a, rom_b):
+    """returns a list of lines with a readable report of the differences"""
+    lines = []
+    for level, (initial_a, count_a), (initial_b, count_b) in diff_levels(
+        rom_a, rom_b
+    ):
+        lines.append(
+            "level %d: screens %d-%d -> %d-%d"
+            % (
+                level,
+                initial_a,
+                initial_a + count_a - 1,
+                initial_b,
+                initial_b + count_b - 1,
+            )
+        )
+    for message_number, message_a, message_b in diff_title_messages(
+        rom_a, rom_b
+    ):
+        lines.append(
+            'title message %d: "%s" -> "%s"'
+            % (message_number, message_a, message_b)
+        )
+    for screen_diff in diff_screens(rom_a, rom_b):
+        level, levelscr = hero.get_levelscr_from_absscr(
+            screen_diff.screen_number,
+            rom_b.level_initial_screens,
+            rom_b.level_screen_count,
+        )
+        lines.append(
+            "screen %d (%s): %s"
+            % (
+                screen_diff.screen_number,
+                "lost" if level is None else "L%d S%d" % (level, levelscr),
+                ", ".join(
+                    SCREEN_DATA_BYTES_NAMES[byte] for byte in screen_diff.bytes
+                ),
+            )
+        )
+        for name, value_a, value_b in screen_diff.attributes:
+            lines.append(
+                "    %s: %s -> %s"
+                % (
+                    name,
+                    _format_value(name, value_a),
+                    _format_value(name, value_b),
+                )
+            )
+    return lines
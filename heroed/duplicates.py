@@ -0,0 +1,89 @@
+"""Find duplicated and near-duplicated screens.
+
+Each screen is packed into an int fingerprint: the decoded terrain bitmap of
+the middle and lower areas (32 bits each, see heroed.screen) and the 4
+object bytes (enemies, lantern and wall, 8 bits each). Two screens are
+near-duplicates if the Hamming distance of their fingerprints is small.
+
+To avoid comparing every pair of screens, the fingerprints are split in
+max_distance + 1 chunks: two fingerprints at distance <= max_distance must
+have at least one identical chunk (pigeonhole principle), so only the
+screens sharing a chunk are compared, using popcount on the xor.
+"""
+
+from heroed import hero
+from heroed.screen import bytes_to_data
+
+FINGERPRINT_BITS = 96
+
+
+def fingerprint(screen_data):
+    """returns an int of FINGERPRINT_BITS bits with the terrain bitmap and
+    the objects placement of a screen"""
+    alt_rightside = bool(screen_data[hero.BYTE_WALL] & hero.ALT_RIGHTSIDE_BIT)
+    middle = bytes_to_data(
+        screen_data[hero.BYTE_LATERAL_MID : hero.BYTE_CENTER_MID + 1 : 2],
+        alt_rightside,
+    )
+    lower = bytes_to_data(
+        screen_data[hero.BYTE_LATERAL_LOW : hero.BYTE_CENTER_LOW + 1 : 2],
+        False,
+    )
+    objects = bytes(
+        screen_data[byte]
+        for byte in (
+            hero.BYTE_ENEMY_LOW,
+            hero.BYTE_ENEMY_MID,
+            hero.BYTE_LANTERN,
+            hero.BYTE_WALL,
+        )
+    )
+    return int.from_bytes(middle + lower + objects, "big")
+
+
+def popcount(value):
+    """number of bits set in an int"""
+    return bin(value).count("1")
+
+
+def find_duplicates(fingerprints):
+    """fingerprints     dict of screen number -> fingerprint
+    returns a list of sorted lists of screens with the same fingerprint
+    """
+    groups = {}
+    for screen_number, value in fingerprints.items():
+        groups.setdefault(value, []).append(screen_number)
+    return sorted(
+        sorted(screens) for screens in groups.values() if len(screens) > 1
+    )
+
+
+def find_near_duplicates(fingerprints, max_distance):
+    """fingerprints     dict of screen number -> fingerprint
+    max_distance     max. number of different bits
+    returns a sorted list of (screen, other_screen, distance) tuples, for
+    screens that are not identical. Only the first screen of each group
+    of identical screens is used.
+    """
+    unique = {}
+    for screen_number in sorted(fingerprints):
+        unique.setdefault(fingerprints[screen_number], screen_number)
+
+    chunks = max_distance + 1
+    chunk_bits = -(-FINGERPRINT_BITS // chunks)
+    mask = (1 << chunk_bits) - 1
+    buckets = {}
+    for value in unique:
+        for chunk in range(chunks):
+            key = (chunk, (value >> (chunk * chunk_bits)) & mask)
+            buckets.setdefault(key, []).append(value)
+
+    pairs = set()
+    for values in buckets.values():
+        for i, value in enumerate(values):
+            for other in values[i + 1 :]:
+                distance = popcount(value ^ other)
+                if distance <= max_distance:
+                    screens = sorted((unique[value], unique[other]))
+                    pairs.add((screens[0], screens[1], distance))
+    return sorted(pairs)
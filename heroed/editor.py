@@ -11,16 +11,39 @@ designed to fit exactly this size, and won't run on a smaller terminal.
 
 import os.path
 import shutil
+import contextlib
+from dataclasses import dataclass, field
 
 from heroed.utils import Signals
+from heroed.index import ScreenIndex
 from heroed import hero
+from heroed.merge import Conflict
+import heroed.layout
+
+
+# max. number of undo steps
+UNDO_LIMIT = 1000
+
+
+@dataclass
+class UndoEntry:
+    """An undo step: the previous data of the modified screens, and the
+    previous level layout (if it was modified)"""
+
+    screens: dict = field(default_factory=dict)
+    layout: tuple = None  # (level_initial_screens, level_screen_count)
 
 
 class Editor:
     def __init__(self, hero_ed_rom):
         self.hero_ed_rom = hero_ed_rom
+        # screen_modified and title_message_modified are emitted with the
+        # screen number and data, and the message number and message
         self.signals = Signals(
-            "selected_screen_changed", "level_layout_changed"
+            "selected_screen_changed",
+            "level_layout_changed",
+            "screen_modified",
+            "title_message_modified",
         )
         self._prior_screen_data = None
         self._screen_data = None
@@ -30,8 +53,20 @@ class Editor:
         # to permit saving to disk all at once.
         self._modified_screens = {}
         self._level_layout_modified = False
+        self._modified_title_messages = {}
+        self._screen_index = None
+        self._undo_history = []
+        self._undo_entry = None  # the undo step being recorded
+        self._undoing = False
         self._read_level_initial_screens()
         self._read_level_screen_count()
+        # the contents of the file, to detect the modifications made by
+        # other programs (see reload_file)
+        self._file_tables = self._read_screens_tables()
+        self._file_level_layout = (
+            self._level_initial_screens,
+            self._level_screen_count,
+        )
 
     def _read_screen_data(self, screen_number):
         screen_data = bytearray(8)
@@ -40,6 +75,14 @@ class Editor:
             screen_data[n] = ord(self.hero_ed_rom.read(1))
         return screen_data
 
+    def _read_screens_tables(self):
+        """read the 8 screens tables from file, as a list of bytearrays"""
+        tables = []
+        for offset in hero.SCREENS_TABLES_ADDRESSES:
+            self.hero_ed_rom.seek(offset)
+            tables.append(bytearray(self.hero_ed_rom.read(256)))
+        return tables
+
     def _read_level_initial_screens(self):
         self.hero_ed_rom.seek(hero.LEVEL_INITIAL_SCREEN_ADDRESS)
         data = self.hero_ed_rom.read(20)
@@ -50,10 +93,19 @@ class Editor:
         data = self.hero_ed_rom.read(20)
         self._level_screen_count = tuple(b + 1 for b in data)
 
+    def _read_level_layout(self):
+        """read the level layout from file, without setting it"""
+        self.hero_ed_rom.seek(hero.LEVEL_INITIAL_SCREEN_ADDRESS)
+        level_initial_screens = tuple(self.hero_ed_rom.read(20))
+        self.hero_ed_rom.seek(hero.LEVEL_SCREEN_COUNT_ADDRESS)
+        level_screen_count = tuple(b + 1 for b in self.hero_ed_rom.read(20))
+        return level_initial_screens, level_screen_count
+
     def _write_screen_data(self, screen_number, screen_data):
         for n, offset in enumerate(hero.SCREENS_TABLES_ADDRESSES):
             self.hero_ed_rom.seek(offset + screen_number)
             self.hero_ed_rom.write(screen_data[n : n + 1])
+            self._file_tables[n][screen_number] = screen_data[n]
 
     def _write_level_initial_screens(self):
         self.hero_ed_rom.seek(hero.LEVEL_INITIAL_SCREEN_ADDRESS)
@@ -76,6 +128,39 @@ class Editor:
             hero.HERO_TO_ASCII[char] for char in self.hero_ed_rom.read(32)
         )
 
+    def get_title_screen_message(self, message_number):
+        """Get a message of title screen, including the unsaved
+        modifications"""
+        if message_number in self._modified_title_messages:
+            return self._modified_title_messages[message_number]
+        return self.read_title_screen_message(message_number)
+
+    def set_title_screen_message(self, message_number, message):
+        """Modify a message of title screen. It is written to file with
+        save_title_screen_messages_to_file()
+        """
+        assert 0 <= message_number < 4
+        assert len(message) == 32
+        if message == self.get_title_screen_message(message_number):
+            return
+        if message == self.read_title_screen_message(message_number):
+            del self._modified_title_messages[message_number]
+        else:
+            self._modified_title_messages[message_number] = message
+        self.signals.emit("title_message_modified", message_number, message)
+
+    def save_title_screen_messages_to_file(self):
+        """Write the modified messages of title screen to file and return
+        True. Return False if there are not any modifications.
+        """
+        if not self._modified_title_messages:
+            return False
+        while self._modified_title_messages:
+            self.write_title_screen_message(
+                *self._modified_title_messages.popitem()
+            )
+        return True
+
     def write_title_screen_message(self, message_number, message):
         """Write message of title screen to file.
         message_number  int, from 0 to 3
@@ -98,6 +183,118 @@ class Editor:
         else:
             return self._read_screen_data(screen_number)
 
+    def _set_screen(self, screen_number, screen_data):
+        """store a modified screen in self._modified_screens dict"""
+        with self._undo_step() as entry:
+            if entry is not None and screen_number not in entry.screens:
+                entry.screens[screen_number] = bytes(
+                    self._get_screen(screen_number)
+                )
+        self._modified_screens[screen_number] = screen_data.copy()
+        if self._screen_index is not None:
+            self._screen_index.update(screen_number, screen_data)
+        self.signals.emit("screen_modified", screen_number, screen_data)
+
+    @contextlib.contextmanager
+    def _undo_step(self):
+        """Record all the modifications done inside the context as a single
+        undo step. Yields the UndoEntry, or None when undoing.
+        """
+        if self._undoing:
+            yield None
+            return
+        if self._undo_entry is not None:
+            # nested, the outer step records everything
+            yield self._undo_entry
+            return
+        self._undo_entry = UndoEntry()
+        try:
+            yield self._undo_entry
+        finally:
+            entry, self._undo_entry = self._undo_entry, None
+            if entry.screens or entry.layout is not None:
+                self._undo_history.append(entry)
+                del self._undo_history[:-UNDO_LIMIT]
+
+    def _record_layout_undo(self):
+        """store the current level layout in the undo step"""
+        with self._undo_step() as entry:
+            if entry is not None and entry.layout is None:
+                entry.layout = (
+                    self._level_initial_screens,
+                    self._level_screen_count,
+                )
+
+    @property
+    def undo_history(self):
+        """list of UndoEntry, the last one is the next to undo"""
+        return self._undo_history
+
+    def undo(self):
+        """Undo the last modification (of screens or level layout).
+        Return False if there is nothing to undo.
+        """
+        self.store_selected_screen()
+        if not self._undo_history:
+            return False
+        entry = self._undo_history.pop()
+        self._undoing = True
+        try:
+            for screen_number, screen_data in entry.screens.items():
+                self._set_screen(screen_number, bytearray(screen_data))
+                if screen_data == self._read_screen_data(screen_number):
+                    # back to the data in file
+                    del self._modified_screens[screen_number]
+            if entry.layout is not None:
+                self.set_level_layout(*entry.layout)
+                if entry.layout == self._file_level_layout:
+                    # back to the layout in file
+                    self._level_layout_modified = False
+        finally:
+            self._undoing = False
+        self._reload_selected_screen()
+        return True
+
+    def get_screen_data(self, screen_number):
+        """Get the data of any screen, including the unsaved modifications"""
+        if screen_number == self.selected_screen:
+            return self._screen_data.copy()
+        return self._get_screen(screen_number)
+
+    def set_screen_data(self, screen_number, screen_data):
+        """Modify the data of any screen"""
+        if screen_number == self.selected_screen:
+            self.screen_data = screen_data
+        elif screen_data != self._get_screen(screen_number):
+            self._set_screen(screen_number, bytearray(screen_data))
+            if screen_number + 1 == self.selected_screen:
+                # redraw it with the new prior screen
+                self.store_selected_screen()
+                self._reload_selected_screen()
+
+    def screens_tables(self):
+        """Get the 8 screens tables (a bytearray of 256 bytes for each data
+        byte), including the unsaved modifications
+        """
+        tables = self._read_screens_tables()
+        for screen_number, screen_data in self._modified_screens.items():
+            for n, table in enumerate(tables):
+                table[screen_number] = screen_data[n]
+        return tables
+
+    @property
+    def screen_index(self):
+        """Inverted index of the screens attributes. It is built on first
+        use, and then updated as screens are modified.
+        """
+        if self._screen_index is None:
+            tables = self.screens_tables()
+            self._screen_index = ScreenIndex(
+                (n, bytearray(table[n] for table in tables))
+                for n in range(256)
+            )
+        return self._screen_index
+
     def _get_prior_screen(self, screen_number):
         """get the prior screen data, because it is used to draw the
         higher area of the current screen.
@@ -121,6 +318,7 @@ class Editor:
         if self._level_initial_screens == value:
             return
 
+        self._record_layout_undo()
         self._level_initial_screens = value
         self._level_layout_modified = True
         self.signals.emit("level_layout_changed")
@@ -135,10 +333,220 @@ class Editor:
         if self._level_screen_count == value:
             return
 
+        self._record_layout_undo()
         self._level_screen_count = value
         self._level_layout_modified = True
         self.signals.emit("level_layout_changed")
 
+    def set_level_layout(self, level_initial_screens, level_screen_count):
+        """Set both level_initial_screens and level_screen_count tuples,
+        emitting level_layout_changed only once"""
+        if (
+            self._level_initial_screens == level_initial_screens
+            and self._level_screen_count == level_screen_count
+        ):
+            return
+
+        self._record_layout_undo()
+        self._level_initial_screens = level_initial_screens
+        self._level_screen_count = level_screen_count
+        self._level_layout_modified = True
+        self.signals.emit("level_layout_changed")
+
+    def check_level_layout(self):
+        """Returns a list of heroed.layout.LayoutIssue"""
+        return heroed.layout.check_level_layout(
+            self.level_initial_screens, self.level_screen_count
+        )
+
+    def repair_level_layout(self):
+        """Set a valid level layout, if the current one has errors.
+        Returns True if the layout has been modified.
+        """
+        if not any(issue.is_error for issue in self.check_level_layout()):
+            return False
+        self.set_level_layout(
+            *heroed.layout.repair_level_layout(
+                self.level_initial_screens, self.level_screen_count
+            )
+        )
+        return True
+
+    def _set_screens_tables(self, tables):
+        """store the screens that differ from the current ones. tables is a
+        list of 8 bytearrays of 256 bytes, as returned by screens_tables()
+        """
+        current_tables = self.screens_tables()
+        for screen_number in range(256):
+            if any(
+                table[screen_number] != current_table[screen_number]
+                for table, current_table in zip(tables, current_tables)
+            ):
+                self._set_screen(
+                    screen_number,
+                    bytearray(table[screen_number] for table in tables),
+                )
+        self._reload_selected_screen()
+
+    def _reload_selected_screen(self):
+        """read again the selected screen and its prior screen, because they
+        have been modified by another operation"""
+        if self._selected_screen is None:
+            return
+        self._screen_data = self._get_screen(self._selected_screen)
+        self._prior_screen_data = self._get_prior_screen(self._selected_screen)
+        self._screen_original_data = self._screen_data.copy()
+        self.signals.emit("selected_screen_changed")
+
+    def copy_screens(self, first_screen, count):
+        """Returns a list of 8 bytearrays, with the data of count screens
+        from first_screen (a slice of each screens table)
+        """
+        return [
+            table[first_screen : first_screen + count]
+            for table in self.screens_tables()
+        ]
+
+    def paste_screens(self, target_screen, screens):
+        """Overwrite the screens from target_screen with the copied screens
+        (see copy_screens). The screens that don't fit before screen 255 are
+        ignored.
+        """
+        with self._undo_step():
+            tables = self.screens_tables()
+            for table, copied in zip(tables, screens):
+                table[target_screen : target_screen + len(copied)] = copied
+                del table[256:]
+            self._set_screens_tables(tables)
+
+    def insert_screens(self, target_screen, screens):
+        """Insert the copied screens (see copy_screens) before target_screen,
+        shifting the following screens. The last screens are lost.
+        The level of target_screen grows, and the following levels are
+        shifted.
+        """
+        with self._undo_step():
+            count = len(screens[0])
+            tables = self.screens_tables()
+            for table, copied in zip(tables, screens):
+                table[target_screen:target_screen] = copied
+                del table[256:]
+
+            level_initial_screens = []
+            level_screen_count = []
+            for initial_screen, screen_count in zip(
+                self.level_initial_screens, self.level_screen_count
+            ):
+                if initial_screen > target_screen:
+                    initial_screen += count
+                elif initial_screen + screen_count > target_screen:
+                    screen_count += count
+                level_initial_screens.append(initial_screen)
+                level_screen_count.append(screen_count)
+            self._set_valid_level_layout(
+                level_initial_screens, level_screen_count
+            )
+            self._set_screens_tables(tables)
+
+    def delete_screens(self, first_screen, count):
+        """Delete count screens from first_screen, shifting the following
+        screens. The last screens are filled with empty screens.
+        The levels shrink, and the following levels are shifted.
+        Returns False (and nothing is deleted) if all the screens of a level
+        would be deleted, because the ROM must keep the 20 levels.
+        """
+        last_screen = min(first_screen + count, 256)
+        count = last_screen - first_screen
+
+        level_initial_screens = []
+        level_screen_count = []
+        for initial_screen, screen_count in zip(
+            self.level_initial_screens, self.level_screen_count
+        ):
+            final_screen = initial_screen + screen_count
+            # number of screens of the level that are deleted
+            deleted = max(
+                0,
+                min(final_screen, last_screen)
+                - max(initial_screen, first_screen),
+            )
+            if deleted >= screen_count:
+                return False
+            if initial_screen >= last_screen:
+                initial_screen -= count
+            elif initial_screen > first_screen:
+                initial_screen = first_screen
+            level_initial_screens.append(initial_screen)
+            level_screen_count.append(screen_count - deleted)
+
+        with self._undo_step():
+            tables = self.screens_tables()
+            for n, table in enumerate(tables):
+                del table[first_screen:last_screen]
+                table.extend((hero.EMPTY_SCREEN_DATA[n],) * count)
+            self._set_valid_level_layout(
+                level_initial_screens, level_screen_count
+            )
+            self._set_screens_tables(tables)
+            return True
+
+    def compact_level_layout(self):
+        """Move the screens of the levels, in order, to contiguous ranges
+        from screen 0, so all the screens that don't belong to any level are
+        moved after the last level.
+        Returns the number of free screens reclaimed (the ones that were
+        between levels), or None if the level layout is not valid.
+        """
+        if any(issue.is_error for issue in self.check_level_layout()):
+            return None
+
+        with self._undo_step():
+            final_screens = hero.final_screens(
+                self.level_initial_screens, self.level_screen_count
+            )
+            free_screens_at_end = 255 - max(final_screens)
+
+            # order of the screens in the compacted tables
+            used_screens = []
+            level_initial_screens = []
+            for initial_screen, screen_count in zip(
+                self.level_initial_screens, self.level_screen_count
+            ):
+                level_initial_screens.append(len(used_screens))
+                used_screens.extend(
+                    range(initial_screen, initial_screen + screen_count)
+                )
+            free_screens = sorted(set(range(256)).difference(used_screens))
+
+            tables = [
+                bytearray(table[n] for n in used_screens + free_screens)
+                for table in self.screens_tables()
+            ]
+            self.set_level_layout(
+                tuple(level_initial_screens), self.level_screen_count
+            )
+            self._set_screens_tables(tables)
+            return len(free_screens) - free_screens_at_end
+
+    def _set_valid_level_layout(
+        self, level_initial_screens, level_screen_count
+    ):
+        """set the level layout, repairing it if it's not valid"""
+        if any(
+            issue.is_error
+            for issue in heroed.layout.check_level_layout(
+                level_initial_screens, level_screen_count
+            )
+        ):
+            level_initial_screens, level_screen_count = (
+                heroed.layout.repair_level_layout(
+                    level_initial_screens, level_screen_count
+                )
+            )
+        self.set_level_layout(
+            tuple(level_initial_screens), tuple(level_screen_count)
+        )
+
     @property
     def selected_screen(self):
         """ Get the current selected screen """
@@ -163,9 +571,7 @@ class Editor:
         """if the current screen has been modified, store
         in self._modified_screens dict"""
         if self._is_screen_data_modified():
-            self._modified_screens[
-                self.selected_screen
-            ] = self._screen_data.copy()
+            self._set_screen(self.selected_screen, self._screen_data)
             self._screen_original_data = self._screen_data.copy()
 
     def restore_screen_data(self):
@@ -207,9 +613,147 @@ class Editor:
             return False
         self._write_level_initial_screens()
         self._write_level_screen_count()
+        self._file_level_layout = (
+            self._level_initial_screens,
+            self._level_screen_count,
+        )
         self._level_layout_modified = False
         return True
 
+    def reload_file(self):
+        """Reload the screens and the level layout modified in the ROM file
+        by another program, keeping the unsaved modifications. If the same
+        data has been modified in both, the unsaved modification is kept.
+        The file is reopened, because it may have been replaced by another
+        one, and the read buffer may be outdated.
+        The title screen messages are always read from file, so only the
+        modified ones are kept.
+        Returns the list of the screens modified in the file, and a list
+        of heroed.merge.Conflict.
+        """
+        self.store_selected_screen()
+        romfile = self.hero_ed_rom.name
+        self.hero_ed_rom.close()
+        self.hero_ed_rom = open(romfile, "r+b")
+
+        reloaded_screens = []
+        conflicts = []
+        file_tables = self._read_screens_tables()
+        # the external modifications are not undone
+        self._undoing = True
+        try:
+            for screen_number in range(256):
+                base = bytes(
+                    table[screen_number] for table in self._file_tables
+                )
+                theirs = bytes(table[screen_number] for table in file_tables)
+                if base == theirs:
+                    continue
+                reloaded_screens.append(screen_number)
+                if screen_number not in self._modified_screens:
+                    if self._screen_index is not None:
+                        self._screen_index.update(
+                            screen_number, bytearray(theirs)
+                        )
+                    continue
+                # merge byte by byte with the unsaved modification
+                ours = self._modified_screens[screen_number]
+                merged = bytearray(ours)
+                conflict_bytes = []
+                for byte in range(8):
+                    if ours[byte] == base[byte]:
+                        merged[byte] = theirs[byte]
+                    elif theirs[byte] not in (base[byte], ours[byte]):
+                        conflict_bytes.append(byte)
+                if conflict_bytes:
+                    conflicts.append(
+                        Conflict(
+                            "screen",
+                            screen_number,
+                            "bytes %s modified in file"
+                            % ", ".join(str(byte) for byte in conflict_bytes),
+                        )
+                    )
+                self._set_screen(screen_number, merged)
+            self._file_tables = file_tables
+
+            file_level_layout = self._read_level_layout()
+            if file_level_layout != self._file_level_layout:
+                if self._level_layout_modified:
+                    conflicts.extend(
+                        self._merge_level_layout(file_level_layout)
+                    )
+                else:
+                    (
+                        self._level_initial_screens,
+                        self._level_screen_count,
+                    ) = file_level_layout
+                    self.signals.emit("level_layout_changed")
+                self._file_level_layout = file_level_layout
+        finally:
+            self._undoing = False
+        self._reload_selected_screen()
+        return reloaded_screens, conflicts
+
+    def _merge_level_layout(self, file_level_layout):
+        """merge the level layout of the file with the modified one, level
+        by level. Returns a list of heroed.merge.Conflict"""
+        conflicts = []
+        layouts = []
+        for level, (base, ours, theirs) in enumerate(
+            zip(
+                zip(*self._file_level_layout),
+                zip(self._level_initial_screens, self._level_screen_count),
+                zip(*file_level_layout),
+            ),
+            1,
+        ):
+            if ours == base:
+                layouts.append(theirs)
+            else:
+                layouts.append(ours)
+                if ours != theirs:
+                    conflicts.append(
+                        Conflict("level", level, "modified in file")
+                    )
+        self.set_level_layout(*(tuple(values) for values in zip(*layouts)))
+        return conflicts
+
+    @property
+    def modified_screens(self):
+        """dict with the data of the modified screens, not saved to file"""
+        return {
+            screen_number: bytes(screen_data)
+            for screen_number, screen_data in self._modified_screens.items()
+        }
+
+    def restore_modifications(
+        self,
+        modified_screens,
+        level_initial_screens,
+        level_screen_count,
+        title_messages,
+        undo_history,
+    ):
+        """Restore the unsaved modifications of a previous session (see
+        heroed.project), replacing the current ones
+        """
+        self._modified_screens = {
+            screen_number: bytearray(screen_data)
+            for screen_number, screen_data in modified_screens.items()
+        }
+        self._screen_index = None
+        self._modified_title_messages = {}
+        for message_number, message in enumerate(title_messages):
+            self.set_title_screen_message(message_number, message)
+        self._undoing = True
+        try:
+            self.set_level_layout(level_initial_screens, level_screen_count)
+        finally:
+            self._undoing = False
+        self._undo_history = list(undo_history)
+        self._reload_selected_screen()
+
     def are_there_modified_screens(self):
         """Returns True if there are any modified screens"""
         return len(self._modified_screens) > 0
@@ -218,7 +762,11 @@ class Editor:
         return self._level_layout_modified
 
     def are_there_modifications(self):
-        return self.are_there_modified_screens() or self.is_layout_modified()
+        return (
+            self.are_there_modified_screens()
+            or self.is_layout_modified()
+            or bool(self._modified_title_messages)
+        )
 
     def define_current_screen_as_initial(self):
         """define the current screen as the initial screen of the level."""
@@ -251,21 +799,24 @@ class Editor:
         # set the initial screen and current length
         # final_screen = final_screens[level - 1]
 
-        # set level initial screen
-        level_initial_screens = list(self.level_initial_screens)
-        level_initial_screens[level - 1] = self.selected_screen
-        self.level_initial_screens = tuple(level_initial_screens)
+        with self._undo_step():
+            # set level initial screen
+            level_initial_screens = list(self.level_initial_screens)
+            level_initial_screens[level - 1] = self.selected_screen
 
-        # calculate the new screen count for the level
-        # screen_count = final_screen - self.selected_screen + 1
-        screen_count = final_screens[level - 1] - self.selected_screen + 1
+            # calculate the new screen count for the level
+            # screen_count = final_screen - self.selected_screen + 1
+            screen_count = final_screens[level - 1] - self.selected_screen + 1
 
-        # set level length
-        level_screen_count = list(self.level_screen_count)
-        level_screen_count[level - 1] = screen_count
-        self.level_screen_count = tuple(level_screen_count)
+            # set level length
+            level_screen_count = list(self.level_screen_count)
+            level_screen_count[level - 1] = screen_count
 
-        return True
+            # in one step, so the layout is never half updated
+            self.set_level_layout(
+                tuple(level_initial_screens), tuple(level_screen_count)
+            )
+            return True
 
     def define_current_screen_as_final(self):
         """define the current screen as the final screen of the level."""
@@ -300,6 +851,8 @@ class Editor:
         # set level length
         level_screen_count = list(self.level_screen_count)
         level_screen_count[level - 1] = screen_count
-        self.level_screen_count = tuple(level_screen_count)
+        self.set_level_layout(
+            self.level_initial_screens, tuple(level_screen_count)
+        )
 
         return True
@@ -15,6 +15,9 @@ SCREENS_TABLES_ADDRESSES = (
     0x3EF6,
 )
 
+# The ROM must have at least the screens tables
+MIN_ROM_SIZE = SCREENS_TABLES_ADDRESSES[-1] + 256
+
 # ROM addresses where the 4 messages cycled in the title screen are.
 # each message is 32 bytes long. They're not ascii encoded.
 TITLE_SCREEN_MESSAGES_ADDRESSES = (
@@ -33,6 +36,14 @@ LEVEL_INITIAL_SCREEN_ADDRESS = 0x37CE
 # screens and value of 3).
 LEVEL_SCREEN_COUNT_ADDRESS = 0x37E2
 
+# ROM regions that the editor can modify, as (address, length) tuples: the
+# level layout tables followed by the 8 screens tables, and the title screen
+# messages.
+EDITABLE_REGIONS = (
+    (LEVEL_INITIAL_SCREEN_ADDRESS, 20 + 20 + 8 * 256),
+    (TITLE_SCREEN_MESSAGES_ADDRESSES[0], 4 * 32),
+)
+
 # Some HERO encoded message chars
 #   00-1F:  EMPTY, EMPTY, 0-9, EXCLAM, LEVEL, POWER, PRO, LIVES, BOMBS,
 #           POWERBAR, LOGO 1-3
@@ -117,6 +128,20 @@ ENEMY_SNAKE = 3
 
 OBJECT_HIDDEN_POS = 36
 
+# An empty screen: no terrain, no wall and hidden lantern and enemies
+EMPTY_SCREEN_DATA = bytes(
+    (
+        OBJECT_HIDDEN_POS << 2,
+        OBJECT_HIDDEN_POS << 2,
+        OBJECT_HIDDEN_POS << 2,
+        0x00,
+        0x00,
+        0x00,
+        0x00,
+        0x00,
+    )
+)
+
 
 ORIGINAL_LEVEL_SCREEN_COUNT = (
     2,
@@ -319,3 +344,9 @@ def get_level_color(level_number):
         return 0
     else:
         return (level_number - 1) % 4
+
+
+def mod_title_screen_message(mod_name):
+    """returns the title screen message 0 with the name of a mod
+    (max. 15 chars)"""
+    return "H.E.R.O.tm%s=HEROED" % mod_name.ljust(15)
@@ -0,0 +1,113 @@
+"""Inverted index to query the screens by their attributes.
+
+Each attribute value (see heroed.screen.screen_attributes) is mapped to the
+set of screens that have it, so a query is just an intersection of sets.
+The index is updated screen by screen when they are modified.
+
+Query syntax: terms separated by spaces, like "enemy_low=snake magma=on".
+Numeric values can be written in decimal or hexadecimal (0x..), and hidden
+enemies and objects positions can be queried with "none". A term without
+value, like "magma", is the same as "magma=on". Unknown values are a
+QueryError.
+"""
+
+from heroed.screen import (
+    screen_attributes,
+    ENEMY_NAMES,
+    SIDE_GAP_NAMES,
+    DIRECTION_NAMES,
+)
+
+# valid values of the attributes with names (the others are numbers, or
+# None for the hidden objects positions)
+NAMED_VALUES = {
+    "enemy_low": ENEMY_NAMES + (None,),
+    "enemy_mid": ENEMY_NAMES + (None,),
+    "lantern": ("on", "off"),
+    "wall": ("on", "off"),
+    "magma": ("on", "off"),
+    "side_gap": SIDE_GAP_NAMES,
+    "dir": DIRECTION_NAMES,
+}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class ScreenIndex:
+    def __init__(self, screens_data=()):
+        """screens_data     iterable of (screen_number, screen_data)"""
+        # attribute name -> attribute value -> set of screen numbers
+        self._index = {}
+        # screen number -> attributes dict currently indexed
+        self._screens = {}
+        for screen_number, screen_data in screens_data:
+            self.update(screen_number, screen_data)
+
+    @property
+    def attribute_names(self):
+        return tuple(self._index)
+
+    def update(self, screen_number, screen_data):
+        """index (or re-index) the attributes of a screen"""
+        attributes = screen_attributes(screen_data)
+        old_attributes = self._screens.get(screen_number, {})
+        for name, value in attributes.items():
+            old_value = old_attributes.get(name)
+            if name in old_attributes and old_value == value:
+                continue
+            values = self._index.setdefault(name, {})
+            if name in old_attributes:
+                values[old_value].discard(screen_number)
+                if not values[old_value]:
+                    del values[old_value]
+            values.setdefault(value, set()).add(screen_number)
+        self._screens[screen_number] = attributes
+
+    def values(self, name):
+        """returns the indexed values of an attribute"""
+        return tuple(self._index.get(name, ()))
+
+    def find(self, **terms):
+        """returns a sorted list of the screens matching all the terms"""
+        result = None
+        for name, value in terms.items():
+            if name not in self._index:
+                raise QueryError('unknown attribute "%s"' % name)
+            screens = self._index[name].get(value, set())
+            result = screens if result is None else result & screens
+            if not result:
+                return []
+        return sorted(self._screens if result is None else result)
+
+    def query(self, query):
+        """parse a query string and return the sorted matching screens"""
+        return self.find(**self.parse_query(query))
+
+    def parse_query(self, query):
+        """returns a dict of terms from a query string"""
+        terms = {}
+        for term in query.split():
+            name, _, value = term.partition("=")
+            name = name.lower()
+            if name not in self._index:
+                raise QueryError('unknown attribute "%s"' % name)
+            value = value.lower() if value else "on"
+            if value == "none":
+                value = None
+            elif value.isdigit():
+                value = int(value)
+            elif value.startswith("0x"):
+                try:
+                    value = int(value, 16)
+                except ValueError:
+                    raise QueryError('invalid value "%s"' % value) from None
+            if name in NAMED_VALUES:
+                valid = value in NAMED_VALUES[name]
+            else:
+                valid = value is None or isinstance(value, int)
+            if not valid:
+                raise QueryError('invalid value in "%s"' % term)
+            terms[name] = value
+        return terms
@@ -0,0 +1,258 @@
+"""Journal of the unsaved modifications, to recover them after a crash or a
+terminal disconnect.
+
+Every modification of the editor is appended to the journal file (next to
+the ROM file) as a fixed-size record. Records are written to the file
+buffer, and a background thread flushes and fsyncs them all at once every
+SYNC_INTERVAL seconds (group commit), so keystrokes never wait for the
+disk. A crash loses at most the modifications of the last interval.
+
+When the ROM file is saved, the journal is emptied, and when the editor is
+quit normally, it is removed. So if a journal with records exists when the
+editor starts, the last session didn't end well, and the records can be
+replayed.
+
+File layout (little-endian):
+
+    header      magic, version and SHA-1 of the ROM file
+    records     kind, number (screen, message...), data and CRC32
+
+A record torn by a crash has a bad CRC32 (or is incomplete), and it's
+ignored with the following ones.
+"""
+
+import os
+import struct
+import zlib
+import threading
+import contextlib
+from typing import NamedTuple
+
+from heroed import hero
+from heroed.project import rom_sha1
+
+JOURNAL_SUFFIX = ".journal"
+MAGIC = b"HEROEDJ\x00"
+VERSION = 1
+SYNC_INTERVAL = 1.0  # seconds
+
+HEADER = struct.Struct("<8sH20s")
+# kind, number, data, and the CRC32 of them
+RECORD_FIELDS = struct.Struct("<BB40s")
+RECORD = struct.Struct("<BB40sI")
+
+RECORD_SCREEN = 1  # number is the screen, data has 8 bytes
+RECORD_LAYOUT = 2  # data is the level layout, as in the ROM
+RECORD_TITLE_MESSAGE = 3  # number is the message, data has 32 bytes
+
+
+class JournalError(ValueError):
+    pass
+
+
+class JournalData(NamedTuple):
+    """the final state of the modifications of a journal"""
+
+    rom_sha1: bytes
+    records: int  # number of valid records
+    screens: dict  # {screen number: bytes}
+    layout: tuple  # (level_initial_screens, level_screen_count) or None
+    title_messages: dict  # {message number: str}
+
+
+def journal_filename(romfile):
+    return romfile + JOURNAL_SUFFIX
+
+
+def _record(kind, number, data):
+    fields = RECORD_FIELDS.pack(kind, number, data)
+    return RECORD.pack(kind, number, data, zlib.crc32(fields))
+
+
+class Journal:
+    """Append-only journal, synced to disk by a background thread"""
+
+    def __init__(self, filename, sha1, sync_interval=SYNC_INTERVAL):
+        self.filename = filename
+        self._rom_sha1 = sha1
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._file = open(filename, "wb")
+        self._write_header()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sync_loop, args=(sync_interval,), daemon=True
+        )
+        self._thread.start()
+
+    def _write_header(self):
+        self._file.write(HEADER.pack(MAGIC, VERSION, self._rom_sha1))
+        self._dirty = True
+
+    def _sync_loop(self, sync_interval):
+        while not self._stop.wait(sync_interval):
+            self.sync()
+
+    def sync(self):
+        """flush and fsync the appended records, if any"""
+        with self._lock:
+            if not self._dirty or self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _append(self, record):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(record)
+            self._dirty = True
+
+    def append_screen(self, screen_number, screen_data):
+        self._append(_record(RECORD_SCREEN, screen_number, bytes(screen_data)))
+
+    def append_layout(self, level_initial_screens, level_screen_count):
+        self._append(
+            _record(
+                RECORD_LAYOUT,
+                0,
+                bytes(level_initial_screens)
+                + bytes(count - 1 for count in level_screen_count),
+            )
+        )
+
+    def append_title_message(self, message_number, message):
+        self._append(
+            _record(
+                RECORD_TITLE_MESSAGE,
+                message_number,
+                bytes(hero.ASCII_TO_HERO[ord(char)] for char in message),
+            )
+        )
+
+    def append_editor(self, editor):
+        """append all the unsaved modifications of an editor"""
+        for screen_number, screen_data in editor.modified_screens.items():
+            self.append_screen(screen_number, screen_data)
+        if editor.is_layout_modified():
+            self.append_layout(
+                editor.level_initial_screens, editor.level_screen_count
+            )
+        for message_number in range(4):
+            message = editor.get_title_screen_message(message_number)
+            if message != editor.read_title_screen_message(message_number):
+                self.append_title_message(message_number, message)
+
+    def connect(self, editor):
+        """append every modification of an editor"""
+        editor.signals.connect("screen_modified", self.append_screen)
+        editor.signals.connect(
+            "level_layout_changed",
+            lambda: self.append_layout(
+                editor.level_initial_screens, editor.level_screen_count
+            ),
+        )
+        editor.signals.connect(
+            "title_message_modified", self.append_title_message
+        )
+
+    def clear(self, sha1):
+        """remove all the records, because the ROM file (with that SHA-1
+        now) has been saved"""
+        with self._lock:
+            self._rom_sha1 = sha1
+            self._file.seek(0)
+            self._file.truncate()
+            self._write_header()
+        self.sync()
+
+    def close(self, remove=False):
+        """stop the sync thread and close the file, after syncing it.
+        If remove, the file is removed (there is nothing to recover)."""
+        self._stop.set()
+        self._thread.join()
+        self.sync()
+        with self._lock:
+            self._file.close()
+        if remove:
+            os.remove(self.filename)
+
+
+def read_journal(filename):
+    """read a journal file at once, returning its JournalData"""
+    with open(filename, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise JournalError("not a heroed journal file")
+    magic, version, rom_sha1 = HEADER.unpack_from(data)
+    if magic != MAGIC or version > VERSION:
+        raise JournalError("not a heroed journal file")
+
+    records = 0
+    screens = {}
+    layout = None
+    title_messages = {}
+    body = memoryview(data)[HEADER.size :]
+    # ignore the incomplete record at the end, if any
+    body = body[: len(body) - len(body) % RECORD.size]
+    for offset, (kind, number, record_data, crc) in zip(
+        range(0, len(body), RECORD.size), RECORD.iter_unpack(body)
+    ):
+        if zlib.crc32(body[offset : offset + RECORD_FIELDS.size]) != crc:
+            break
+        if kind == RECORD_SCREEN:
+            screens[number] = record_data[:8]
+        elif kind == RECORD_LAYOUT:
+            layout = (
+                tuple(record_data[:20]),
+                tuple(b + 1 for b in record_data[20:40]),
+            )
+        elif kind == RECORD_TITLE_MESSAGE:
+            title_messages[number] = "".join(
+                hero.HERO_TO_ASCII[char & 0x7F] for char in record_data[:32]
+            )
+        else:
+            break
+        records += 1
+    return JournalData(rom_sha1, records, screens, layout, title_messages)
+
+
+def replay_journal(editor, journal_data):
+    """restore the modifications of a journal in an editor"""
+    modified_screens = editor.modified_screens
+    modified_screens.update(journal_data.screens)
+    editor.restore_modifications(
+        modified_screens,
+        *(
+            journal_data.layout
+            or (editor.level_initial_screens, editor.level_screen_count)
+        ),
+        [
+            journal_data.title_messages.get(
+                message_number, editor.get_title_screen_message(message_number)
+            )
+            for message_number in range(4)
+        ],
+        editor.undo_history,
+    )
+
+
+@contextlib.contextmanager
+def journaling(editor, sync_interval=SYNC_INTERVAL):
+    """Journal the modifications of the editor (including the current ones)
+    inside the context. If the context exits normally, the journal is
+    removed; if there is an exception, it's kept to recover it later.
+    """
+    romfile = editor.hero_ed_rom.name
+    journal = Journal(
+        journal_filename(romfile), rom_sha1(romfile), sync_interval
+    )
+    journal.append_editor(editor)
+    journal.connect(editor)
+    try:
+        yield journal
+    except BaseException:
+        journal.close()
+        raise
+    journal.close(remove=True)
@@ -0,0 +1,123 @@
+"""Check and repair the level layout (level_initial_screens and
+level_screen_count tables).
+
+A valid layout has the screens of each level inside the 256 screens, and
+no screen belongs to more than one level. Screens that don't belong to any
+level ("lost" screens) are valid, but they're reported too, because they're
+wasted.
+"""
+
+from typing import NamedTuple
+
+OVERLAP = "overlap"
+GAP = "gap"
+OUT_OF_RANGE = "out of range"
+
+
+class LayoutIssue(NamedTuple):
+    kind: str
+    first_screen: int
+    last_screen: int
+    levels: tuple = ()
+
+    @property
+    def is_error(self):
+        return self.kind != GAP
+
+    def __str__(self):
+        if self.first_screen == self.last_screen:
+            screens = "screen %d" % self.first_screen
+        else:
+            screens = "screens %d-%d" % (self.first_screen, self.last_screen)
+        if self.kind == OVERLAP:
+            return "%s: %s shared by levels %s" % (
+                self.kind,
+                screens,
+                ", ".join(str(level) for level in self.levels),
+            )
+        elif self.kind == OUT_OF_RANGE:
+            return "%s: level %d ends at screen %d" % (
+                self.kind,
+                self.levels[0],
+                self.last_screen,
+            )
+        else:
+            return "%s: %s not in any level" % (self.kind, screens)
+
+
+def check_level_layout(level_initial_screens, level_screen_count):
+    """returns a list of LayoutIssue, sorted by screen.
+    This sweeps the 256 screens once, tracking the levels that start and end
+    at each screen.
+    """
+    issues = []
+    starts = [[] for _ in range(257)]
+    ends = [[] for _ in range(257)]
+    for level, (initial_screen, screen_count) in enumerate(
+        zip(level_initial_screens, level_screen_count), 1
+    ):
+        end_screen = initial_screen + screen_count
+        if end_screen > 256:
+            issues.append(
+                LayoutIssue(OUT_OF_RANGE, 256, end_screen - 1, (level,))
+            )
+            end_screen = 256
+        starts[initial_screen].append(level)
+        ends[end_screen].append(level)
+
+    active = set()
+    run_start, run_levels = 0, ()
+    for screen_number in range(257):
+        active.difference_update(ends[screen_number])
+        active.update(starts[screen_number])
+        levels = tuple(sorted(active)) if len(active) != 1 else (None,)
+        if screen_number == 256 or levels != run_levels:
+            # close the previous run of screens
+            if screen_number > run_start and run_levels != (None,):
+                issues.append(
+                    LayoutIssue(
+                        OVERLAP if run_levels else GAP,
+                        run_start,
+                        screen_number - 1,
+                        run_levels,
+                    )
+                )
+            run_start, run_levels = screen_number, levels
+
+    issues.sort(key=lambda issue: (issue.first_screen, issue.kind))
+    return issues
+
+
+def repair_level_layout(level_initial_screens, level_screen_count):
+    """returns a valid (level_initial_screens, level_screen_count) tuple,
+    as similar as possible to the given one.
+    Levels are placed in order of their initial screen, moving forward
+    the ones that overlap the previous level, and shortening the ones that
+    don't fit before the next level or the end of the 256 screens. Each
+    level keeps at least 1 screen.
+    """
+    levels = sorted(
+        range(len(level_initial_screens)),
+        key=lambda level: (level_initial_screens[level], level),
+    )
+    initial_screens = list(level_initial_screens)
+    screen_count = list(level_screen_count)
+    next_free = 0
+    for n, level in enumerate(levels):
+        remaining_levels = len(levels) - n - 1
+        initial_screen = min(
+            max(level_initial_screens[level], next_free),
+            255 - remaining_levels,
+        )
+        # room before the next level (it could be moved forward later,
+        # so use the one it has now) and the end of the 256 screens
+        limit = 256 - remaining_levels
+        if remaining_levels:
+            next_initial = level_initial_screens[levels[n + 1]]
+            if next_initial > initial_screen:
+                limit = min(limit, next_initial)
+        count = max(1, min(level_screen_count[level], limit - initial_screen))
+        initial_screens[level] = initial_screen
+        screen_count[level] = count
+        next_free = initial_screen + count
+    return tuple(initial_screens), tuple(screen_count)
@@ -0,0 +1,356 @@
+"""Export the screens as decoded records to JSON or TOML files, and import
+them back. Records are written and read one by one.
+
+Each record is a dict like this:
+
+    {
+        "screen": 14, "level": 3, "level_screen": 3,
+        "terrain_middle": "##....##...",  (32 chars, "#" is terrain)
+        "terrain_lower": "###......##",
+        "enemy_lower": {"type": "bat", "position": 20},  (or None, hidden)
+        "enemy_middle": None,
+        "lantern": 12,  (position, or None if hidden)
+        "wall": None,  (position, or None if there is no wall)
+        "magma": False,
+        "side_gap": "right",  (no, alt, right or left)
+        "direction": "right",  (right or left)
+        "data": "90 D4 32 F8 DE B5 42 06"
+    }
+
+"data" has the original bytes. Some bits don't have a decoded attribute
+(and side gaps can be set by several wall positions), so when importing,
+the original bytes are kept if they decode to the same attributes. In TOML
+files, None values are omitted.
+
+When importing, the level layout is also set from "level" and
+"level_screen" if all the 20 levels are in the records.
+"""
+
+import json
+
+from heroed import hero
+from heroed.screen import (
+    ENEMY_NAMES,
+    SIDE_GAP_NAMES,
+    DIRECTION_NAMES,
+    get_enemy,
+    get_object_position,
+    get_magma,
+    get_sidegap,
+    get_righttoleft,
+    bytes_to_data,
+    data_to_bytes,
+)
+
+try:
+    import tomllib
+except ImportError:  # python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+class LevelsFileError(ValueError):
+    pass
+
+
+# keys of a record that are not decoded attributes
+_POSITION_KEYS = ("screen", "level", "level_screen", "data")
+
+
+def _terrain_to_str(data):
+    return "".join("{:08b}".format(byte) for byte in data).translate(
+        str.maketrans("01", ".#")
+    )
+
+
+def _str_to_terrain(row, reverse_rightside):
+    """returns the 2 terrain bytes of a row of 32 chars"""
+    bits = row.translate(str.maketrans(".#", "01"))
+    if len(bits) != 32 or set(bits) - {"0", "1"}:
+        raise LevelsFileError('invalid terrain row "%s"' % row)
+    data = int(bits, 2).to_bytes(4, "big")
+    terrain_bytes = data_to_bytes(data)
+    if bytes_to_data(terrain_bytes, reverse_rightside) != data:
+        raise LevelsFileError('the terrain row "%s" is not symmetric' % row)
+    return terrain_bytes
+
+
+def screen_record(screen_number, screen_data, level, level_screen):
+    """returns the record (dict) of a screen"""
+    side_gap = get_sidegap(screen_data)
+    record = {
+        "screen": screen_number,
+        "level": level,
+        "level_screen": level_screen,
+        "terrain_middle": _terrain_to_str(
+            bytes_to_data(
+                screen_data[
+                    hero.BYTE_LATERAL_MID : hero.BYTE_CENTER_MID + 1 : 2
+                ],
+                side_gap == 1,
+            )
+        ),
+        "terrain_lower": _terrain_to_str(
+            bytes_to_data(
+                screen_data[
+                    hero.BYTE_LATERAL_LOW : hero.BYTE_CENTER_LOW + 1 : 2
+                ],
+                False,
+            )
+        ),
+    }
+    for key, byte in (
+        ("enemy_lower", hero.BYTE_ENEMY_LOW),
+        ("enemy_middle", hero.BYTE_ENEMY_MID),
+    ):
+        enemy = get_enemy(screen_data, byte)
+        record[key] = enemy and {
+            "type": enemy,
+            "position": get_object_position(screen_data, byte),
+        }
+    record["lantern"] = get_object_position(screen_data, hero.BYTE_LANTERN)
+    record["wall"] = get_object_position(screen_data, hero.BYTE_WALL)
+    record["magma"] = get_magma(screen_data)
+    record["side_gap"] = SIDE_GAP_NAMES[side_gap]
+    record["direction"] = DIRECTION_NAMES[get_righttoleft(screen_data)]
+    record["data"] = " ".join("%02X" % byte for byte in screen_data)
+    return record
+
+
+def _attributes(screen_data):
+    """returns the decoded attributes of a record"""
+    record = screen_record(0, screen_data, None, None)
+    for key in _POSITION_KEYS:
+        del record[key]
+    return record
+
+
+def _encode_object(position, default=hero.OBJECT_HIDDEN_POS):
+    if position is None:
+        position = default
+    if not 0 <= position <= 63:
+        raise LevelsFileError("invalid object position %s" % position)
+    return position << 2
+
+
+def _encode_record(record):
+    side_gap = SIDE_GAP_NAMES.index(record.get("side_gap", "no"))
+    direction = DIRECTION_NAMES.index(record.get("direction", "right"))
+    screen_data = bytearray(8)
+    for key, byte in (
+        ("enemy_lower", hero.BYTE_ENEMY_LOW),
+        ("enemy_middle", hero.BYTE_ENEMY_MID),
+    ):
+        enemy = record.get(key)
+        if enemy:
+            screen_data[byte] = _encode_object(
+                enemy["position"]
+            ) | ENEMY_NAMES.index(enemy["type"])
+        else:
+            screen_data[byte] = _encode_object(None)
+    screen_data[hero.BYTE_LANTERN] = (
+        _encode_object(record.get("lantern")) | direction
+    )
+
+    wall = record.get("wall")
+    if side_gap == 2:  # right side gap, no wall
+        wall = 1
+    elif side_gap == 3:  # left side gap, no wall
+        wall = 36
+    screen_data[hero.BYTE_WALL] = (
+        _encode_object(wall, 0)
+        | (hero.MAGMA_BIT if record.get("magma") else 0)
+        | (hero.ALT_RIGHTSIDE_BIT if side_gap == 1 else 0)
+    )
+    (
+        screen_data[hero.BYTE_LATERAL_MID],
+        screen_data[hero.BYTE_CENTER_MID],
+    ) = _str_to_terrain(record["terrain_middle"], side_gap == 1)
+    (
+        screen_data[hero.BYTE_LATERAL_LOW],
+        screen_data[hero.BYTE_CENTER_LOW],
+    ) = _str_to_terrain(record["terrain_lower"], False)
+
+    # keep the original bytes that decode to the same attributes, so the
+    # bits that don't have a decoded attribute are preserved
+    if "data" in record:
+        original_data = bytearray.fromhex(record["data"])
+        if len(original_data) != 8:
+            raise LevelsFileError("invalid data")
+        attributes = _attributes(screen_data)
+        for byte in range(8):
+            candidate = bytearray(screen_data)
+            candidate[byte] = original_data[byte]
+            if _attributes(candidate) == attributes:
+                screen_data = candidate
+    return screen_data
+
+
+def encode_record(record):
+    """returns the screen data (bytearray) of a record"""
+    try:
+        return _encode_record(record)
+    except KeyError as err:
+        raise LevelsFileError(
+            "screen %s: missing %s" % (record.get("screen"), err)
+        ) from None
+    except (ValueError, TypeError, AttributeError) as err:
+        raise LevelsFileError(
+            "screen %s: %s" % (record.get("screen"), err)
+        ) from None
+
+
+def iter_records(editor):
+    """yield the records of the 256 screens of an editor"""
+    tables = editor.screens_tables()
+    for screen_number in range(256):
+        level, level_screen = hero.get_levelscr_from_absscr(
+            screen_number,
+            editor.level_initial_screens,
+            editor.level_screen_count,
+        )
+        yield screen_record(
+            screen_number,
+            bytearray(table[screen_number] for table in tables),
+            level,
+            level_screen,
+        )
+
+
+def write_json(records, f):
+    """write the records as a JSON list, one record per line"""
+    f.write("[\n")
+    for n, record in enumerate(records):
+        f.write(",\n" if n else "")
+        f.write(json.dumps(record))
+    f.write("\n]\n")
+
+
+def read_json(f, chunk_size=8192):
+    """yield the records of a JSON list, decoding them one by one"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    while True:
+        chunk = f.read(chunk_size)
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    break
+                if buffer[0] != "[":
+                    raise LevelsFileError("a JSON list was expected")
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer[:1] == ",":
+                buffer = buffer[1:]
+                continue
+            if buffer[:1] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if not chunk:
+                    raise LevelsFileError("invalid JSON file") from None
+                break  # the record is not complete, read more
+            buffer = buffer[end:]
+            yield record
+        if not chunk:
+            raise LevelsFileError("unexpected end of the JSON file")
+
+
+def _toml_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    elif isinstance(value, dict):
+        return "{ %s }" % ", ".join(
+            "%s = %s" % (key, _toml_value(item)) for key, item in value.items()
+        )
+    return json.dumps(value)  # int and str are the same in TOML
+
+
+def write_toml(records, f):
+    """write the records as an array of [[screen]] tables"""
+    for n, record in enumerate(records):
+        f.write("\n" if n else "")
+        f.write("[[screen]]\n")
+        for key, value in record.items():
+            if value is not None:
+                f.write("%s = %s\n" % (key, _toml_value(value)))
+
+
+def read_toml(f):
+    """yield the records of the [[screen]] tables, parsing them one by one"""
+    if tomllib is None:
+        raise LevelsFileError(
+            "reading TOML files requires Python 3.11+ or the tomli package"
+        )
+
+    def parse(lines):
+        try:
+            return tomllib.loads("".join(lines))
+        except tomllib.TOMLDecodeError as err:
+            raise LevelsFileError("invalid TOML file: %s" % err) from None
+
+    lines = None
+    for line in f:
+        if line.strip() == "[[screen]]":
+            if lines is not None:
+                yield parse(lines)
+            lines = []
+        elif lines is not None:
+            lines.append(line)
+        elif line.strip() and not line.lstrip().startswith("#"):
+            raise LevelsFileError("a [[screen]] table was expected")
+    if lines is not None:
+        yield parse(lines)
+
+
+def export_levels(editor, filename):
+    """write the records of all the screens to a JSON or TOML file"""
+    with open(filename, "w") as f:
+        if filename.lower().endswith(".toml"):
+            write_toml(iter_records(editor), f)
+        else:
+            write_json(iter_records(editor), f)
+
+
+def import_levels(filename):
+    """read the records of a JSON or TOML file, and return them as a patch
+    (see heroed.patch.parse_patch)
+    """
+    screens = {}
+    levels = {}
+    with open(filename) as f:
+        if filename.lower().endswith(".toml"):
+            records = read_toml(f)
+        else:
+            records = read_json(f)
+        for record in records:
+            screen_number = record.get("screen")
+            if screen_number not in range(256):
+                raise LevelsFileError("invalid screen %s" % screen_number)
+            screens[str(screen_number)] = encode_record(record).hex()
+            if record.get("level") is not None:
+                levels.setdefault(record["level"], []).append(screen_number)
+
+    patch = {"screens": screens}
+    if sorted(levels) == list(range(1, 21)):
+        patch["level_initial_screens"] = [
+            min(levels[level]) for level in range(1, 21)
+        ]
+        patch["level_screen_count"] = [
+            len(levels[level]) for level in range(1, 21)
+        ]
+        for level, screens_of_level in levels.items():
+            if max(screens_of_level) - min(screens_of_level) + 1 != len(
+                screens_of_level
+            ):
+                raise LevelsFileError(
+                    "the screens of level %d are not contiguous" % level
+                )
+    return patch
@@ -0,0 +1,172 @@
+"""Three-way merge of two modified ROMs ("ours" and "theirs") against the
+original ROM ("base").
+
+Each change made in only one of the ROMs is merged. When both ROMs change
+the same thing in different ways, there is a conflict, and the value of the
+preferred ROM is used. The merge granularity is:
+
+screens             each data byte of each screen (so two mods can edit
+                    different objects or terrain of the same screen)
+level layout        the initial screen and screen count of each level
+title messages      each one of the 4 messages
+"""
+
+from typing import NamedTuple
+
+from heroed import hero
+from heroed.layout import check_level_layout
+
+OURS = "ours"
+THEIRS = "theirs"
+
+
+class Conflict(NamedTuple):
+    kind: str  # "screen", "level" or "title message"
+    number: int  # screen number, level (1..20) or message number
+    detail: str
+
+    def __str__(self):
+        return "%s %d: %s" % (self.kind, self.number, self.detail)
+
+
+def _merge_value(base, ours, theirs, prefer):
+    """returns (merged value, True if there is a conflict)"""
+    if ours == theirs or theirs == base:
+        return ours, False
+    elif ours == base:
+        return theirs, False
+    return (ours if prefer == OURS else theirs), True
+
+
+def _merge_screens(base, ours, theirs, merged, prefer):
+    conflicts = []
+    tables = hero.SCREENS_TABLES_ADDRESSES
+    for screen_number in range(256):
+        offsets = [address + screen_number for address in tables]
+        base_screen = bytes(base[offset] for offset in offsets)
+        our_screen = bytes(ours[offset] for offset in offsets)
+        their_screen = bytes(theirs[offset] for offset in offsets)
+        screen, conflict = _merge_value(
+            base_screen, our_screen, their_screen, prefer
+        )
+        if conflict:
+            # merge byte by byte
+            screen = bytearray(8)
+            conflict_bytes = []
+            for byte in range(8):
+                screen[byte], conflict = _merge_value(
+                    base_screen[byte],
+                    our_screen[byte],
+                    their_screen[byte],
+                    prefer,
+                )
+                if conflict:
+                    conflict_bytes.append(byte)
+            if conflict_bytes:
+                conflicts.append(
+                    Conflict(
+                        "screen",
+                        screen_number,
+                        "; ".join(
+                            "byte %d: base %02X, ours %02X, theirs %02X"
+                            % (
+                                byte,
+                                base_screen[byte],
+                                our_screen[byte],
+                                their_screen[byte],
+                            )
+                            for byte in conflict_bytes
+                        ),
+                    )
+                )
+        for offset, value in zip(offsets, screen):
+            merged[offset] = value
+    return conflicts
+
+
+def _merge_level_layout(base, ours, theirs, merged, prefer):
+    conflicts = []
+    initial_address = hero.LEVEL_INITIAL_SCREEN_ADDRESS
+    count_address = hero.LEVEL_SCREEN_COUNT_ADDRESS
+    for level in range(20):
+        offsets = (initial_address + level, count_address + level)
+        layouts = [
+            tuple(rom[offset] for offset in offsets)
+            for rom in (base, ours, theirs)
+        ]
+        layout, conflict = _merge_value(*layouts, prefer)
+        if conflict:
+            conflicts.append(
+                Conflict(
+                    "level",
+                    level + 1,
+                    ", ".join(
+                        "%s screens %d-%d"
+                        % (name, initial, initial + count_byte)
+                        for name, (initial, count_byte) in zip(
+                            ("base", OURS, THEIRS), layouts
+                        )
+                    ),
+                )
+            )
+        merged[offsets[0]], merged[offsets[1]] = layout
+    return conflicts
+
+
+def _merge_title_messages(base, ours, theirs, merged, prefer):
+    conflicts = []
+    for message_number, address in enumerate(
+        hero.TITLE_SCREEN_MESSAGES_ADDRESSES
+    ):
+        messages = [
+            rom[address : address + 32] for rom in (base, ours, theirs)
+        ]
+        message, conflict = _merge_value(*messages, prefer)
+        if conflict:
+            conflicts.append(
+                Conflict(
+                    "title message",
+                    message_number,
+                    ", ".join(
+                        '%s "%s"'
+                        % (
+                            name,
+                            "".join(
+                                hero.HERO_TO_ASCII[char & 0x7F]
+                                for char in message
+                            ),
+                        )
+                        for name, message in zip(
+                            ("base", OURS, THEIRS), messages
+                        )
+                    ),
+                )
+            )
+        merged[address : address + 32] = message
+    return conflicts
+
+
+def merge_roms(base, ours, theirs, prefer=OURS):
+    """merge the ROM contents (bytes), returning a tuple with the merged ROM
+    (bytearray), a list of Conflict, and a list of the errors
+    (heroed.layout.LayoutIssue) of the merged level layout
+    """
+    if not len(base) == len(ours) == len(theirs):
+        raise ValueError("the ROM files have different sizes")
+    merged = bytearray(ours)
+    conflicts = (
+        _merge_level_layout(base, ours, theirs, merged, prefer)
+        + _merge_title_messages(base, ours, theirs, merged, prefer)
+        + _merge_screens(base, ours, theirs, merged, prefer)
+    )
+    initial_address = hero.LEVEL_INITIAL_SCREEN_ADDRESS
+    count_address = hero.LEVEL_SCREEN_COUNT_ADDRESS
+    layout_errors = [
+        issue
+        for issue in check_level_layout(
+            merged[initial_address : initial_address + 20],
+            [b + 1 for b in merged[count_address : count_address + 20]],
+        )
+        if issue.is_error
+    ]
+    return merged, conflicts, layout_errors
@@ -0,0 +1,148 @@
+"""Declarative patches, applied to ROM files without the editor UI.
+
+A patch is a JSON file like this (all the keys are optional):
+
+    {
+        "screens": {"12": "90 90 90 00 FF 00 0F 40", ...},
+        "level_initial_screens": [0, 2, 6, ...],
+        "level_screen_count": [2, 4, 6, ...],
+        "title_messages": {"1": "   DESIGNED BY SOMEONE ELSE     "},
+        "mod_name": "MY FIRST MOD"
+    }
+
+screens             8 data bytes of each screen, in hex
+level_*             the 20 values of the level layout tables
+title_messages      the 4 title screen messages, of 32 chars
+mod_name            the name of the mod, written in the title message 0,
+                    as the editor does
+
+Patches are applied to the whole ROM contents in memory, so each file is
+read and written only once.
+"""
+
+import json
+
+from heroed import hero
+from heroed.layout import check_level_layout
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _parse_screens(screens):
+    parsed = {}
+    for screen_number, screen_data in screens.items():
+        try:
+            screen_number = int(screen_number)
+            screen_data = bytes.fromhex(screen_data)
+        except ValueError:
+            raise PatchError('invalid screen "%s"' % screen_number) from None
+        if not 0 <= screen_number <= 255 or len(screen_data) != 8:
+            raise PatchError('invalid screen "%s"' % screen_number)
+        parsed[screen_number] = screen_data
+    return parsed
+
+
+def _parse_title_messages(messages):
+    parsed = {}
+    for message_number, message in messages.items():
+        message_number = int(message_number)
+        if not 0 <= message_number < 4 or len(message) != 32:
+            raise PatchError('invalid title message "%s"' % message_number)
+        if any(
+            char != " " and char not in hero.HERO_TO_ASCII for char in message
+        ):
+            raise PatchError(
+                'invalid chars in title message "%s"' % message_number
+            )
+        parsed[message_number] = message
+    return parsed
+
+
+def parse_patch(data):
+    """validate a patch (a dict, as loaded from JSON) and return it with
+    the values converted: screens as {int: bytes}, title messages as
+    {int: str}, and level tables as tuples
+    """
+    patch = {}
+    patch["screens"] = _parse_screens(data.get("screens", {}))
+
+    messages = data.get("title_messages", {})
+    if isinstance(messages, list):
+        messages = dict(enumerate(messages))
+    if "mod_name" in data:
+        if len(data["mod_name"]) > 15:
+            raise PatchError("the mod name has more than 15 chars")
+        messages[0] = hero.mod_title_screen_message(data["mod_name"].upper())
+    patch["title_messages"] = _parse_title_messages(messages)
+
+    if ("level_initial_screens" in data) != ("level_screen_count" in data):
+        raise PatchError(
+            "level_initial_screens and level_screen_count must be together"
+        )
+    if "level_initial_screens" in data:
+        initial_screens = tuple(data["level_initial_screens"])
+        screen_count = tuple(data["level_screen_count"])
+        if (
+            len(initial_screens) != 20
+            or len(screen_count) != 20
+            or not all(0 <= screen <= 255 for screen in initial_screens)
+            or not all(1 <= count <= 256 for count in screen_count)
+        ):
+            raise PatchError("invalid level layout")
+        errors = [
+            issue
+            for issue in check_level_layout(initial_screens, screen_count)
+            if issue.is_error
+        ]
+        if errors:
+            raise PatchError("invalid level layout, %s" % errors[0])
+        patch["level_initial_screens"] = initial_screens
+        patch["level_screen_count"] = screen_count
+    return patch
+
+
+def load_patch(filename):
+    """read and validate a JSON patch file"""
+    with open(filename) as f:
+        try:
+            return parse_patch(json.load(f))
+        except (ValueError, TypeError, AttributeError) as err:
+            raise PatchError("%s: %s" % (filename, err)) from None
+
+
+def apply_patch(rom, patch):
+    """apply a patch (see parse_patch) to the ROM contents (bytearray)"""
+    for screen_number, screen_data in patch["screens"].items():
+        for offset, byte in zip(hero.SCREENS_TABLES_ADDRESSES, screen_data):
+            rom[offset + screen_number] = byte
+
+    if "level_initial_screens" in patch:
+        offset = hero.LEVEL_INITIAL_SCREEN_ADDRESS
+        rom[offset : offset + 20] = bytes(patch["level_initial_screens"])
+        offset = hero.LEVEL_SCREEN_COUNT_ADDRESS
+        rom[offset : offset + 20] = bytes(
+            count - 1 for count in patch["level_screen_count"]
+        )
+
+    for message_number, message in patch["title_messages"].items():
+        offset = hero.TITLE_SCREEN_MESSAGES_ADDRESSES[message_number]
+        rom[offset : offset + 32] = bytes(
+            hero.ASCII_TO_HERO[ord(char)] for char in message
+        )
+
+
+def apply_patch_to_file(patch, romfile, output_file=None):
+    """apply a patch to a ROM file, writing the result to output_file, or
+    to the same file. Returns output_file.
+    """
+    with open(romfile, "rb") as f:
+        rom = bytearray(f.read())
+    if len(rom) < hero.MIN_ROM_SIZE:
+        raise PatchError("%s: the ROM file is too small" % romfile)
+    apply_patch(rom, patch)
+    output_file = output_file or romfile
+    with open(output_file, "wb") as f:
+        f.write(rom)
+    return output_file
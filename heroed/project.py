@@ -0,0 +1,274 @@
+"""Project files (.heroed): the unsaved modifications of an editing session,
+to continue it later.
+
+A project file stores the SHA-1 of the ROM file it was made for, so it's
+only loaded if the ROM file has not been modified since then. The file is a
+compact binary layout (little-endian), read at once and decoded with
+struct:
+
+    header          see HEADER below
+    romfile         path of the ROM file, relative to the project file
+                    (utf-8, the length is in the header)
+    screens         the modified screens: number (1 byte) and data (8 bytes)
+    undo history    for each step: screens count (2 bytes), layout flag
+                    (1 byte), the previous screens (as above) and, if the
+                    flag is set, the previous level layout (40 bytes)
+    CRC32           of all the previous bytes (4 bytes)
+
+The level layout (40 bytes) is stored as in the ROM: 20 initial screens and
+20 screen counts minus 1.
+"""
+
+import os.path
+import struct
+import hashlib
+import zlib
+from typing import NamedTuple
+
+from heroed import hero
+from heroed.editor import UndoEntry
+
+PROJECT_EXTENSION = ".heroed"
+MAGIC = b"HEROED\x1a\x00"
+VERSION = 1
+
+# magic, version, ROM SHA-1, selected screen, mode, terrain cursor (x, y),
+# objects cursor, title messages (4x32 chars), level layout, romfile length,
+# modified screens count, undo steps count
+HEADER = struct.Struct("<8sH20sBBBBB128s40sHHI")
+SCREEN = struct.Struct("<B8s")
+UNDO_STEP = struct.Struct("<HB")
+CRC = struct.Struct("<I")
+LAYOUT_SIZE = 40
+
+
+class ProjectError(ValueError):
+    pass
+
+
+class EditorState(NamedTuple):
+    """the state of the editor UI"""
+
+    selected_screen: int = 0
+    mode: int = 0  # 0 terrain, 1 objects
+    terrain_cursor: tuple = (0, 0)
+    objects_cursor: int = hero.BYTE_ENEMY_LOW
+
+
+class Project(NamedTuple):
+    romfile: str
+    rom_sha1: bytes
+    modified_screens: dict  # {screen number: bytes}
+    level_initial_screens: tuple
+    level_screen_count: tuple
+    title_messages: tuple  # 4 str of 32 chars
+    undo_history: list  # list of heroed.editor.UndoEntry
+    state: EditorState
+
+
+def project_filename(romfile):
+    """the default project file of a ROM file"""
+    return os.path.splitext(romfile)[0] + PROJECT_EXTENSION
+
+
+def rom_sha1(romfile):
+    with open(romfile, "rb") as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def _pack_layout(level_initial_screens, level_screen_count):
+    return bytes(level_initial_screens) + bytes(
+        count - 1 for count in level_screen_count
+    )
+
+
+def _unpack_layout(data):
+    return tuple(data[:20]), tuple(b + 1 for b in data[20:LAYOUT_SIZE])
+
+
+def _pack_screens(screens):
+    return b"".join(
+        SCREEN.pack(screen_number, bytes(screen_data))
+        for screen_number, screen_data in sorted(screens.items())
+    )
+
+
+def _unpack_screens(data, offset, count):
+    screens = {}
+    for screen_number, screen_data in SCREEN.iter_unpack(
+        data[offset : offset + count * SCREEN.size]
+    ):
+        screens[screen_number] = screen_data
+    return screens, offset + count * SCREEN.size
+
+
+def pack_project(project):
+    """returns the bytes of a project file"""
+    romfile = project.romfile.encode("utf-8")
+    state = project.state
+    data = bytearray(
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            project.rom_sha1,
+            state.selected_screen,
+            state.mode,
+            *state.terrain_cursor,
+            state.objects_cursor,
+            bytes(
+                hero.ASCII_TO_HERO[ord(char)]
+                for message in project.title_messages
+                for char in message
+            ),
+            _pack_layout(
+                project.level_initial_screens, project.level_screen_count
+            ),
+            len(romfile),
+            len(project.modified_screens),
+            len(project.undo_history),
+        )
+    )
+    data += romfile
+    data += _pack_screens(project.modified_screens)
+    for entry in project.undo_history:
+        data += UNDO_STEP.pack(len(entry.screens), entry.layout is not None)
+        data += _pack_screens(entry.screens)
+        if entry.layout is not None:
+            data += _pack_layout(*entry.layout)
+    data += CRC.pack(zlib.crc32(data))
+    return bytes(data)
+
+
+def unpack_project(data):
+    """returns the Project of the bytes of a project file"""
+    data = memoryview(data)
+    if len(data) < HEADER.size + CRC.size or data[:8] != MAGIC:
+        raise ProjectError("not a heroed project file")
+    (crc,) = CRC.unpack_from(data, len(data) - CRC.size)
+    if zlib.crc32(data[: -CRC.size]) != crc:
+        raise ProjectError("the project file is corrupted")
+    (
+        _,
+        version,
+        sha1,
+        selected_screen,
+        mode,
+        cursor_x,
+        cursor_y,
+        objects_cursor,
+        title_messages,
+        layout,
+        romfile_length,
+        screens_count,
+        undo_count,
+    ) = HEADER.unpack_from(data)
+    if version > VERSION:
+        raise ProjectError(
+            "the project file is from a newer version of heroed"
+        )
+
+    offset = HEADER.size
+    romfile = bytes(data[offset : offset + romfile_length]).decode("utf-8")
+    offset += romfile_length
+    modified_screens, offset = _unpack_screens(data, offset, screens_count)
+    undo_history = []
+    for _ in range(undo_count):
+        count, has_layout = UNDO_STEP.unpack_from(data, offset)
+        screens, offset = _unpack_screens(data, offset + UNDO_STEP.size, count)
+        entry = UndoEntry(screens)
+        if has_layout:
+            entry.layout = _unpack_layout(data[offset : offset + LAYOUT_SIZE])
+            offset += LAYOUT_SIZE
+        undo_history.append(entry)
+
+    return Project(
+        romfile,
+        sha1,
+        modified_screens,
+        *_unpack_layout(layout),
+        tuple(
+            "".join(
+                hero.HERO_TO_ASCII[char & 0x7F]
+                for char in title_messages[n : n + 32]
+            )
+            for n in range(0, 128, 32)
+        ),
+        undo_history,
+        EditorState(
+            selected_screen, mode, (cursor_x, cursor_y), objects_cursor
+        ),
+    )
+
+
+def make_project(filename, editor, state, sha1=None):
+    """returns the Project with the modifications of an editor, and the
+    EditorState, to write it to filename. sha1 is the SHA-1 of the ROM
+    file, if it is already known.
+    """
+    romfile = os.path.abspath(editor.hero_ed_rom.name)
+    sha1 = sha1 or rom_sha1(romfile)
+    try:
+        romfile = os.path.relpath(
+            romfile, os.path.dirname(os.path.abspath(filename))
+        )
+    except ValueError:  # in another drive (Windows)
+        pass
+    return Project(
+        romfile,
+        sha1,
+        editor.modified_screens,
+        editor.level_initial_screens,
+        editor.level_screen_count,
+        tuple(editor.get_title_screen_message(n) for n in range(4)),
+        list(editor.undo_history),
+        state,
+    )
+
+
+def write_project(filename, project):
+    """write a project file, replacing it at once when it's complete"""
+    with open(filename + ".tmp", "wb") as f:
+        f.write(pack_project(project))
+    os.replace(filename + ".tmp", filename)
+
+
+def save_project(filename, editor, state):
+    """write the modifications of an editor, and the EditorState, to a
+    project file"""
+    write_project(filename, make_project(filename, editor, state))
+
+
+def load_project(filename):
+    """read a project file (with a single read), returning the Project,
+    with the absolute path of the romfile
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    try:
+        project = unpack_project(data)
+    except struct.error:
+        raise ProjectError("the project file is truncated") from None
+    romfile = os.path.join(
+        os.path.dirname(os.path.abspath(filename)), project.romfile
+    )
+    if not os.path.isfile(romfile):
+        raise ProjectError('ROM file "%s" not found' % romfile)
+    if rom_sha1(romfile) != project.rom_sha1:
+        raise ProjectError(
+            "the ROM file %s has been modified since the project was saved"
+            % romfile
+        )
+    return project._replace(romfile=romfile)
+
+
+def restore_project(editor, project):
+    """restore the modifications of a project in an editor (of its ROM
+    file). Returns the EditorState."""
+    editor.restore_modifications(
+        project.modified_screens,
+        project.level_initial_screens,
+        project.level_screen_count,
+        project.title_messages,
+        project.undo_history,
+    )
+    return project.state
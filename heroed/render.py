@@ -0,0 +1,308 @@
+"""Render screens to images (PNG or PPM) without the terminal.
+
+A screen is decoded to "cells" the same way heroed.ui.screen_drawing draws
+it in the terminal: 17 rows of 64 cells (2 cells per MSX tile), where each
+cell is the MSX palette color of the terminal char. That includes the upper
+area rule (the preset of initial screens, the solid upper area after water
+screens, or else the lower area of the prior screen), the side gaps, water
+below the screens >= 11 of a level, magma, the wall, enemies, lantern, the
+miner of final screens and the arrow of initial screens.
+
+Cells are bytes, so screens are stacked or put side by side just joining
+them, and each cell is CELL_WIDTH x CELL_HEIGHT pixels in the images (a
+screen is 256x136 pixels, like in the MSX). PNG images are written with
+the palette (one byte per pixel), and the scanlines of a cell row are
+built once and repeated.
+"""
+
+import struct
+import zlib
+
+from heroed import hero
+from heroed.screen import (
+    get_magma,
+    get_sidegap,
+    bytes_to_screen_str,
+    byte_to_position,
+    position_to_screen_pos,
+    byte_to_enemy_type,
+)
+
+CELL_WIDTH = 4
+CELL_HEIGHT = 8
+SCREEN_ROWS = 17
+SCREEN_COLUMNS = 64
+
+# MSX1 (TMS9918) palette
+MSX_PALETTE = (
+    (0, 0, 0),  # 0 - transparent
+    (0, 0, 0),  # 1 - black
+    (33, 200, 66),  # 2 - medium green
+    (94, 220, 120),  # 3 - light green
+    (84, 85, 237),  # 4 - dark blue
+    (125, 118, 252),  # 5 - light blue
+    (212, 82, 77),  # 6 - dark red
+    (66, 235, 245),  # 7 - cyan
+    (252, 85, 84),  # 8 - medium red
+    (255, 121, 120),  # 9 - light red
+    (212, 193, 84),  # 10 - dark yellow
+    (230, 206, 128),  # 11 - light yellow
+    (33, 176, 59),  # 12 - dark green
+    (201, 91, 186),  # 13 - magenta
+    (204, 204, 204),  # 14 - grey
+    (255, 255, 255),  # 15 - white
+)
+BLACK = 1
+GREEN = 2
+BRIGHT_GREEN = 3
+CYAN = 7
+RED = 8
+YELLOW = 10
+BRIGHT_YELLOW = 11
+MAGENTA = 13
+WHITE = 14
+
+# terrain colors of hero.get_level_color()
+TERRAIN_COLORS = (YELLOW, GREEN, 4, WHITE)
+
+# objects, as rows of colors (the spaces of the terminal are black)
+SPRITES = {
+    hero.ENEMY_SPIDER: ((BLACK, GREEN, BLACK), (RED, RED, RED)),
+    hero.ENEMY_BAT: ((RED, RED, RED), (RED, RED, RED)),
+    hero.ENEMY_MOTH: ((WHITE, RED, WHITE), (WHITE, RED, WHITE)),
+    hero.ENEMY_SNAKE: ((BRIGHT_GREEN,) * 3,),
+}
+LANTERN_SPRITE = ((WHITE, WHITE), (WHITE, WHITE))
+MINER_LEFT_SPRITE = ((BLACK, YELLOW), (BLACK, GREEN, WHITE))
+MINER_RIGHT_SPRITE = ((BLACK, YELLOW, BLACK), (GREEN, WHITE, BLACK))
+ARROW = (" || ", "_||_", "\\  /", " \\/ ")
+ARROW_SPRITE = tuple(
+    tuple(BLACK if char == " " else BRIGHT_YELLOW for char in line)
+    for line in ARROW
+)
+
+
+class ImageFormatError(ValueError):
+    pass
+
+
+def _terrain_row(screen_str, color):
+    """a row of cells from a str of "0" and "1" (see heroed.screen)"""
+    return bytearray(
+        screen_str.encode().translate(
+            bytes.maketrans(b"01", bytes((BLACK, color)))
+        )
+    )
+
+
+def _draw_sprite(cells, x, y, sprite):
+    for row, colors in enumerate(sprite, y):
+        cells[row][x : x + len(colors)] = bytes(colors)
+
+
+def screen_cells(
+    screen_number,
+    screen_data,
+    prior_screen_data,
+    level_initial_screens,
+    level_screen_count,
+):
+    """returns the cells of a screen: a list of SCREEN_ROWS bytearrays of
+    SCREEN_COLUMNS colors. prior_screen_data is None for the screen 0."""
+    level, levelscr = hero.get_levelscr_from_absscr(
+        screen_number, level_initial_screens, level_screen_count
+    )
+    final_screens = hero.final_screens(
+        level_initial_screens, level_screen_count
+    )
+    is_initial = screen_number in level_initial_screens
+    water = levelscr is not None and levelscr >= 11
+    terrain_color = TERRAIN_COLORS[hero.get_level_color(level)]
+
+    # upper area
+    if is_initial:
+        row = bytes_to_screen_str((0xC0, 0xFE))[:32] + "1" * 32
+    elif (levelscr is not None and levelscr > 11) or not prior_screen_data:
+        row = bytes_to_screen_str((0xFF, 0xFF))
+    else:
+        row = bytes_to_screen_str(
+            prior_screen_data[
+                hero.BYTE_LATERAL_LOW : hero.BYTE_CENTER_LOW + 1 : 2
+            ]
+        )
+    cells = [_terrain_row(row, terrain_color) for _ in range(6)]
+
+    # middle area, with the side gaps
+    side_gap = get_sidegap(screen_data)
+    row = bytes_to_screen_str(
+        screen_data[hero.BYTE_LATERAL_MID : hero.BYTE_CENTER_MID + 1 : 2],
+        side_gap == 1,
+    )
+    # initial and final screens < 11 ignore the side gaps
+    if not (
+        (is_initial or screen_number in final_screens)
+        and levelscr is not None
+        and levelscr < 11
+    ):
+        if side_gap == 2:
+            row = row[:-8] + "0" * 8
+        elif side_gap == 3:
+            row = "0" * 8 + row[8:]
+    if water and side_gap == 0:
+        row = "0" * 8 + row[8:-8] + "0" * 8
+    if water and side_gap == 1:
+        row = "0" * 8 + row[8:]
+        row = row[:32] + "0" * 6 + row[38:]
+    magma = get_magma(screen_data)
+    cells += [
+        _terrain_row(row, RED if magma else terrain_color) for _ in range(5)
+    ]
+
+    # lower area, and water or another lower area row
+    row = bytes_to_screen_str(
+        screen_data[hero.BYTE_LATERAL_LOW : hero.BYTE_CENTER_LOW + 1 : 2]
+    )
+    cells += [_terrain_row(row, terrain_color) for _ in range(6)]
+    if water:
+        cells[16] = bytearray((CYAN,) * SCREEN_COLUMNS)
+
+    if is_initial:
+        _draw_sprite(cells, 14, 1, ARROW_SPRITE)
+
+    # objects
+    pos_lantern = byte_to_position(screen_data[hero.BYTE_LANTERN])
+    if pos_lantern != hero.OBJECT_HIDDEN_POS:
+        _draw_sprite(
+            cells, position_to_screen_pos(pos_lantern) + 1, 1, LANTERN_SPRITE
+        )
+    pos_wall = byte_to_position(screen_data[hero.BYTE_WALL])
+    if is_initial or pos_wall in range(4, 36):
+        wall_x = position_to_screen_pos(15 if is_initial else pos_wall)
+        _draw_sprite(cells, wall_x, 6, ((RED if magma else MAGENTA,) * 3,) * 5)
+    for byte, y in ((hero.BYTE_ENEMY_MID, 7), (hero.BYTE_ENEMY_LOW, 12)):
+        position = byte_to_position(screen_data[byte])
+        if position != hero.OBJECT_HIDDEN_POS:
+            _draw_sprite(
+                cells,
+                position_to_screen_pos(position),
+                y,
+                SPRITES[byte_to_enemy_type(screen_data[byte])],
+            )
+    if screen_number in final_screens:
+        if pos_wall <= 19:
+            _draw_sprite(cells, 13, 9, MINER_LEFT_SPRITE)
+        else:
+            _draw_sprite(cells, 49, 9, MINER_RIGHT_SPRITE)
+
+    # the sprites at the right side can't go out of the screen
+    for row in cells:
+        del row[SCREEN_COLUMNS:]
+    return cells
+
+
+def editor_screen_cells(editor, screen_numbers):
+    """returns a dict with the cells of the screens of an editor"""
+    tables = editor.screens_tables()
+    screens = {}
+    for screen_number in screen_numbers:
+        prior_screen_data = None
+        if screen_number > 0:
+            prior_screen_data = bytes(
+                table[screen_number - 1] for table in tables
+            )
+        screens[screen_number] = screen_cells(
+            screen_number,
+            bytes(table[screen_number] for table in tables),
+            prior_screen_data,
+            editor.level_initial_screens,
+            editor.level_screen_count,
+        )
+    return screens
+
+
+def level_screen_numbers(editor, level):
+    """returns the screens of a level (1..20), in flow order"""
+    initial_screen = editor.level_initial_screens[level - 1]
+    screen_count = editor.level_screen_count[level - 1]
+    return range(initial_screen, min(initial_screen + screen_count, 256))
+
+
+def render_level(editor, level):
+    """returns the cell rows of a level, its screens stacked"""
+    screens = editor_screen_cells(editor, level_screen_numbers(editor, level))
+    return [row for cells in screens.values() for row in cells]
+
+
+# pixels of each color in a cell row, for the palette and RGB images
+_INDEX_PIXELS = tuple(bytes((color,)) * CELL_WIDTH for color in range(16))
+_RGB_PIXELS = tuple(bytes(rgb) * CELL_WIDTH for rgb in MSX_PALETTE)
+
+
+def _scanlines(cell_rows, pixels, prefix=b""):
+    """yields the scanlines of CELL_HEIGHT pixel rows for each cell row"""
+    for row in cell_rows:
+        yield (prefix + b"".join([pixels[color] for color in row])) * (
+            CELL_HEIGHT
+        )
+
+
+def _png_chunk(kind, data):
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def write_png(filename, cell_rows):
+    """write the cell rows to a PNG image with the MSX palette"""
+    width = len(cell_rows[0]) * CELL_WIDTH
+    height = len(cell_rows) * CELL_HEIGHT
+    compressor = zlib.compressobj(6)
+    data = b"".join(
+        compressor.compress(scanlines)
+        for scanlines in _scanlines(cell_rows, _INDEX_PIXELS, b"\0")
+    )
+    data += compressor.flush()
+    with open(filename, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bits per pixel, color type 3 (palette)
+        f.write(
+            _png_chunk(
+                b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+            )
+        )
+        f.write(
+            _png_chunk(b"PLTE", b"".join(bytes(rgb) for rgb in MSX_PALETTE))
+        )
+        f.write(_png_chunk(b"IDAT", data))
+        f.write(_png_chunk(b"IEND", b""))
+
+
+def rgb_pixels(cell_rows):
+    """returns the RGB pixels of the cell rows (3 bytes per pixel)"""
+    return b"".join(_scanlines(cell_rows, _RGB_PIXELS))
+
+
+def write_ppm(filename, cell_rows):
+    """write the cell rows to a PPM (binary RGB) image"""
+    width = len(cell_rows[0]) * CELL_WIDTH
+    height = len(cell_rows) * CELL_HEIGHT
+    with open(filename, "wb") as f:
+        f.write(b"P6\n%d %d\n255\n" % (width, height))
+        f.writelines(_scanlines(cell_rows, _RGB_PIXELS))
+
+
+IMAGE_WRITERS = {".png": write_png, ".ppm": write_ppm}
+
+
+def write_image(filename, cell_rows):
+    """write the cell rows to a PNG or PPM image, depending on the
+    extension of filename"""
+    extension = filename[filename.rfind(".") :].lower()
+    if extension not in IMAGE_WRITERS:
+        raise ImageFormatError(
+            "unknown image format, use %s" % " or ".join(IMAGE_WRITERS)
+        )
+    IMAGE_WRITERS[extension](filename, cell_rows)
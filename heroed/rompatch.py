@@ -0,0 +1,267 @@
+"""Export and import the modifications of a ROM as IPS or BPS patches.
+
+Only the regions that the editor can modify (hero.EDITABLE_REGIONS) are
+compared, and the modified bytes are coalesced in records: two runs of
+modified bytes are joined if the unmodified bytes between them are fewer
+than the size of a new record header.
+
+IPS patches don't have any checksum, so they can be applied to any ROM. BPS
+patches have the CRC32 of the base ROM, and they're only applied if it
+matches. The patch target is the base ROM with the editable regions of the
+modified ROM (see patch_target), so the modifications outside those
+regions are not in the patch.
+"""
+
+import zlib
+
+from heroed import hero
+
+IPS_HEADER = b"PATCH"
+IPS_FOOTER = b"EOF"
+IPS_RECORD_HEADER_SIZE = 5  # 3 bytes offset, 2 bytes size
+IPS_MAX_RECORD_SIZE = 0xFFFF
+
+BPS_HEADER = b"BPS1"
+BPS_FOOTER_SIZE = 12  # 3 CRC32: source, target and patch
+BPS_SOURCE_READ = 0
+BPS_TARGET_READ = 1
+BPS_SOURCE_COPY = 2
+BPS_TARGET_COPY = 3
+
+
+class RomPatchError(ValueError):
+    pass
+
+
+def diff_records(source, target, regions=hero.EDITABLE_REGIONS, gap=0):
+    """returns a list of (offset, bytes) records with the bytes of target
+    that are different from source, inside the regions, sorted by offset.
+    Runs separated by up to gap unmodified bytes are joined in one record.
+    """
+    records = []
+    for address, length in sorted(regions):
+        run_start = None
+        last_modified = None
+        for offset in range(address, address + length):
+            if source[offset] == target[offset]:
+                continue
+            if run_start is not None and offset - last_modified - 1 > gap:
+                records.append(
+                    (run_start, bytes(target[run_start : last_modified + 1]))
+                )
+                run_start = None
+            if run_start is None:
+                run_start = offset
+            last_modified = offset
+        if run_start is not None:
+            records.append(
+                (run_start, bytes(target[run_start : last_modified + 1]))
+            )
+    return records
+
+
+def patch_target(source, target, regions=hero.EDITABLE_REGIONS):
+    """returns a copy of source with the bytes of target inside the regions,
+    i.e. the result of applying the patch to source"""
+    result = bytearray(source)
+    for address, length in regions:
+        result[address : address + length] = target[address : address + length]
+    return result
+
+
+def make_ips(source, target):
+    """returns the bytes of an IPS patch from source to target"""
+    patch = bytearray(IPS_HEADER)
+    for offset, data in diff_records(
+        source, target, gap=IPS_RECORD_HEADER_SIZE
+    ):
+        for start in range(0, len(data), IPS_MAX_RECORD_SIZE):
+            chunk = data[start : start + IPS_MAX_RECORD_SIZE]
+            patch += (offset + start).to_bytes(3, "big")
+            patch += len(chunk).to_bytes(2, "big")
+            patch += chunk
+    patch += IPS_FOOTER
+    return bytes(patch)
+
+
+def _read(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise RomPatchError("unexpected end of patch")
+    return data
+
+
+def apply_ips(stream, rom):
+    """apply an IPS patch, read record by record from a binary stream, to
+    the ROM contents (bytearray)"""
+    if _read(stream, len(IPS_HEADER)) != IPS_HEADER:
+        raise RomPatchError("not an IPS patch")
+    while True:
+        offset = _read(stream, 3)
+        if offset == IPS_FOOTER:
+            break
+        offset = int.from_bytes(offset, "big")
+        size = int.from_bytes(_read(stream, 2), "big")
+        if size == 0:
+            # RLE record: 2 bytes size and 1 byte value
+            size = int.from_bytes(_read(stream, 2), "big")
+            data = _read(stream, 1) * size
+        else:
+            data = _read(stream, size)
+        if offset + size > len(rom):
+            raise RomPatchError("the patch is bigger than the ROM")
+        rom[offset : offset + size] = data
+
+
+def _encode_number(number):
+    """BPS variable-length number"""
+    data = bytearray()
+    while True:
+        byte = number & 0x7F
+        number >>= 7
+        if number == 0:
+            data.append(0x80 | byte)
+            return data
+        data.append(byte)
+        number -= 1
+
+
+def _encode_action(action, length):
+    return _encode_number(((length - 1) << 2) | action)
+
+
+def make_bps(source, target):
+    """returns the bytes of a BPS patch from source to target. They must
+    have the same size."""
+    patch = bytearray(BPS_HEADER)
+    patch += _encode_number(len(source))
+    patch += _encode_number(len(target))
+    patch += _encode_number(0)  # no metadata
+    output_offset = 0
+    for offset, data in diff_records(source, target, gap=2):
+        if offset > output_offset:
+            patch += _encode_action(BPS_SOURCE_READ, offset - output_offset)
+        patch += _encode_action(BPS_TARGET_READ, len(data))
+        patch += data
+        output_offset = offset + len(data)
+    if len(target) > output_offset:
+        patch += _encode_action(BPS_SOURCE_READ, len(target) - output_offset)
+    patch += zlib.crc32(source).to_bytes(4, "little")
+    patch += zlib.crc32(patch_target(source, target)).to_bytes(4, "little")
+    patch += zlib.crc32(patch).to_bytes(4, "little")
+    return bytes(patch)
+
+
+class _BPSReader:
+    """read a BPS patch from a stream, keeping the CRC32 of the read data"""
+
+    def __init__(self, stream, size):
+        self._stream = stream
+        self.remaining = size
+        self.crc = 0
+
+    def read(self, size):
+        if size > self.remaining:
+            raise RomPatchError("unexpected end of patch")
+        data = _read(self._stream, size)
+        self.remaining -= size
+        self.crc = zlib.crc32(data, self.crc)
+        return data
+
+    def read_number(self):
+        number, shift = 0, 1
+        while True:
+            byte = self.read(1)[0]
+            number += (byte & 0x7F) * shift
+            if byte & 0x80:
+                return number
+            shift <<= 7
+            number += shift
+
+
+def apply_bps(stream, rom):
+    """apply a BPS patch, read action by action from a seekable binary
+    stream, to the ROM contents (bytearray), after checking that the CRC32
+    of the ROM is the one of the patch source
+    """
+    # the footer has the checksums
+    stream.seek(0, 2)
+    size = stream.tell() - BPS_FOOTER_SIZE
+    if size < len(BPS_HEADER):
+        raise RomPatchError("not a BPS patch")
+    stream.seek(size)
+    footer = _read(stream, BPS_FOOTER_SIZE)
+    source_crc = int.from_bytes(footer[0:4], "little")
+    target_crc = int.from_bytes(footer[4:8], "little")
+    patch_crc = int.from_bytes(footer[8:12], "little")
+    if zlib.crc32(rom) != source_crc:
+        raise RomPatchError("the patch is for another ROM (CRC32 mismatch)")
+
+    stream.seek(0)
+    reader = _BPSReader(stream, size)
+    if reader.read(len(BPS_HEADER)) != BPS_HEADER:
+        raise RomPatchError("not a BPS patch")
+    source = bytes(rom)
+    if reader.read_number() != len(source):
+        raise RomPatchError("the patch is for a ROM of another size")
+    target = bytearray(reader.read_number())
+    reader.read(reader.read_number())  # metadata is ignored
+
+    output_offset = source_offset = target_offset = 0
+    while reader.remaining:
+        data = reader.read_number()
+        action, length = data & 3, (data >> 2) + 1
+        end = output_offset + length
+        if end > len(target):
+            raise RomPatchError("the patch is bigger than the ROM")
+        if action == BPS_SOURCE_READ:
+            target[output_offset:end] = source[output_offset:end]
+        elif action == BPS_TARGET_READ:
+            target[output_offset:end] = reader.read(length)
+        else:
+            data = reader.read_number()
+            relative = (-1 if data & 1 else 1) * (data >> 1)
+            if action == BPS_SOURCE_COPY:
+                source_offset += relative
+                target[output_offset:end] = source[
+                    source_offset : source_offset + length
+                ]
+                source_offset += length
+            else:
+                # target copy can overlap with the output, byte by byte
+                target_offset += relative
+                for n in range(length):
+                    target[output_offset + n] = target[target_offset + n]
+                target_offset += length
+        output_offset = end
+
+    # the patch CRC32 includes the source and target CRC32
+    if zlib.crc32(footer[:8], reader.crc) != patch_crc:
+        raise RomPatchError("the patch is corrupted (CRC32 mismatch)")
+    if zlib.crc32(target) != target_crc:
+        raise RomPatchError("wrong patch result (CRC32 mismatch)")
+    rom[:] = target
+
+
+def make_patch(filename, source, target):
+    """write an IPS or BPS patch file (depending on the extension)"""
+    if filename.lower().endswith(".bps"):
+        patch = make_bps(source, target)
+    else:
+        patch = make_ips(source, target)
+    with open(filename, "wb") as f:
+        f.write(patch)
+
+
+def apply_patch_file(filename, rom):
+    """apply an IPS or BPS patch file (depending on its header) to the ROM
+    contents (bytearray)"""
+    with open(filename, "rb") as f:
+        header = f.read(len(IPS_HEADER))
+        f.seek(0)
+        if header == IPS_HEADER:
+            apply_ips(f, rom)
+        elif header.startswith(BPS_HEADER):
+            apply_bps(f, rom)
+        else:
+            raise RomPatchError("%s: unknown patch format" % filename)
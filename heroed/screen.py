@@ -0,0 +1,225 @@
+"""Decode the 8 data bytes of a screen into readable attributes.
+
+These functions don't depend on the terminal, so they can be used by the
+editor UI and by the command line tools.
+"""
+
+from heroed import hero
+
+ENEMY_NAMES = ("spider", "bat", "moth", "snake")
+SIDE_GAP_NAMES = ("no", "alt", "right", "left")
+DIRECTION_NAMES = ("right", "left")
+
+# names of the terrain bytes, in the same order as in the screen data
+TERRAIN_BYTES_NAMES = (
+    ("lateral_mid", hero.BYTE_LATERAL_MID),
+    ("lateral_low", hero.BYTE_LATERAL_LOW),
+    ("center_mid", hero.BYTE_CENTER_MID),
+    ("center_low", hero.BYTE_CENTER_LOW),
+)
+
+
+def get_magma(screen_data):
+    """returns True or False depending on magma is active"""
+    return bool(screen_data[hero.BYTE_WALL] & hero.MAGMA_BIT)
+
+
+def get_righttoleft(screen_data):
+    """returns True or False depending on "right to left" is active"""
+    return bool(screen_data[hero.BYTE_LANTERN] & hero.RIGHT_TO_LEFT_BIT)
+
+
+def get_sidegap(screen_data):
+    """returns:
+    0   no side gap (only wall or nothing) (in horizontal water
+        screens, it means both side gaps!)
+    1   alternative right side gap (can have wall)
+    2   right side gap
+    3   left side gap
+    """
+    wall_pos = screen_data[hero.BYTE_WALL] >> 2
+    alt_rightside = bool(screen_data[hero.BYTE_WALL] & hero.ALT_RIGHTSIDE_BIT)
+    if wall_pos in range(1, 4):
+        return 2
+    elif wall_pos in range(36, 64):
+        return 3
+    elif alt_rightside:
+        return 1
+    else:
+        return 0
+
+
+def get_enemy(screen_data, byte):
+    """returns the enemy name of hero.BYTE_ENEMY_LOW or hero.BYTE_ENEMY_MID,
+    or None if the enemy is hidden"""
+    if screen_data[byte] >> 2 == hero.OBJECT_HIDDEN_POS:
+        return None
+    return ENEMY_NAMES[screen_data[byte] & 0b00000011]
+
+
+def get_object_position(screen_data, byte):
+    """returns the position (0..39) of an object, or None if it is hidden.
+    The wall is hidden outside of 4..35 (those values define the side gaps)
+    """
+    position = screen_data[byte] >> 2
+    if byte == hero.BYTE_WALL:
+        return position if 4 <= position <= 35 else None
+    return None if position == hero.OBJECT_HIDDEN_POS else position
+
+
+def screen_attributes(screen_data):
+    """returns a dict with the decoded attributes of a screen.
+    Values are str or int, so they can be easily compared or printed, or
+    None for the hidden enemies and objects.
+    """
+    lantern = get_object_position(screen_data, hero.BYTE_LANTERN)
+    wall = get_object_position(screen_data, hero.BYTE_WALL)
+    attributes = {
+        "enemy_low": get_enemy(screen_data, hero.BYTE_ENEMY_LOW),
+        "enemy_low_pos": get_object_position(screen_data, hero.BYTE_ENEMY_LOW),
+        "enemy_mid": get_enemy(screen_data, hero.BYTE_ENEMY_MID),
+        "enemy_mid_pos": get_object_position(screen_data, hero.BYTE_ENEMY_MID),
+        "lantern": "off" if lantern is None else "on",
+        "lantern_pos": lantern,
+        "wall": "off" if wall is None else "on",
+        "wall_pos": wall,
+        "magma": "on" if get_magma(screen_data) else "off",
+        "side_gap": SIDE_GAP_NAMES[get_sidegap(screen_data)],
+        "dir": DIRECTION_NAMES[get_righttoleft(screen_data)],
+    }
+    for name, byte in TERRAIN_BYTES_NAMES:
+        attributes[name] = screen_data[byte]
+    return attributes
+
+
+# Terrain and objects bytes. The terrain of the middle and lower areas is
+# stored in 2 bytes, decoded to 4 bytes of "data" (32 bits, the 24 central
+# MSX tiles, mirrored) and to a "screen str" of 64 chars "0" and "1", where 2
+# chars are a MSX tile (see heroed.ui.terrain). The objects bytes have the
+# position (0..39) and the enemy type (see heroed.ui.objects).
+
+
+def data_to_screen_width(x):
+    """
+    Returns the width at screen of a data position.
+    It can be 1 column or 2 columns.
+    x       data position, from 0 to 31
+    returns screen columns occupied by given data position: 1 or 2.
+    """
+    return x % 2 + 1
+
+
+def bytes_to_data(bytes, reverse_rightside):
+    """
+    The 2 bytes are mirrored and reversed (screens are simmetrical).
+    bytes               2 bytes. 1st byte is "lateral" region, 2nd byte is
+                        "central" region.
+    reverse_rightside   (bool) if must reverse right side. This is set by the
+                        ALT_RIGHTSIDE_BIT, and only used in middle area (not
+                        in upper or lower areas).
+    returns bytearray with 4 bytes (data).
+
+    NOTE: The "normal" behavior is to mirror the rightside, but if
+    reverse_rightside is set, then that is not mirrored.
+    """
+    if reverse_rightside:
+        return bytearray(
+            (
+                bytes[0],
+                int("{:08b}".format(bytes[1])[::-1], 2),  # reverse bits
+                bytes[0],
+                int("{:08b}".format(bytes[1])[::-1], 2),  # reverse bits
+            )
+        )
+    else:
+        return bytearray(
+            (
+                bytes[0],
+                int("{:08b}".format(bytes[1])[::-1], 2),  # reverse bits
+                bytes[1],
+                int("{:08b}".format(bytes[0])[::-1], 2),  # reverse bits
+            )
+        )
+
+
+def data_to_bytes(data):
+    """
+    data    bytearray with 4 bytes (data). It uses bytes 0 and 2
+    returns bytearray with 2 bytes. 1st byte is "lateral" region, 2nd byte
+            is "central" region.
+    NOTE: It is not necesary to know if reverse_rightside was used, because
+    only first 2 bytes of data are used, and these are not affected by
+    reverse_rightside.
+    """
+    return bytearray(
+        (
+            data[0],
+            int("{:08b}".format(data[1])[::-1], 2)
+            # data[2]
+        )
+    )
+
+
+def data_to_screen_str(data, reversed_rightside):
+    """
+    converts data to a string of 0 and 1, ready to print to screen.
+    data                bytearray with 4 bytes (data).
+    reversed_rightside  if reverse_rightside was set in the data. In this case,
+                        right side is offsetted in some specific way.
+    returns string of 64 chars length.
+    """
+    if reversed_rightside:
+        datastr_left = "".join("{:08b}".format(b) for b in data[0:2])
+        datastr_right = "".join("{:08b}".format(b) for b in data[2:4])
+        s = "11111111%s" % "".join(
+            c * data_to_screen_width(pos) for pos, c in enumerate(datastr_left)
+        )
+        s += "111111%s" % "".join(
+            c * data_to_screen_width(pos)
+            for pos, c in enumerate(datastr_right)
+        )
+        s += s[-2:]
+        return s
+    else:
+        datastr = "".join("{:08b}".format(b) for b in data)
+        return "11111111%s11111111" % "".join(
+            c * data_to_screen_width(pos) for pos, c in enumerate(datastr)
+        )
+
+
+def bytes_to_screen_str(bytes, reverse_rightside=False):
+    """
+    converts bytes to a string of 0 and 1, ready to print to screen.
+    bytes               2 bytes
+    reverse_rightside   see bytes_to_data()
+    returns string of 64 chars length.
+    """
+    return data_to_screen_str(
+        bytes_to_data(bytes, reverse_rightside), reverse_rightside
+    )
+
+
+def position_to_screen_pos(x):
+    """
+    Returns the position at screen of an object data position.
+    x       data position, from 0 to 39
+    returns screen position, from 2 to 60
+    """
+    return x * 3 // 2 + 2
+
+
+def byte_to_position(byte):
+    """
+    byte   1 byte, with the object position in the 6 most-significant bits
+    returns int with object position data (0..39)
+    """
+    return byte >> 2
+
+
+def byte_to_enemy_type(byte):
+    """
+    Returns the enemy type an object byte
+    byte   1 byte, with the enemy type in the 2 least-significant bits
+    returns enemy type, from 0 to 3 (hero.ENEMY_SPIDER..hero.ENEMY_SNAKE)
+    """
+    return 0b00000011 & byte
@@ -0,0 +1,296 @@
+"""Serve an Editor over a Unix domain socket with JSON-RPC 2.0, so scripts
+can read and modify a ROM without running a process for each edit.
+
+Each request (or batch of requests) is a JSON text in one line, and each
+response is written in one line too. Many clients can be connected at the
+same time: every connection has its thread, and the editor is locked while
+a request runs. A batch runs with the editor locked, so no other client
+modifies it in the middle of the batch.
+
+The screen data is a hex str of 8 bytes (like "0f00000000201000"), in the
+order of the screens tables. The modifications are kept in memory (and
+journaled, see heroed.journal) until the "save" method is called.
+
+Methods:
+
+    get_screen(screen)                  -> data
+    get_screens(first=0, count=256)     -> [data, ...]
+    set_screen(screen, data)
+    get_layout()                        -> {"initial_screens": [...],
+                                            "screen_count": [...]}
+    set_layout(initial_screens, screen_count)
+    get_message(message)                -> str
+    set_message(message, text)          text has up to 32 chars
+    validate()                          -> [{"error": bool, "issue": str}]
+    modified()                          -> {"screens": [...],
+                                            "layout": bool,
+                                            "messages": bool}
+    undo()                              -> bool
+    save()                              -> bool
+"""
+
+import os
+import json
+import socket
+import inspect
+import threading
+import socketserver
+
+from heroed import hero
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _screen_number(screen):
+    if not isinstance(screen, int) or not 0 <= screen < 256:
+        raise ValueError("invalid screen: %r" % (screen,))
+    return screen
+
+
+def _screen_data(data):
+    try:
+        screen_data = bytearray.fromhex(data)
+    except (TypeError, ValueError):
+        screen_data = None
+    if screen_data is None or len(screen_data) != 8:
+        raise ValueError("screen data must be a hex str of 8 bytes")
+    return screen_data
+
+
+def _message_number(message):
+    if not isinstance(message, int) or not 0 <= message < 4:
+        raise ValueError("invalid message: %r" % (message,))
+    return message
+
+
+def _level_table(values, min_, max_):
+    if (
+        not isinstance(values, list)
+        or len(values) != 20
+        or not all(isinstance(value, int) for value in values)
+        or not all(min_ <= value <= max_ for value in values)
+    ):
+        raise ValueError(
+            "a level table is a list of 20 int (%d to %d)" % (min_, max_)
+        )
+    return tuple(values)
+
+
+class EditorService:
+    """The JSON-RPC methods, run with the editor locked"""
+
+    METHODS = (
+        "get_screen",
+        "get_screens",
+        "set_screen",
+        "get_layout",
+        "set_layout",
+        "get_message",
+        "set_message",
+        "validate",
+        "modified",
+        "undo",
+        "save",
+    )
+
+    def __init__(self, editor, on_saved=None):
+        """on_saved is called after saving the ROM file"""
+        self.editor = editor
+        self.lock = threading.RLock()
+        self._on_saved = on_saved
+
+    def get_screen(self, screen):
+        return self.editor.get_screen_data(_screen_number(screen)).hex()
+
+    def get_screens(self, first=0, count=256):
+        _screen_number(first)
+        if not isinstance(count, int) or not 0 <= first + count <= 256:
+            raise ValueError("invalid count: %r" % (count,))
+        tables = self.editor.screens_tables()
+        return [
+            bytes(table[n] for table in tables).hex()
+            for n in range(first, first + count)
+        ]
+
+    def set_screen(self, screen, data):
+        self.editor.set_screen_data(_screen_number(screen), _screen_data(data))
+
+    def get_layout(self):
+        return {
+            "initial_screens": list(self.editor.level_initial_screens),
+            "screen_count": list(self.editor.level_screen_count),
+        }
+
+    def set_layout(self, initial_screens, screen_count):
+        self.editor.set_level_layout(
+            _level_table(initial_screens, 0, 255),
+            _level_table(screen_count, 1, 256),
+        )
+
+    def get_message(self, message):
+        return self.editor.get_title_screen_message(_message_number(message))
+
+    def set_message(self, message, text):
+        _message_number(message)
+        if (
+            not isinstance(text, str)
+            or len(text) > 32
+            or any(char not in hero.HERO_TO_ASCII for char in text)
+        ):
+            raise ValueError(
+                "a message has up to 32 chars: A-Z, 0-9 and some symbols"
+            )
+        self.editor.set_title_screen_message(message, text.ljust(32))
+
+    def validate(self):
+        return [
+            {"error": issue.is_error, "issue": str(issue)}
+            for issue in self.editor.check_level_layout()
+        ]
+
+    def modified(self):
+        editor = self.editor
+        editor.store_selected_screen()
+        return {
+            "screens": sorted(editor.modified_screens),
+            "layout": editor.is_layout_modified(),
+            "messages": any(
+                editor.get_title_screen_message(n)
+                != editor.read_title_screen_message(n)
+                for n in range(4)
+            ),
+        }
+
+    def undo(self):
+        return self.editor.undo()
+
+    def save(self):
+        editor = self.editor
+        editor.store_selected_screen()
+        if not editor.are_there_modifications():
+            return False
+        if any(issue.is_error for issue in editor.check_level_layout()):
+            raise ValueError("the level layout has errors, see validate()")
+        editor.save_modified_screens_to_file()
+        editor.save_level_layout_to_file()
+        editor.save_title_screen_messages_to_file()
+        editor.hero_ed_rom.flush()
+        if self._on_saved:
+            self._on_saved()
+        return True
+
+    def call(self, method, params):
+        if not isinstance(method, str) or method not in self.METHODS:
+            raise RPCError(METHOD_NOT_FOUND, "Method not found")
+        fn = getattr(self, method)
+        try:
+            if isinstance(params, dict):
+                bound = inspect.signature(fn).bind(**params)
+            else:
+                bound = inspect.signature(fn).bind(*params)
+        except TypeError as err:
+            raise RPCError(INVALID_PARAMS, str(err)) from None
+        try:
+            return fn(*bound.args, **bound.kwargs)
+        except ValueError as err:
+            raise RPCError(INVALID_PARAMS, str(err)) from None
+
+
+def _error(id_, code, message):
+    return {
+        "jsonrpc": "2.0",
+        "error": {"code": code, "message": message},
+        "id": id_,
+    }
+
+
+def handle_request(service, request):
+    """returns the response to a request, or None for a notification"""
+    if (
+        not isinstance(request, dict)
+        or request.get("jsonrpc") != "2.0"
+        or not isinstance(request.get("params", []), (list, dict))
+        or not isinstance(request.get("id"), (str, int, type(None)))
+    ):
+        return _error(None, INVALID_REQUEST, "Invalid Request")
+    is_notification = "id" not in request
+    id_ = request.get("id")
+    try:
+        result = service.call(request.get("method"), request.get("params", []))
+    except RPCError as err:
+        response = _error(id_, err.code, str(err))
+    except Exception as err:
+        response = _error(
+            id_, INTERNAL_ERROR, "%s: %s" % (type(err).__name__, err)
+        )
+    else:
+        response = {"jsonrpc": "2.0", "result": result, "id": id_}
+    return None if is_notification else response
+
+
+def handle_message(service, line):
+    """returns the response (str) to a request or batch, or None if there
+    isn't any response"""
+    try:
+        message = json.loads(line)
+    except ValueError:
+        return json.dumps(_error(None, PARSE_ERROR, "Parse error"))
+    with service.lock:
+        if isinstance(message, list):
+            if not message:
+                response = _error(None, INVALID_REQUEST, "Invalid Request")
+            else:
+                response = [
+                    response
+                    for response in (
+                        handle_request(service, request) for request in message
+                    )
+                    if response is not None
+                ] or None
+        else:
+            response = handle_request(service, message)
+    return None if response is None else json.dumps(response)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = handle_message(self.server.service, line)
+            if response is not None:
+                self.wfile.write(response.encode() + b"\n")
+
+
+def socket_filename(romfile):
+    return romfile + ".sock"
+
+
+def make_server(service, filename):
+    """returns a server listening at the Unix socket filename. If the
+    socket file exists, but no one is listening, it's removed."""
+    if os.path.exists(filename):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(filename)
+        except ConnectionRefusedError:
+            os.remove(filename)
+        else:
+            raise OSError('"%s" is being served already' % filename)
+        finally:
+            client.close()
+    server = socketserver.ThreadingUnixStreamServer(filename, _RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
@@ -1,15 +1,26 @@
+import signal
+import time
 import contextlib
 from typing import NamedTuple
 
 from blessed import Terminal
 from blessed.sequences import Sequence
+from blessed.keyboard import Keystroke
 
 from heroed import hero
 from heroed.utils import Point, clamp
+import heroed.screen
 import heroed.ui.terrain
 import heroed.ui.objects
 import heroed.ui.help
 from heroed.ui.screen_drawing import ScreenDraw
+from heroed.ui.minimap import Minimap
+from heroed.ui.frames import ScreenFrames, HalfBlockFrames
+from heroed.ui.level_view import LevelView, SCREEN_ROWS as LEVEL_SCREEN_ROWS
+from heroed.ui.neighbours import NeighbourScreens
+from heroed.ui.browser import ScreenBrowser
+from heroed.ui.graphics import GraphicsFrames
+from heroed.ui.output import LowBandwidthOutput, FRAME_BUDGET
 from heroed.ui.misc import ACS_CKBOARD, ACS_DIAMOND
 from heroed.ui.cursor import Cursor
 
@@ -83,11 +94,34 @@ class AttributesCursor(Cursor):
         self._cursor.y = 1
 
 
+# in the low bandwidth mode, the rest of a frame over the byte budget is
+# sent after this time (in seconds) without keystrokes
+FRAME_INTERVAL = 0.1
+
+# while waiting for a keystroke, the terminal size is checked every this
+# time (in seconds). SIGWINCH doesn't interrupt the wait.
+RESIZE_INTERVAL = 0.1
+
+
 class UI:
 
     STATUS_TITLE = "HEROED - MSX H.E.R.O. Editor"
 
-    def __init__(self):
+    def __init__(
+        self,
+        true_color=False,
+        graphics=None,
+        low_bandwidth=False,
+        frame_budget=FRAME_BUDGET,
+    ):
+        """with true_color, the other screens (the level view, the prior
+        and next screens and the browser) are drawn with the colors of the
+        MSX palette, and the prior and next screens with half blocks.
+        graphics is the protocol ("sixel" or "kitty") of an image preview
+        of the screen, shown if the terminal is large enough.
+        In the low bandwidth mode, only the changes of each frame are sent
+        to the terminal, up to frame_budget bytes at once (see
+        heroed.ui.output)"""
         self.term = Terminal()
         # monkey-patching Terminal with acs()
         Terminal.acs = lambda self, s: self.smacs + s + self.rmacs
@@ -119,6 +153,40 @@ class UI:
         self.version = ""
         self.show_screen_data = False
         self.screen_draw = ScreenDraw(self)
+        self.minimap = Minimap(self.term)
+        if true_color:
+            # else blessed approximates the 24-bit colors to 256 colors
+            self.term.number_of_colors = 1 << 24
+            self.screen_frames = ScreenFrames(self.term, true_color=True)
+            neighbour_frames = HalfBlockFrames(self.term)
+        else:
+            self.screen_frames = ScreenFrames(self.term)
+            neighbour_frames = self.screen_frames
+        self.level_view = LevelView(self.term, self.screen_frames)
+        self.graphics = None
+        if graphics:
+            self.graphics = GraphicsFrames(self.term, graphics)
+        self.neighbours = NeighbourScreens(
+            self.term, neighbour_frames, self.graphics
+        )
+        self.browser = ScreenBrowser(self.term, true_color)
+        # rendered the first time the help is shown
+        self._help_pages = None
+        self.output = None
+        if low_bandwidth:
+            self.output = LowBandwidthOutput(
+                self.term, self.term.stream, frame_budget
+            )
+            # the frames are sent before waiting for a keystroke
+            self._term_inkey = self.term.inkey
+            self.term.inkey = self._inkey
+
+        # the terminal size is checked again when it's resized
+        self._size = (self.term.width, self.term.height)
+        self._resized = False
+        self._waiting_keystroke = False
+        if hasattr(signal, "SIGWINCH"):
+            signal.signal(signal.SIGWINCH, self._on_resize)
 
     @property
     def mode(self):
@@ -151,6 +219,34 @@ class UI:
         self.draw_selection_mode()
         self.draw_screen()
 
+    def get_cursors(self):
+        """returns the mode (0 terrain, 1 objects), the terrain cursor (x, y)
+        and the objects cursor (the selected object byte), to restore them
+        later with set_cursors()
+        """
+        terrain_cursor = self.terrain_cursor.value()
+        objects_cursor = self.objects_cursor.value()
+        if self.objects_cursor.is_in_attributes():
+            objects_cursor = hero.BYTE_ENEMY_LOW
+        return (
+            int(self._mode == self.mode_objects),
+            (terrain_cursor.x, min(terrain_cursor.y, 1)),
+            objects_cursor,
+        )
+
+    def set_cursors(self, mode, terrain_cursor, objects_cursor):
+        """restore the mode and cursors returned by get_cursors()"""
+        x, y = terrain_cursor
+        self.terrain_cursor.set_value(Point(clamp(x, 0, 31), clamp(y, 0, 1)))
+        if objects_cursor in (
+            hero.BYTE_LANTERN,
+            hero.BYTE_WALL,
+            hero.BYTE_ENEMY_MID,
+            hero.BYTE_ENEMY_LOW,
+        ):
+            self.objects_cursor.set_value(objects_cursor)
+        self.mode = self.mode_objects if mode == 1 else self.mode_terrain
+
     @property
     def screen_number(self):
         return self._screen_number
@@ -180,16 +276,27 @@ class UI:
         self.draw_attributes_bar()
         if redraw_screen:
             self.draw_screen(draw_upper_area=True)
+        self.neighbours.set_screen(self._screen_number, self._screen_data)
     # fmt: on
 
     def set_level_layout(self, level_initial_screens, level_screen_count):
         self._level_initial_screens = level_initial_screens
         self._level_screen_count = level_screen_count
+        self.screen_frames.set_level_layout(
+            level_initial_screens, level_screen_count
+        )
+        self.neighbours.frames.set_level_layout(
+            level_initial_screens, level_screen_count
+        )
+        if self.graphics:
+            self.graphics.set_level_layout(
+                level_initial_screens, level_screen_count
+            )
         self.redraw_all()
 
     def get_attribute_magma(self, screen_data):
         """returns True or False depending on magma is active"""
-        return bool(screen_data[hero.BYTE_WALL] & hero.MAGMA_BIT)
+        return heroed.screen.get_magma(screen_data)
 
     def set_attribute_magma(self, screen_data, value):
         """value   True or False to set magma active/inactive"""
@@ -200,7 +307,7 @@ class UI:
 
     def get_attribute_righttoleft(self, screen_data):
         """returns True or False depending on "right to left" is active"""
-        return bool(screen_data[hero.BYTE_LANTERN] & hero.RIGHT_TO_LEFT_BIT)
+        return heroed.screen.get_righttoleft(screen_data)
 
     def set_attribute_righttoleft(self, screen_data, value):
         """value   True or False to set "right to left" active/inactive"""
@@ -217,20 +324,7 @@ class UI:
         2   right side gap
         3   left side gap
         """
-        wall_pos = heroed.ui.objects.byte_to_position(
-            screen_data[hero.BYTE_WALL]
-        )
-        alt_rightside = bool(
-            screen_data[hero.BYTE_WALL] & hero.ALT_RIGHTSIDE_BIT
-        )
-        if wall_pos in range(1, 4):
-            return 2
-        elif wall_pos in range(36, 64):
-            return 3
-        elif alt_rightside:
-            return 1
-        else:
-            return 0
+        return heroed.screen.get_sidegap(screen_data)
 
     def set_attribute_sidegap(self, screen_data, value):
         """value:
@@ -271,6 +365,8 @@ class UI:
 
     def clear(self):
         """clear the entire screen"""
+        if self.graphics:
+            print(self.graphics.erase_all(), end="")
         print(self.term.move_xy(0, 0), end="", flush=True)
         for _ in range(self.term.height):
             print(self.term.normal + " " * self.term.width)
@@ -285,6 +381,39 @@ class UI:
         self.draw_selection_mode()
         self.draw_screen(draw_upper_area=True)
         self.draw_attributes_bar()
+        self.minimap.invalidate()
+        self.minimap.draw()
+        self.neighbours.invalidate()
+        self.neighbours.relayout()
+
+    def _on_resize(self, signum, frame):
+        """SIGWINCH handler. It only flags the resize: it can arrive in the
+        middle of a frame or of a keystroke, so the relayout is done by
+        process_keystroke."""
+        self._resized = True
+
+    def relayout(self):
+        """Adapt to the new size of the terminal. Only the neighbour screens
+        are moved, unless the editor didn't fit in the terminal."""
+        self._resized = False
+        if self.output:
+            self.output.resize()
+        old_width, old_height = self._size
+        self._size = (self.term.width, self.term.height)
+        if self.term.width < 80 or self.term.height < 24:
+            self.clear()
+            print(
+                self.term.move_xy(0, 0)
+                + self.term.white_on_red(
+                    "A minimum of 80 columns x 24 rows terminal is required"
+                ),
+                end="",
+                flush=True,
+            )
+        elif old_width < 80 or old_height < 24:
+            self.redraw_all()
+        else:
+            self.neighbours.relayout()
 
     def draw_mod_name(self):
         """Draw the name of the MOD, above the status bar"""
@@ -498,10 +627,70 @@ class UI:
 
     ####
 
-    def process_keystroke(self):
+    def _inkey(self, timeout=None, **kwargs):
+        """Terminal.inkey in the low bandwidth mode: the frame is sent
+        before waiting for a keystroke, and if it's over the byte budget,
+        the rest is sent while no key is pressed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.output.end_frame()
+            self.draw_bandwidth()
+            wait = None
+            if deadline is not None:
+                wait = max(deadline - time.monotonic(), 0)
+            if self.output.pending and (wait is None or wait > FRAME_INTERVAL):
+                wait = FRAME_INTERVAL
+            keystroke = self._term_inkey(timeout=wait, **kwargs)
+            if keystroke:
+                self.output.keystroke()
+                return keystroke
+            if not self.output.pending or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                return keystroke
+
+    def draw_bandwidth(self):
+        """Draw the bytes sent for the last keystroke, and the bytes written
+        by the editor (what the normal mode sends), at top right"""
+        if not self._waiting_keystroke:
+            # only in the editor, not over the other views
+            return
+        sent, written = self.output.last
+        if self.output.written:
+            sent, written = self.output.sent, self.output.written
+        s = ("%d B sent (normal %d B)" % (sent, written)).rjust(32)
+        self.output.overlay(80 - len(s), 1, s)
+
+    def _inkey_until_resized(self, timeout=None):
+        """Terminal.inkey, but an empty keystroke is returned as soon as
+        the terminal is resized"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._resized:
+            wait = RESIZE_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            keystroke = self.term.inkey(timeout=wait)
+            if keystroke or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                return keystroke
+        return Keystroke("")
+
+    def process_keystroke(self, timeout=None):
         """Process a keystroke and return None if processed, or
-        the keystroke if not processed"""
-        keystroke = self.term.inkey()
+        the keystroke if not processed. If there is no keystroke before
+        timeout (in seconds), an empty keystroke is returned"""
+        if self._resized:
+            self.relayout()
+        self._waiting_keystroke = True
+        try:
+            keystroke = self._inkey_until_resized(timeout)
+        finally:
+            self._waiting_keystroke = False
+        if self._resized:
+            self.relayout()
+            if not keystroke:
+                return None
 
         # TAB - change terrain/object mode
         if keystroke.code == self.term.KEY_TAB:
@@ -608,25 +797,206 @@ class UI:
             self.draw_status()
 
     def show_help(self):
+        """Show the help pages, until Q is pressed or after the last one.
+        / searches the text as it's typed (ENTER ends the search, ESC
+        cancels it), and N and P go to the next and previous pages with
+        matches."""
+        if self._help_pages is None:
+            self._help_pages = heroed.ui.help.HelpPages(
+                self.term, self.version
+            )
+        pages = self._help_pages
+        page = 0
+        query = ""
+        # the query being typed, and the page where the search started
+        search, search_page = None, 0
         try:
-            total = len(heroed.ui.help.draw_help_funcs)
-            for num, fn in enumerate(heroed.ui.help.draw_help_funcs):
-                self.clear()
-                fn(self.term, ver=self.version)
+            while page < len(pages):
+                self._draw_help_page(page, query, search)
+                k = self.term.inkey()
+                if search is not None:
+                    if k.code == self.term.KEY_ENTER:
+                        query, search = search, None
+                        continue
+                    elif k.code == self.term.KEY_ESCAPE:
+                        page, search = search_page, None
+                        continue
+                    elif k.code == self.term.KEY_BACKSPACE:
+                        search = search[:-1]
+                    elif k and not k.is_sequence:
+                        search += k
+                    found = None
+                    if search:
+                        found = pages.find(search, search_page)
+                    page = search_page if found is None else found
+                elif k.lower() == "q":
+                    break
+                elif k == "/":
+                    search, search_page = "", page
+                elif query and k.lower() in ("n", "p"):
+                    step = 1 if k.lower() == "n" else -1
+                    found = pages.find(query, page + step, step)
+                    if found is not None:
+                        page = found
+                else:
+                    page += 1
+        finally:
+            self.redraw_all()
+
+    def _draw_help_page(self, page, query, search):
+        """Draw a help page, with a single write"""
+        color = self.term.white_on_blue
+        if search is not None:
+            footer = "/" + search
+            color = self.term.black_on_bright_yellow
+            if search and not self._help_pages.matching_rows(page, search):
+                color = self.term.white_on_red
+        elif query:
+            footer = (
+                "Press Q to return, / to search, N/P for the matches or any "
+                "key to continue"
+            )
+        else:
+            footer = "Press Q to return, / to search or any key to continue"
+        output = self._help_pages.frame(
+            page, query if search is None else search
+        )
+        if self.graphics:
+            output = self.graphics.erase_all() + output
+        footer = footer.ljust(80 - 5) + "(%1d/%1d)" % (
+            page + 1,
+            len(self._help_pages),
+        )
+        print(
+            output + self.term.move_xy(0, 23) + color(footer),
+            end="",
+            flush=True,
+        )
+
+    def show_level_view(self, screens, get_screen_data, selected_screen):
+        """Show the screens of a level as a continuous strip, scrolling it
+        with the direction keys. Returns the screen at the center of the
+        view if ENTER is pressed, or None.
+        screens             the screen numbers of the level, in flow order
+        get_screen_data     function that returns the data of a screen
+        """
+        view = self.level_view
+        view.set_level(
+            screens,
+            get_screen_data,
+            self._level_initial_screens,
+            self._level_screen_count,
+        )
+        view.show_screen(selected_screen)
+        level, _ = hero.get_levelscr_from_absscr(
+            selected_screen,
+            self._level_initial_screens,
+            self._level_screen_count,
+        )
+        try:
+            self.clear()
+            print(
+                self.term.move_xy(0, 0)
+                + self.term.bright_yellow_on_red(
+                    ("LEVEL %d (%d screens)" % (level, len(screens))).center(
+                        80
+                    )
+                )
+                + self.term.move_xy(0, 23)
+                + self.term.white_on_blue(
+                    " UP/DOWN: scroll  PGUP/PGDN: screens  "
+                    "ENTER: edit the center screen  ESC: return".ljust(80)
+                ),
+                end="",
+            )
+            while True:
+                view.draw()
+                screen_number = view.center_screen()
+                _, levelscr = hero.get_levelscr_from_absscr(
+                    screen_number,
+                    self._level_initial_screens,
+                    self._level_screen_count,
+                )
                 print(
-                    self.term.move_xy(0, 23)
-                    + self.term.white_on_blue(
-                        "Press Q to return or any key to continue".ljust(
-                            80 - 5
-                        )
-                        + "(%1d/%1d)" % (num + 1, total)
-                    ),
+                    self.term.move_xy(4, 20)
+                    + self.term.normal
+                    + "Center: screen %2d [%3d]" % (levelscr, screen_number),
                     end="",
                     flush=True,
                 )
                 k = self.term.inkey()
-                if k.lower() == "q":
-                    break
+                if k.code == self.term.KEY_UP:
+                    view.scroll(-1)
+                elif k.code == self.term.KEY_DOWN:
+                    view.scroll(1)
+                elif k.code == self.term.KEY_PGUP:
+                    view.scroll(-LEVEL_SCREEN_ROWS)
+                elif k.code == self.term.KEY_PGDOWN:
+                    view.scroll(LEVEL_SCREEN_ROWS)
+                elif k.code == self.term.KEY_HOME:
+                    view.scroll_to(0)
+                elif k.code == self.term.KEY_END:
+                    view.scroll_to(view.strip_rows)
+                elif k.code == self.term.KEY_ENTER:
+                    return screen_number
+                elif k.code == self.term.KEY_ESCAPE or k.lower() in ("l", "q"):
+                    return None
+        finally:
+            self.redraw_all()
+
+    def show_browser(self, tables, selected_screen):
+        """Show the 256 screens as thumbnails in a grid, to select one with
+        the direction keys. Returns the selected screen if ENTER is
+        pressed, or None.
+        tables              the 8 screens tables
+        """
+        browser = self.browser
+        browser.set_screens(
+            tables,
+            self._level_initial_screens,
+            self._level_screen_count,
+            selected_screen,
+        )
+        try:
+            self.clear()
+            print(
+                self.term.move_xy(0, 0)
+                + self.term.bright_yellow_on_red(
+                    "SCREENS".center(self.term.width)
+                )
+                + self.term.move_xy(0, self.term.height - 1)
+                + self.term.white_on_blue(
+                    " ARROWS: select  PGUP/PGDN: page  "
+                    "ENTER: edit the screen  ESC: return".ljust(
+                        self.term.width - 1
+                    )
+                ),
+                end="",
+            )
+            while True:
+                browser.draw()
+                k = self.term.inkey()
+                page = browser.columns * browser.visible_rows
+                if k.code == self.term.KEY_LEFT:
+                    browser.move(-1)
+                elif k.code == self.term.KEY_RIGHT:
+                    browser.move(1)
+                elif k.code == self.term.KEY_UP:
+                    browser.move(-browser.columns)
+                elif k.code == self.term.KEY_DOWN:
+                    browser.move(browser.columns)
+                elif k.code == self.term.KEY_PGUP:
+                    browser.move(-page)
+                elif k.code == self.term.KEY_PGDOWN:
+                    browser.move(page)
+                elif k.code == self.term.KEY_HOME:
+                    browser.select(0)
+                elif k.code == self.term.KEY_END:
+                    browser.select(255)
+                elif k.code == self.term.KEY_ENTER:
+                    return browser.selected
+                elif k.code == self.term.KEY_ESCAPE or k.lower() in ("b", "q"):
+                    return None
         finally:
             self.redraw_all()
 
@@ -723,7 +1093,27 @@ class UI:
 
     @contextlib.contextmanager
     def run(self):
-        with self.term.fullscreen(), self.term.cbreak(), self.term.hidden_cursor():
-            self.redraw_all()
-            yield self
-            print(self.term.white_on_black)
+        with self._redirect_output():
+            with self.term.fullscreen(), self.term.cbreak(), self.term.hidden_cursor():
+                self.redraw_all()
+                yield self
+                if self.graphics:
+                    print(self.graphics.erase_all(), end="")
+                print(self.term.white_on_black)
+
+    @contextlib.contextmanager
+    def _redirect_output(self):
+        """in the low bandwidth mode, the output goes to self.output"""
+        if self.output is None:
+            yield
+            return
+        stream = self.term.stream
+        # blessed writes some sequences (fullscreen, location...) to its
+        # stream, not to sys.stdout
+        self.term._stream = self.output
+        try:
+            with contextlib.redirect_stdout(self.output):
+                yield
+        finally:
+            self.output.end_frame(budget=False)
+            self.term._stream = stream
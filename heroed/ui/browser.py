@@ -0,0 +1,220 @@
+"""Browser of the 256 screens, as small thumbnails in a scrollable grid.
+
+A thumbnail has THUMBNAIL_ROWS rows of THUMBNAIL_WIDTH chars, below a
+label with the screen and level numbers:
+
+      45 L 3 S 2
+    ####  ####*#####        upper area, and the lantern
+    #  | s    ## ####       middle area: wall and enemy markers
+    ###   b     ####        lower area, and enemy marker
+    ~~~~~~~~~~~~~~~~        bottom row (water below the screens >= 11)
+
+Each char is a bit of the terrain (4 cells of heroed.render), so the
+terrain is not downsampled at all: the rows are sampled from the areas
+where there are no objects, and the objects are drawn over them as
+markers (see heroed.ui.minimap for the enemy chars).
+
+The thumbnails are rendered only when their grid row is visible, and they
+are cached by the bytes they're rendered from (see heroed.atlas.tile_key),
+so the browser opens without rendering the 256 screens, and the
+thumbnails that haven't changed are not rendered again the next time.
+"""
+
+from heroed import hero
+from heroed.atlas import tile_key
+from heroed.utils import clamp
+import heroed.render
+import heroed.screen
+import heroed.ui.objects
+from heroed.ui.frames import terminal_colors
+from heroed.ui.minimap import ENEMY_CHARS
+
+THUMBNAIL_WIDTH = 16
+# rows of cells sampled for the thumbnail rows: upper, middle and lower
+# areas, and the bottom row
+SAMPLED_ROWS = (5, 6, 11, 16)
+THUMBNAIL_ROWS = len(SAMPLED_ROWS)
+CELLS_PER_CHAR = heroed.render.SCREEN_COLUMNS // THUMBNAIL_WIDTH
+# a thumbnail with its label row, and a margin
+SLOT_WIDTH = THUMBNAIL_WIDTH + 2
+SLOT_HEIGHT = THUMBNAIL_ROWS + 1
+
+
+def _marker_x(position, width=3):
+    """the thumbnail column of an object at a position (0..39)"""
+    screen_pos = heroed.ui.objects.position_to_screen_pos(position)
+    return clamp(
+        (screen_pos + width // 2) // CELLS_PER_CHAR, 0, THUMBNAIL_WIDTH - 1
+    )
+
+
+def thumbnail_chars(
+    screen_number, key, level_initial_screens, level_screen_count
+):
+    """returns the thumbnail of a screen, rendered from its tile key: a list
+    of THUMBNAIL_ROWS lists of (char, MSX color)"""
+    screen_data = key[:8]
+    cells = heroed.render.screen_cells(
+        screen_number,
+        screen_data,
+        key[8:16] if screen_number > 0 else None,
+        level_initial_screens,
+        level_screen_count,
+    )
+    rows = []
+    for y in SAMPLED_ROWS:
+        row = []
+        for x in range(0, heroed.render.SCREEN_COLUMNS, CELLS_PER_CHAR):
+            color = cells[y][x]
+            if color == heroed.render.BLACK:
+                row.append((" ", color))
+            elif color == heroed.render.CYAN:
+                row.append(("~", color))
+            else:
+                row.append(("#", color))
+        rows.append(row)
+
+    # objects
+    is_initial = key[18]
+    magma = heroed.screen.get_magma(screen_data)
+    lantern = heroed.screen.get_object_position(screen_data, hero.BYTE_LANTERN)
+    if lantern is not None:
+        rows[0][_marker_x(lantern, 4)] = ("*", heroed.render.WHITE)
+    wall = (
+        15
+        if is_initial
+        else heroed.screen.get_object_position(screen_data, hero.BYTE_WALL)
+    )
+    if wall is not None:
+        rows[1][_marker_x(wall)] = (
+            "|",
+            heroed.render.RED if magma else heroed.render.MAGENTA,
+        )
+    for byte, row in ((hero.BYTE_ENEMY_MID, 1), (hero.BYTE_ENEMY_LOW, 2)):
+        enemy = heroed.screen.get_enemy(screen_data, byte)
+        if enemy is not None:
+            position = heroed.screen.get_object_position(screen_data, byte)
+            rows[row][_marker_x(position)] = (
+                ENEMY_CHARS[enemy],
+                heroed.render.WHITE,
+            )
+    return rows
+
+
+class ScreenBrowser:
+    def __init__(self, term, true_color=False):
+        self.term = term
+        self.selected = 0
+        self.top = 0  # first visible grid row
+        self._tables = None
+        self._layout = None
+        # {tile key: [row str, ...]}
+        self._cache = {}
+        # the rows printed
+        self._drawn = []
+        self._colors = terminal_colors(term, true_color)
+
+    @property
+    def columns(self):
+        return max((self.term.width - 1) // SLOT_WIDTH, 1)
+
+    @property
+    def visible_rows(self):
+        """visible grid rows, between the title and the footer"""
+        return max((self.term.height - 2) // SLOT_HEIGHT, 1)
+
+    def set_screens(
+        self, tables, level_initial_screens, level_screen_count, selected
+    ):
+        """tables are the 8 screens tables (see Editor.screens_tables)"""
+        self._tables = tables
+        self._layout = (level_initial_screens, level_screen_count)
+        self.top = 0
+        self.select(selected)
+        self.invalidate()
+
+    def invalidate(self):
+        """the terminal has been cleared, draw() must print every row"""
+        self._drawn = []
+
+    def select(self, screen_number):
+        """select a screen, scrolling the grid to show it"""
+        self.selected = clamp(screen_number, 0, 255)
+        row = self.selected // self.columns
+        if row < self.top:
+            self.top = row
+        elif row >= self.top + self.visible_rows:
+            self.top = row - self.visible_rows + 1
+
+    def move(self, delta):
+        self.select(self.selected + delta)
+
+    def _thumbnail(self, screen_number):
+        """returns the rows (terminal str) of a thumbnail, rendering it if
+        it's not cached"""
+        key = tile_key(screen_number, self._tables, *self._layout)
+        rows = self._cache.get(key)
+        if rows is None:
+            rows = []
+            for chars in thumbnail_chars(screen_number, key, *self._layout):
+                s = ""
+                color = None
+                for char, char_color in chars:
+                    if char != " " and char_color != color:
+                        color = char_color
+                        s += self._colors[color]
+                    s += char
+                rows.append(s + self.term.normal)
+            self._cache[key] = rows
+        return rows
+
+    def _label(self, screen_number):
+        level, levelscr = hero.get_levelscr_from_absscr(
+            screen_number, *self._layout
+        )
+        if level is None:
+            text = "%3d" % screen_number
+        else:
+            text = "%3d L%2d S%2d" % (screen_number, level, levelscr)
+        text = text.ljust(THUMBNAIL_WIDTH)
+        if screen_number == self.selected:
+            return self.term.black_on_white(text)
+        if screen_number in self._layout[0]:
+            return self.term.white_on_blue(text)
+        if screen_number in hero.final_screens(*self._layout):
+            return self.term.white_on_red(text)
+        return self.term.normal + text
+
+    def _grid_row(self, row):
+        """returns the terminal rows (str) of a grid row"""
+        first = row * self.columns
+        screens = range(first, min(first + self.columns, 256))
+        lines = [[] for _ in range(SLOT_HEIGHT)]
+        for screen_number in screens:
+            lines[0].append(self._label(screen_number))
+            for line, s in zip(lines[1:], self._thumbnail(screen_number)):
+                line.append(s)
+        return [" " + (self.term.normal + "  ").join(line) for line in lines]
+
+    def draw(self, pos_y=1):
+        """print the rows of the visible grid rows that changed since the
+        last draw"""
+        rows = []
+        for row in range(self.top, self.top + self.visible_rows):
+            if row * self.columns < 256:
+                rows += self._grid_row(row)
+            else:
+                rows += [""] * SLOT_HEIGHT
+        output = []
+        for y, s in enumerate(rows):
+            if y >= len(self._drawn) or self._drawn[y] != s:
+                output.append(
+                    self.term.move_xy(0, pos_y + y)
+                    + self.term.normal
+                    + self.term.clear_eol
+                    + s
+                )
+        self._drawn = rows
+        if output:
+            with self.term.location():
+                print("".join(output), end="", flush=True)
@@ -31,5 +31,10 @@ class Cursor:
     def value(self):
         return self._cursor
 
+    def set_value(self, value):
+        """set the cursor, e.g. to restore a previous session"""
+        self._previous_cursor = self._cursor
+        self._cursor = value
+
     def previous_value(self):
         return self._previous_cursor
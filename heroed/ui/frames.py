@@ -0,0 +1,147 @@
+"""Screens rendered to terminal strings ("frames"), to show screens other
+than the one being edited.
+
+A frame is the list of SCREEN_ROWS rows of a screen, each one a str with
+the terminal sequences to print it. The screens are decoded with
+heroed.render, and the frames are cached until the data of the screen, of
+its prior screen or the level layout change, so the views that show them
+(and show them again after the terminal is resized) don't render them
+again.
+
+With true color, the cells are full blocks with the colors of the MSX
+palette (instead of checkerboards of the 8 terminal colors), and
+HalfBlockFrames fit two rows of cells in each row of the terminal, with
+upper and lower half blocks, for the smaller previews.
+"""
+
+import heroed.render
+from heroed.ui.misc import ACS_CKBOARD
+
+FULL_BLOCK = "\u2588"
+UPPER_HALF_BLOCK = "\u2580"
+LOWER_HALF_BLOCK = "\u2584"
+
+
+def terminal_colors(term, true_color=False):
+    """returns the terminal colors of the 16 MSX colors. With true_color,
+    the real colors of the MSX palette (24-bit)"""
+    if true_color:
+        return [term.color_rgb(*rgb) for rgb in heroed.render.MSX_PALETTE]
+    term_colors = {
+        heroed.render.GREEN: term.green,
+        heroed.render.BRIGHT_GREEN: term.bright_green,
+        4: term.blue,
+        heroed.render.CYAN: term.cyan,
+        heroed.render.RED: term.red,
+        heroed.render.YELLOW: term.yellow,
+        heroed.render.BRIGHT_YELLOW: term.bright_yellow,
+        heroed.render.MAGENTA: term.magenta,
+        heroed.render.WHITE: term.white,
+    }
+    return [term_colors.get(color, term.white) for color in range(16)]
+
+
+class ScreenFrames:
+    # terminal rows of a frame
+    rows = heroed.render.SCREEN_ROWS
+
+    def __init__(self, term, true_color=False):
+        self.term = term
+        self.true_color = true_color
+        self._layout = None
+        # {screen number: (screen key, frame)}
+        self._cache = {}
+        self._colors = terminal_colors(term, true_color)
+
+    @property
+    def layout(self):
+        return self._layout
+
+    def set_level_layout(self, level_initial_screens, level_screen_count):
+        layout = (tuple(level_initial_screens), tuple(level_screen_count))
+        if layout != self._layout:
+            # the screens are decoded depending on the layout
+            self._cache = {}
+            self._layout = layout
+
+    def row_str(self, cells):
+        """convert a row of cells to a terminal str"""
+        s = ""
+        x = 0
+        while x < len(cells):
+            color = cells[x]
+            end = x + 1
+            while end < len(cells) and cells[end] == color:
+                end += 1
+            if color == heroed.render.BLACK:
+                s += self.term.normal + " " * (end - x)
+            elif self.true_color:
+                s += self._colors[color] + FULL_BLOCK * (end - x)
+            else:
+                s += self._colors[color] + self.term.acs(
+                    ACS_CKBOARD * (end - x)
+                )
+            x = end
+        return s + self.term.normal
+
+    def _frame_rows(self, cells):
+        return [self.row_str(row) for row in cells]
+
+    def frame(self, screen_number, screen_data, prior_screen_data):
+        """returns the rows (terminal str) of a screen, decoding it if it's
+        not cached or it has changed. prior_screen_data is None for the
+        screen 0."""
+        key = bytes(screen_data) + bytes(prior_screen_data or b"")
+        cached = self._cache.get(screen_number)
+        if cached is None or cached[0] != key:
+            cells = heroed.render.screen_cells(
+                screen_number, screen_data, prior_screen_data, *self._layout
+            )
+            cached = (key, self._frame_rows(cells))
+            self._cache[screen_number] = cached
+        return cached[1]
+
+
+class HalfBlockFrames(ScreenFrames):
+    """Frames of true color half blocks: each row of the terminal has two
+    rows of cells, the upper one is the foreground color of an upper half
+    block, and the lower one the background color."""
+
+    rows = (heroed.render.SCREEN_ROWS + 1) // 2
+
+    def __init__(self, term):
+        super().__init__(term, true_color=True)
+        self._backgrounds = [
+            term.on_color_rgb(*rgb) for rgb in heroed.render.MSX_PALETTE
+        ]
+
+    def _half_block(self, upper, lower):
+        """returns the sequence and char of a pair of cells. The black cells
+        are left with the background of the terminal."""
+        black = heroed.render.BLACK
+        if upper == black and lower == black:
+            return self.term.normal, " "
+        if lower == black:
+            return self.term.normal + self._colors[upper], UPPER_HALF_BLOCK
+        if upper == black:
+            return self.term.normal + self._colors[lower], LOWER_HALF_BLOCK
+        return self._colors[upper] + self._backgrounds[lower], UPPER_HALF_BLOCK
+
+    def _frame_rows(self, cells):
+        rows = []
+        for y in range(0, len(cells), 2):
+            upper = cells[y]
+            if y + 1 < len(cells):
+                lower = cells[y + 1]
+            else:
+                lower = bytes((heroed.render.BLACK,)) * len(upper)
+            s = ""
+            sequence = None
+            for pair in zip(upper, lower):
+                pair_sequence, char = self._half_block(*pair)
+                if pair_sequence != sequence:
+                    sequence = pair_sequence
+                    s += sequence
+                s += char
+            rows.append(s + self.term.normal)
+        return rows
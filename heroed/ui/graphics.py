@@ -0,0 +1,139 @@
+"""Inline graphics preview of the screen being edited, at the MSX resolution
+(256x136 pixels), for the terminals that support sixel or the kitty
+graphics protocol.
+
+The image is rendered with heroed.render and encoded for the terminal only
+when the screen, its prior screen or the level layout change: the encoded
+images are cached like the frames of heroed.ui.frames (GraphicsFrames is a
+ScreenFrames whose frames are a single str), so drawing the preview again
+while editing, or after the terminal is resized, only prints it.
+"""
+
+import base64
+import zlib
+
+import heroed.render
+from heroed.render import CELL_WIDTH, CELL_HEIGHT, MSX_PALETTE
+from heroed.ui.frames import ScreenFrames
+
+PROTOCOLS = ("sixel", "kitty")
+
+SIXEL_BAND = 6
+# the image id, to replace and delete it
+KITTY_IMAGE_ID = 1
+KITTY_CHUNK = 4096
+
+
+def _sixel_run(char, count):
+    if count > 3:
+        return "!%d%s" % (count, char)
+    return char * count
+
+
+def encode_sixel(cell_rows):
+    """returns the sixel sequence of the image of the cell rows"""
+    width = len(cell_rows[0]) * CELL_WIDTH
+    height = len(cell_rows) * CELL_HEIGHT
+    output = ['\x1bPq"1;1;%d;%d' % (width, height)]
+    output += [
+        "#%d;2;%d;%d;%d" % ((color,) + tuple(c * 100 // 255 for c in rgb))
+        for color, rgb in enumerate(MSX_PALETTE)
+    ]
+    for band in range(0, height, SIXEL_BAND):
+        # the cell row of each pixel row of the band
+        rows = [
+            cell_rows[y // CELL_HEIGHT]
+            for y in range(band, min(band + SIXEL_BAND, height))
+        ]
+        layers = []
+        for color in sorted(set().union(*rows)):
+            # the cells of a column have the same pixels, so the sixels
+            # are built by cell, and repeated CELL_WIDTH times
+            layer = "#%d" % color
+            run_char, run = None, 0
+            for x in range(len(cell_rows[0])):
+                char = chr(
+                    63
+                    + sum(
+                        1 << bit
+                        for bit, row in enumerate(rows)
+                        if row[x] == color
+                    )
+                )
+                if char == run_char:
+                    run += CELL_WIDTH
+                else:
+                    if run_char is not None:
+                        layer += _sixel_run(run_char, run)
+                    run_char, run = char, CELL_WIDTH
+            if run_char != "?":
+                layer += _sixel_run(run_char, run)
+            layers.append(layer)
+        output.append("$".join(layers) + "-")
+    output.append("\x1b\\")
+    return "".join(output)
+
+
+def encode_kitty(cell_rows):
+    """returns the kitty graphics sequences to show the image of the cell
+    rows at the cursor (without moving it)"""
+    width = len(cell_rows[0]) * CELL_WIDTH
+    height = len(cell_rows) * CELL_HEIGHT
+    data = base64.standard_b64encode(
+        zlib.compress(heroed.render.rgb_pixels(cell_rows))
+    ).decode()
+    chunks = [
+        data[n : n + KITTY_CHUNK] for n in range(0, len(data), KITTY_CHUNK)
+    ]
+    output = []
+    for n, chunk in enumerate(chunks):
+        more = int(n < len(chunks) - 1)
+        if n == 0:
+            control = "a=T,f=24,o=z,s=%d,v=%d,i=%d,C=1,q=2,m=%d" % (
+                width,
+                height,
+                KITTY_IMAGE_ID,
+                more,
+            )
+        else:
+            control = "m=%d" % more
+        output.append("\x1b_G%s;%s\x1b\\" % (control, chunk))
+    return "".join(output)
+
+
+ENCODERS = {"sixel": encode_sixel, "kitty": encode_kitty}
+
+
+class GraphicsFrames(ScreenFrames):
+    """Images of the screens, encoded for the terminal with a protocol of
+    PROTOCOLS. They take the place of a frame of text: an image is 136
+    pixels high, so it fits in SCREEN_ROWS rows unless the cells of the
+    terminal are less than 8 pixels high."""
+
+    rows = heroed.render.SCREEN_ROWS
+
+    def __init__(self, term, protocol):
+        super().__init__(term)
+        self.protocol = protocol
+        self._encode = ENCODERS[protocol]
+
+    def _frame_rows(self, cells):
+        return self._encode(cells)
+
+    def erase(self, x, y):
+        """returns the sequence to erase an image drawn at x, y (its top
+        left corner)"""
+        if self.protocol == "kitty":
+            return self.erase_all()
+        width = max(min(heroed.render.SCREEN_COLUMNS, self.term.width - x), 0)
+        return "".join(
+            self.term.move_xy(x, row) + self.term.normal + " " * width
+            for row in range(y, min(y + self.rows, self.term.height))
+        )
+
+    def erase_all(self):
+        """returns the sequence to erase the images that are not erased
+        clearing the terminal (kitty images are not text)"""
+        if self.protocol == "kitty":
+            return "\x1b_Ga=d,d=I,i=%d,q=2\x1b\\" % KITTY_IMAGE_ID
+        return ""
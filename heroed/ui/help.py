@@ -1,18 +1,16 @@
 # encoding=latin-1
-def draw_help_1(term, **kwargs):
-    with term.location(0, 0):
-        print(
-            term.bright_yellow_on_red(
-                (
-                    "HEROED - MSX H.E.R.O. Editor v%s (by @qarlosherrero)"
-                    % kwargs.get("ver")
-                ).center(80)
-            ),
-            end="",
-        )
-        print(
-            """\
+"""The help pages.
 
+The pages are plain text, rendered once to frames (see HelpPages): a frame
+is the str that draws a whole page with a single write, cached for the
+palette of the terminal. The rows that match a search are rendered again,
+highlighted, and written over the frame.
+"""
+
+TITLE = "HEROED - MSX H.E.R.O. Editor v%s (by @qarlosherrero)"
+
+# below the title
+INTRODUCTION = """\
 
 Use this utility to edit the levels of the video game H.E.R.O. for MSX.
 
@@ -34,14 +32,9 @@ open a gap to the left or right side of a screen to enable a horizontal flow.
 You can also set which is the first screen and which is the final one on each
 level, so you can change the length of the levels. But there always have to be
 20 levels, and you can use a maximum of 256 screens for all of them.
-        """
-        )
+"""
 
-
-def draw_help_2(term, **kwargs):
-    with term.location(0, 0):
-        print(
-            """\
+CONTROLS = """\
 CONTROLS
 
   PAGE UP           Previous screen
@@ -64,14 +57,9 @@ CONTROLS
   N                 Change the MOD name
   H                 Show this help
   Q                 Quit
-        """
-        )
-
+"""
 
-def draw_help_3(term, **kwargs):
-    with term.location(0, 0):
-        print(
-            """\
+TIPS = """\
 TIPS
 
 - Move an object all the way to the left or right to hide it. Use SPACE to
@@ -94,14 +82,9 @@ TIPS
   area depends on the previous screen and cannot be modified directly. The
   middle and lower areas can be edited. The left and right halves are
   simmetrical.
-        """
-        )
+"""
 
-
-def draw_help_4(term, **kwargs):
-    with term.location(0, 0):
-        print(
-            """\
+MORE_TIPS = """\
 - The ALT. LAYOUT attribute toggles an alternative screen layout. When ON, the
   right half of the terrain middle area is reversed horizontally, and a side
   gap in the right side can be opened. Also, in the center-right there is a
@@ -124,8 +107,124 @@ def draw_help_4(term, **kwargs):
 
     Octopus: It works the same as the water platform, but using a size of 3
     blocks.
-        """
-        )
-
-
-draw_help_funcs = (draw_help_1, draw_help_2, draw_help_3, draw_help_4)
+"""
+
+MORE_CONTROLS = """\
+MORE CONTROLS
+
+  F                 Find screens by attributes, like 'enemy_low=snake magma',
+                    and go to the first match. Attributes are: enemy_low,
+                    enemy_mid (spider, bat, moth, snake, none), lantern,
+                    wall, magma (on, off), enemy_low_pos, enemy_mid_pos,
+                    lantern_pos, wall_pos (0..39, none), side_gap (no, alt,
+                    right, left), dir (right, left), lateral_mid,
+                    lateral_low, center_mid, center_low (0..255, 0x00..0xFF)
+  .                 Go to the next screen matching the last search
+  ,                 Go to the previous screen matching the last search
+  C                 Copy a number of screens, from the current one
+  V                 Paste the copied screens, overwriting the current screen
+                    and the following ones
+  I                 Insert the copied screens before the current screen. The
+                    following screens and levels are shifted, and the level
+                    of the current screen grows
+  D                 Delete a number of screens, from the current one. The
+                    following screens and levels are shifted back. All
+                    the screens of a level can't be deleted
+  K                 Compact the levels: move the screens that don't belong
+                    to any level to the end, after the last level
+  U                 Undo the last modification
+  P                 Save the project (.heroed file), to continue later
+"""
+
+VIEWS = """\
+VIEWS
+
+  L                 Show the current level as a continuous strip, with the
+                    screens stacked as the game scrolls them. Scroll it with
+                    UP/DOWN (a row) and PAGE UP/PAGE DOWN (a screen), and
+                    press ENTER to edit the screen at the center, or ESC to
+                    return
+
+  B                 Browse the 256 screens as thumbnails, with the terrain
+                    and the objects (see the minimap). Select one with the
+                    arrows and PAGE UP/PAGE DOWN, and press ENTER to edit it
+"""
+
+# in the order they're shown
+PAGES = (INTRODUCTION, CONTROLS, MORE_CONTROLS, VIEWS, TIPS, MORE_TIPS)
+
+
+class HelpPages:
+    def __init__(self, term, version=""):
+        self.term = term
+        # the rows of text of each page
+        self._rows = [text.rstrip().split("\n") for text in PAGES]
+        self._rows[0].insert(0, (TITLE % version).center(80))
+        # {(number of colors of the terminal, page): frame}
+        self._frames = {}
+
+    def __len__(self):
+        return len(PAGES)
+
+    def rows(self, page):
+        """returns the rows of text of a page"""
+        return self._rows[page]
+
+    def _row_str(self, page, y, query=""):
+        """returns a row of a page, with the matches of query highlighted"""
+        text = self._rows[page][y]
+        if (page, y) == (0, 0):
+            style = self.term.bright_yellow_on_red
+        else:
+            style = self.term.normal
+        s = ""
+        start = 0
+        if query:
+            lower_text, query = text.lower(), query.lower()
+            x = lower_text.find(query)
+            while x >= 0:
+                s += (
+                    style
+                    + text[start:x]
+                    + self.term.black_on_bright_yellow
+                    + text[x : x + len(query)]
+                )
+                start = x + len(query)
+                x = lower_text.find(query, start)
+        return s + style + text[start:] + self.term.normal
+
+    def matching_rows(self, page, query):
+        """returns the rows of a page that contain query (ignoring case)"""
+        query = query.lower()
+        return [
+            y
+            for y, text in enumerate(self._rows[page])
+            if query in text.lower()
+        ]
+
+    def find(self, query, page, step=1):
+        """returns the first page that contains query, from page and going
+        forward (or backwards, with step -1) and around, or None"""
+        for n in range(len(PAGES)):
+            found = (page + n * step) % len(PAGES)
+            if self.matching_rows(found, query):
+                return found
+        return None
+
+    def frame(self, page, query=""):
+        """returns the str that clears the terminal and draws a page, with
+        the matches of query highlighted"""
+        key = (self.term.number_of_colors, page)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self.term.normal + self.term.clear
+            for y, text in enumerate(self._rows[page]):
+                if text:
+                    frame += self.term.move_xy(0, y) + self._row_str(page, y)
+            self._frames[key] = frame
+        if query:
+            frame += "".join(
+                self.term.move_xy(0, y) + self._row_str(page, y, query)
+                for y in self.matching_rows(page, query)
+            )
+        return frame
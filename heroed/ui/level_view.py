@@ -0,0 +1,165 @@
+"""Continuous view of a level: the screens are stacked in one vertical strip,
+as the game scrolls them. The upper area of a screen is the lower area of
+the prior one, so the strip has the upper area of the initial screen, and
+then the middle and lower areas of each screen.
+
+The strip is not rendered at once: only the visible rows are. Screens are
+rendered (see heroed.ui.frames) when one of their rows becomes visible, and
+their frames are cached until their data changes. Scrolling a few rows uses
+the scroll region of the terminal, so only the new rows are printed.
+"""
+
+from heroed import hero
+from heroed.utils import Point, clamp
+import heroed.render
+
+UPPER_ROWS = 6
+# rows of each screen in the strip: middle and lower areas
+SCREEN_ROWS = heroed.render.SCREEN_ROWS - UPPER_ROWS
+
+
+class LevelView:
+    def __init__(self, term, frames, pos=Point(0, 2), rows=17):
+        """the view is drawn at pos, with the full width of the terminal
+        (so it can be scrolled with the scroll region). frames is a
+        heroed.ui.frames.ScreenFrames."""
+        self.term = term
+        self.frames = frames
+        self.pos = pos
+        self.rows = rows
+        self.top = 0  # first visible row of the strip
+        self._screens = ()
+        self._get_screen_data = None
+        # the rows printed
+        self._drawn = [None] * rows
+
+    @property
+    def strip_rows(self):
+        if not self._screens:
+            return 0
+        return UPPER_ROWS + SCREEN_ROWS * len(self._screens)
+
+    def set_level(
+        self,
+        screens,
+        get_screen_data,
+        level_initial_screens,
+        level_screen_count,
+    ):
+        """screens are the screen numbers of the level, in flow order, and
+        get_screen_data(screen number) returns the data of a screen"""
+        self._screens = tuple(screens)
+        self._get_screen_data = get_screen_data
+        self.frames.set_level_layout(level_initial_screens, level_screen_count)
+        self.top = clamp(self.top, 0, max(self.strip_rows - self.rows, 0))
+        self.invalidate()
+
+    def invalidate(self):
+        """the terminal has been cleared, draw() must print every row"""
+        self._drawn = [None] * self.rows
+
+    def screen_at(self, row):
+        """returns the screen of a row of the strip"""
+        index = max(row - UPPER_ROWS, 0) // SCREEN_ROWS
+        return self._screens[min(index, len(self._screens) - 1)]
+
+    def center_screen(self):
+        """returns the screen at the center of the view"""
+        if not self._screens:
+            return None
+        return self.screen_at(
+            min(self.top + self.rows // 2, self.strip_rows - 1)
+        )
+
+    def show_screen(self, screen_number):
+        """scroll to show the middle area of a screen at the top"""
+        if screen_number in self._screens:
+            self.scroll_to(
+                self._screens.index(screen_number) * SCREEN_ROWS
+                + UPPER_ROWS
+                - 1
+            )
+
+    def _screen_rows(self, screen_number):
+        """returns the frame of a screen"""
+        prior_screen_data = None
+        if screen_number > 0:
+            prior_screen_data = self._get_screen_data(screen_number - 1)
+        return self.frames.frame(
+            screen_number,
+            self._get_screen_data(screen_number),
+            prior_screen_data,
+        )
+
+    def _label(self, screen_number):
+        """the label at the right of the first row of a screen"""
+        level, levelscr = hero.get_levelscr_from_absscr(
+            screen_number, *self.frames.layout
+        )
+        return " S%2d [%3d]" % (levelscr or 0, screen_number)
+
+    def _view_row(self, row, screens_rows):
+        """returns the terminal str of a row of the strip"""
+        if row >= self.strip_rows:
+            return self.term.normal + " " * self.term.width
+        if row < UPPER_ROWS:
+            screen_number = self._screens[0]
+            screen_row = row
+        else:
+            index, screen_row = divmod(row - UPPER_ROWS, SCREEN_ROWS)
+            screen_number = self._screens[index]
+            screen_row += UPPER_ROWS
+        if screen_number not in screens_rows:
+            screens_rows[screen_number] = self._screen_rows(screen_number)
+        label = ""
+        if screen_row == UPPER_ROWS:
+            label = self._label(screen_number)
+        return (
+            "    "
+            + screens_rows[screen_number][screen_row]
+            + label.ljust(self.term.width - 4 - heroed.render.SCREEN_COLUMNS)
+        )
+
+    def scroll_to(self, top):
+        """scroll the strip to show the row top at the top of the view.
+        If only a few rows are scrolled, the terminal scrolls the rows
+        already printed."""
+        top = clamp(top, 0, max(self.strip_rows - self.rows, 0))
+        delta = top - self.top
+        self.top = top
+        if (
+            not delta
+            or abs(delta) >= self.rows
+            or not self.term.csr
+            or not any(self._drawn)
+        ):
+            return
+        bottom = self.pos.y + self.rows - 1
+        s = self.term.normal + self.term.csr(self.pos.y, bottom)
+        if delta > 0:
+            s += self.term.move_xy(0, bottom) + self.term.ind * delta
+            self._drawn = self._drawn[delta:] + [None] * delta
+        else:
+            s += self.term.move_xy(0, self.pos.y) + self.term.ri * -delta
+            self._drawn = [None] * -delta + self._drawn[:delta]
+        s += self.term.csr(0, self.term.height - 1)
+        with self.term.location():
+            print(s, end="")
+
+    def scroll(self, delta):
+        self.scroll_to(self.top + delta)
+
+    def draw(self):
+        """print the visible rows that changed since the last draw"""
+        output = []
+        screens_rows = {}
+        for y in range(self.rows):
+            s = self._view_row(self.top + y, screens_rows)
+            if s != self._drawn[y]:
+                self._drawn[y] = s
+                output.append(
+                    self.term.move_xy(self.pos.x, self.pos.y + y) + s
+                )
+        if output:
+            with self.term.location():
+                print("".join(output), end="", flush=True)
@@ -0,0 +1,125 @@
+"""Minimap of the current level, at the right side of the game screen.
+
+Each screen of the level is a row with its level screen number, its flow
+direction and its objects:
+
+     3> bs*|
+
+    3       level screen number
+    >       direction (> or <), ~ if there is water (screens >= 11)
+    b s     enemies at the middle and lower areas (spider, bat, moth, snake
+            or . if hidden)
+    *       lantern
+    |       wall
+
+Magma screens are red, and the selected screen is reversed. The rows drawn
+are remembered, so only the rows that change are printed again.
+"""
+
+from heroed import hero
+from heroed.utils import Point
+import heroed.screen
+
+ROWS = 16  # max. screens of a level
+WIDTH = 10
+ENEMY_CHARS = {
+    None: ".",
+    "spider": "s",
+    "bat": "b",
+    "moth": "m",
+    "snake": "n",
+}
+
+
+def minimap_entry(levelscr, screen_data):
+    """returns the text of a screen in the minimap"""
+    if levelscr >= 11:
+        direction = "~"
+    elif heroed.screen.get_righttoleft(screen_data):
+        direction = "<"
+    else:
+        direction = ">"
+    lantern = heroed.screen.get_object_position(
+        screen_data, hero.BYTE_LANTERN
+    )
+    wall = heroed.screen.get_object_position(screen_data, hero.BYTE_WALL)
+    return "%2d%s %s%s%s%s" % (
+        levelscr,
+        direction,
+        ENEMY_CHARS[heroed.screen.get_enemy(screen_data, hero.BYTE_ENEMY_MID)],
+        ENEMY_CHARS[heroed.screen.get_enemy(screen_data, hero.BYTE_ENEMY_LOW)],
+        "." if lantern is None else "*",
+        " " if wall is None else "|",
+    )
+
+
+class Minimap:
+    def __init__(self, term, pos=Point(69, 5)):
+        self.term = term
+        self.pos = pos
+        # screen numbers of the level, their entries and magma
+        self._screens = ()
+        self._entries = {}
+        self._selected = None
+        # the rows printed
+        self._drawn = [None] * ROWS
+
+    @property
+    def screens(self):
+        return self._screens
+
+    def _set_entry(self, screen_number, screen_data):
+        self._entries[screen_number] = (
+            minimap_entry(self._screens.index(screen_number) + 1, screen_data),
+            heroed.screen.get_magma(screen_data),
+        )
+
+    def set_level(self, screens_data):
+        """set the screens of the level, a list of (screen number, screen
+        data), and draw them"""
+        self._screens = tuple(
+            screen_number for screen_number, _ in screens_data[:ROWS]
+        )
+        self._entries = {}
+        for screen_number, screen_data in screens_data[:ROWS]:
+            self._set_entry(screen_number, screen_data)
+        self.draw()
+
+    def update_screen(self, screen_number, screen_data):
+        """a screen has been modified, draw it if it's in the level"""
+        if screen_number in self._entries:
+            self._set_entry(screen_number, screen_data)
+            self.draw()
+
+    def select(self, screen_number):
+        if screen_number != self._selected:
+            self._selected = screen_number
+            self.draw()
+
+    def invalidate(self):
+        """the terminal has been cleared, draw() must print every row"""
+        self._drawn = [None] * ROWS
+
+    def _row(self, row):
+        if row >= len(self._screens):
+            return self.term.normal + " " * WIDTH
+        screen_number = self._screens[row]
+        text, magma = self._entries[screen_number]
+        color = self.term.red if magma else self.term.normal
+        if screen_number == self._selected:
+            color += self.term.reverse
+        return color + text.ljust(WIDTH) + self.term.normal
+
+    def draw(self):
+        """print the rows that changed since the last draw"""
+        output = []
+        for row in range(ROWS):
+            s = self._row(row)
+            if s != self._drawn[row]:
+                self._drawn[row] = s
+                output.append(
+                    self.term.move_xy(self.pos.x, self.pos.y + row) + s
+                )
+        if output:
+            with self.term.location():
+                print("".join(output), end="", flush=True)
@@ -0,0 +1,220 @@
+"""The prior and next screens of the one being edited, shown in the space
+that is left when the terminal is larger than 80x24: at the right of the
+editor (side by side) when it's wide, and below it (stacked, as the game
+scrolls) when it's tall.
+
+The screens are drawn from their frames (see heroed.ui.frames), which are
+cached, and the rows printed are remembered by their terminal position.
+So when the terminal is resized, the frames are moved to their new places
+without rendering them again, only the rows that are left behind are
+erased, and the rest of the editor is not drawn again.
+"""
+
+from heroed import hero
+from heroed.render import SCREEN_ROWS, SCREEN_COLUMNS
+
+# the area used by the rest of the editor
+EDITOR_WIDTH = 80
+EDITOR_HEIGHT = 24
+# a frame with a margin
+SLOT_WIDTH = SCREEN_COLUMNS + 2
+
+
+def layout_slots(width, height, frame_rows=SCREEN_ROWS):
+    """returns the places (the position of the label row) where a screen
+    (of frame_rows, and its label row) fits: the ones at the right of the
+    editor and the ones below it"""
+    slot_height = frame_rows + 1
+    right = [
+        (x, y)
+        for x in range(
+            EDITOR_WIDTH + 1, width - SCREEN_COLUMNS + 1, SLOT_WIDTH
+        )
+        for y in range(1, height - frame_rows, slot_height)
+    ]
+    below = [
+        (4, y) for y in range(EDITOR_HEIGHT, height - frame_rows, slot_height)
+    ]
+    return right, below
+
+
+def layout_neighbours(width, height, frame_rows=SCREEN_ROWS, preview=False):
+    """returns the places of the preview, the prior and the next screens (or
+    None). The preview, if any, goes first, at the right of the editor. The
+    next screen goes below the editor, where the game scrolls to, if it
+    fits, and else at the right, after the prior screen."""
+    right, below = layout_slots(width, height, frame_rows)
+    preview_place = None
+    if preview and (right or below):
+        preview_place = (right or below).pop(0)
+    if below:
+        return preview_place, (right[0] if right else None), below[0]
+    if len(right) >= 2:
+        return preview_place, right[0], right[1]
+    return preview_place, None, (right[0] if right else None)
+
+
+class NeighbourScreens:
+    def __init__(self, term, frames, graphics=None):
+        """frames is a heroed.ui.frames.ScreenFrames (or HalfBlockFrames,
+        for smaller screens). With graphics (a
+        heroed.ui.graphics.GraphicsFrames), the screen being edited is also
+        previewed as an image."""
+        self.term = term
+        self.frames = frames
+        self.graphics = graphics
+        # function that returns the data of a screen, set by the editor
+        self.get_screen_data = None
+        self._screen_number = None
+        self._screen_data = None
+        # the data of the screens around the current one
+        self._data = {}
+        self._places = (None, None, None)
+        # {(x, y): the row printed}
+        self._drawn = {}
+        # the place and the image printed
+        self._drawn_image = (None, None)
+
+    def set_screen(self, screen_number, screen_data):
+        """set the screen being edited (its data can be modified)"""
+        if screen_number != self._screen_number:
+            self._screen_number = screen_number
+            self._read_screens()
+        self._screen_data = screen_data
+        self.draw()
+
+    def _read_screens(self):
+        """read the data of the screens around the current one"""
+        self._data = {
+            n: self.get_screen_data(n)
+            for n in range(self._screen_number - 2, self._screen_number + 2)
+            if 0 <= n < 256 and n != self._screen_number
+        }
+
+    def reload(self):
+        """the screens have been read again (the ROM file has been
+        reloaded), read and draw the ones around the current one"""
+        if self._screen_number is not None:
+            self._read_screens()
+            self.draw()
+
+    def update_screen(self, screen_number, screen_data):
+        """a screen has been modified, draw it if it's around the current
+        one"""
+        if screen_number in self._data:
+            self._data[screen_number] = screen_data
+            self.draw()
+
+    def invalidate(self):
+        """the terminal has been cleared, draw() must print every row"""
+        self._drawn = {}
+        self._drawn_image = (None, None)
+
+    def relayout(self):
+        """place the screens for the current size of the terminal, and draw
+        them, erasing the rows left behind"""
+        frame_rows = self.frames.rows
+        if self.graphics is not None:
+            frame_rows = max(frame_rows, self.graphics.rows)
+        self._places = layout_neighbours(
+            self.term.width,
+            self.term.height,
+            frame_rows,
+            preview=self.graphics is not None,
+        )
+        self.draw()
+
+    def _get_data(self, screen_number):
+        if screen_number == self._screen_number:
+            return self._screen_data
+        return self._data.get(screen_number)
+
+    def _label(self, title, screen_number):
+        level, levelscr = hero.get_levelscr_from_absscr(
+            screen_number, *self.frames.layout
+        )
+        if levelscr is None:
+            text = " %s  [%3d]" % (title, screen_number)
+        else:
+            text = " %s  L%2d S%2d [%3d]" % (
+                title,
+                level,
+                levelscr,
+                screen_number,
+            )
+        return self.term.black_on_white(text.ljust(SCREEN_COLUMNS))
+
+    def _rows(self):
+        """returns the rows to print, {(x, y): str}"""
+        rows = {}
+        if self._screen_number is None or self.frames.layout is None:
+            return rows
+        if self._places[0] is not None:
+            rows[self._places[0]] = self._label("SCREEN", self._screen_number)
+        for (title, screen_number), place in zip(
+            (
+                ("PRIOR", self._screen_number - 1),
+                ("NEXT", self._screen_number + 1),
+            ),
+            self._places[1:],
+        ):
+            if place is None or not 0 <= screen_number < 256:
+                continue
+            frame = self.frames.frame(
+                screen_number,
+                self._get_data(screen_number),
+                self._get_data(screen_number - 1),
+            )
+            x, y = place
+            rows[(x, y)] = self._label(title, screen_number)
+            for row, s in enumerate(frame, y + 1):
+                rows[(x, row)] = s
+        return rows
+
+    def draw(self):
+        """print the rows that changed since the last draw, and erase the
+        ones that are not used now"""
+        rows = self._rows()
+        output = []
+        image = (None, None)
+        if self.graphics is not None:
+            image = self._image()
+        if image != self._drawn_image and self._drawn_image[0] is not None:
+            # erase the image before printing the text that replaces it (a
+            # new sixel image at the same place is just drawn over it)
+            x, y = self._drawn_image[0]
+            if image[0] != (x, y) or self.graphics.protocol != "sixel":
+                output.append(self.graphics.erase(x, y + 1))
+        for (x, y), s in self._drawn.items():
+            # erase the rows not used now (if they're in the terminal)
+            if (
+                (x, y) not in rows
+                and x < self.term.width
+                and y < self.term.height
+            ):
+                width = min(SCREEN_COLUMNS, self.term.width - x)
+                output.append(
+                    self.term.move_xy(x, y) + self.term.normal + " " * width
+                )
+        for (x, y), s in rows.items():
+            if self._drawn.get((x, y)) != s:
+                output.append(self.term.move_xy(x, y) + s)
+        self._drawn = rows
+        if image != self._drawn_image and image[0] is not None:
+            x, y = image[0]
+            output.append(self.term.move_xy(x, y + 1) + image[1])
+        self._drawn_image = image
+        if output:
+            with self.term.location():
+                print("".join(output), end="", flush=True)
+
+    def _image(self):
+        """returns the place and the image of the preview"""
+        place = self._places[0]
+        if place is None or self._screen_number is None:
+            return None, None
+        return place, self.graphics.frame(
+            self._screen_number,
+            self._screen_data,
+            self._get_data(self._screen_number - 1),
+        )
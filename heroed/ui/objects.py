@@ -11,6 +11,11 @@ The middle area and the lower area are represented the same way.
 from heroed.utils import clamp
 from heroed import hero
 from heroed.ui.cursor import Cursor
+from heroed.screen import (
+    position_to_screen_pos,
+    byte_to_position,
+    byte_to_enemy_type,
+)
 
 _IN_ATTRIBUTES = 0xFF
 _cursor_values = (
@@ -22,23 +27,6 @@ _cursor_values = (
 )
 
 
-def position_to_screen_pos(x):
-    """
-    Returns the position at screen of an object data position.
-    x       data position, from 0 to 39
-    returns screen position, from 2 to 60
-    """
-    return x * 3 // 2 + 2
-
-
-def byte_to_position(byte):
-    """
-    byte   1 byte, with the object position in the 6 most-significant bits
-    returns int with object position data (0..39)
-    """
-    return byte >> 2
-
-
 def position_to_byte(x):
     """
     x       data position, from 0 to 39
@@ -65,15 +53,6 @@ def byte_to_screen_pos(byte):
     return position_to_screen_pos(byte_to_position(byte))
 
 
-def byte_to_enemy_type(byte):
-    """
-    Returns the enemy type an object byte
-    byte   1 byte, with the enemy type in the 2 least-significant bits
-    returns enemy type, from 0 to 3 (hero.ENEMY_SPIDER..hero.ENEMY_SNAKE)
-    """
-    return 0b00000011 & byte
-
-
 class ObjectsCursor(Cursor):
     def __init__(self):
         # This is the object byte: hero.BYTE_LANTERN, hero.BYTE_WALL...
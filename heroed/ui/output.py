@@ -0,0 +1,558 @@
+"""Low bandwidth output, for slow remote sessions (see the --low-bandwidth
+option).
+
+In this mode the editor doesn't write to the terminal: what it prints is
+applied to a model of the screen, and when a frame is done (when the editor
+waits for a keystroke), only the cells that differ from what the terminal
+shows are sent, with:
+
+- the shortest cursor moves: relative to the cursor, or the chars already
+  on the screen, instead of absolute moves (and the editor moves the cursor
+  a lot, saving and restoring it);
+- the SGR attributes combined in one sequence, and only when a cell needs
+  them (a space only needs its background color);
+- the runs of a char compressed with REP, if the terminal has it, and the
+  ends of the rows that are cleared erased with EL;
+- a byte budget per frame: the rest of a frame is sent when no key is
+  pressed for a while (or it's replaced by the next frame).
+
+The scrolls (of the scroll region) and the modes of the terminal are sent
+as they're written.
+"""
+
+import re
+
+FRAME_BUDGET = 2048
+
+DEFAULT_ATTRIBUTES = (None, None, frozenset())
+REVERSE, UNDERLINE = 7, 4
+# SGR params that turn off the attributes
+ATTRIBUTES_OFF = {1: 22, 2: 22, 3: 23, 4: 24, 5: 25, 7: 27, 8: 28, 9: 29}
+# chars that are different in the line drawing charset
+ACS_CHARS = frozenset(chr(c) for c in range(0x5F, 0x7F))
+
+SMACS = "\x1b(0"
+RMACS = "\x1b(B"
+
+# a sequence, a control char or a run of text
+TOKEN = re.compile(
+    r"\x1b\[([0-?]*)[ -/]*([@-~])"  # CSI
+    r"|\x1b[P\]_^X][^\x07\x1b]*(?:\x07|\x1b\\)"  # DCS, OSC, APC...
+    r"|\x1b[()*+]."  # charset designation
+    r"|\x1b[ -/]*[0-~]"  # other escape sequences
+    r"|[\x00-\x1f\x7f]"
+    r"|[^\x00-\x1f\x7f]+"
+)
+# a sequence that is not complete, at the end of a write
+INCOMPLETE = re.compile(
+    r"\x1b(\[[0-?]*[ -/]*|[P\]_^X][^\x07\x1b]*\x1b?|[()*+]|[ -/]*)\Z"
+)
+
+
+def _cell(char, acs, attributes):
+    """returns a cell, normalized: the spaces only keep the attributes that
+    show, and the chars not in the line drawing charset don't keep it"""
+    fg, bg, flags = attributes
+    if char == " " and UNDERLINE not in flags:
+        if REVERSE in flags:
+            return (" ", False, (fg, None, frozenset((REVERSE,))))
+        return (" ", False, (None, bg, frozenset()))
+    return (char, acs and char in ACS_CHARS, attributes)
+
+
+BLANK = _cell(" ", False, DEFAULT_ATTRIBUTES)
+
+
+def _background(attributes):
+    """the background color that shows, for a space"""
+    fg, bg, flags = attributes
+    if REVERSE in flags:
+        return ("fg", fg)
+    return ("bg", bg)
+
+
+def sgr_attributes(attributes, params):
+    """returns the attributes after a SGR sequence with params (str)"""
+    fg, bg, flags = attributes
+    params = [p or "0" for p in params.split(";")]
+    n = 0
+    while n < len(params):
+        p = int(params[n]) if params[n].isdigit() else 0
+        if p in (38, 48) and n + 1 < len(params):
+            count = 3 if params[n + 1] == "5" else 5
+            color = ";".join(params[n : n + count])
+            n += count - 1
+            if p == 38:
+                fg = color
+            else:
+                bg = color
+        elif p == 0:
+            fg, bg, flags = DEFAULT_ATTRIBUTES
+        elif 30 <= p <= 37 or 90 <= p <= 97:
+            fg = str(p)
+        elif p == 39:
+            fg = None
+        elif 40 <= p <= 47 or 100 <= p <= 107:
+            bg = str(p)
+        elif p == 49:
+            bg = None
+        elif p in ATTRIBUTES_OFF.values():
+            flags = flags - {
+                f for f, off in ATTRIBUTES_OFF.items() if off == p
+            }
+        elif p in ATTRIBUTES_OFF:
+            flags = flags | {p}
+        n += 1
+    return (fg, bg, frozenset(flags))
+
+
+def sgr(attributes, new_attributes):
+    """returns the shortest SGR sequence to change the attributes (None if
+    they're unknown)"""
+    if attributes == new_attributes:
+        return ""
+    fg, bg, flags = new_attributes
+    reset = (
+        ["0"] + [c for c in (fg, bg) if c] + [str(f) for f in sorted(flags)]
+    )
+    if attributes is None:
+        return "\x1b[%sm" % ";".join(reset)
+    params = []
+    if fg != attributes[0]:
+        params.append(fg or "39")
+    if bg != attributes[1]:
+        params.append(bg or "49")
+    turned_off = attributes[2] - flags
+    off = sorted({ATTRIBUTES_OFF[f] for f in turned_off})
+    params += [str(p) for p in off]
+    # 22 turns off bold and dim, turn on again the one that's kept
+    kept = {f for f in flags if ATTRIBUTES_OFF[f] in off}
+    params += [str(f) for f in sorted((flags - attributes[2]) | kept)]
+    if len(";".join(reset)) < len(";".join(params)):
+        params = reset
+    return "\x1b[%sm" % ";".join(params)
+
+
+class LowBandwidthOutput:
+    """A file-like object that takes the place of the terminal stream (both
+    sys.stdout and the stream of the blessed Terminal). end_frame() sends
+    the changes."""
+
+    def __init__(self, term, stream, budget=FRAME_BUDGET):
+        self.term = term
+        self.stream = stream
+        self.budget = budget
+        self.encoding = getattr(stream, "encoding", None) or "utf-8"
+        self.width = term.width
+        self.height = term.height
+        # REP is a xterm extension
+        self._rep = bool(term.rep)
+        # the screen wanted, and the screen of the terminal (None is an
+        # unknown cell)
+        self._screen = [[BLANK] * self.width for _ in range(self.height)]
+        self._terminal = [[None] * self.width for _ in range(self.height)]
+        self._dirty = set(range(self.height))
+        # the state of the written output
+        self._x = self._y = 0
+        self._attributes = DEFAULT_ATTRIBUTES
+        self._acs = False
+        self._saved = (0, 0, DEFAULT_ATTRIBUTES, False)
+        self._wrap = False
+        self._region = (0, self.height - 1)
+        self._pending_input = ""
+        self._last_char = None
+        self._cursor_visible = True
+        # the state of the terminal (the cursor is None when unknown)
+        self._cursor = (None, None)
+        self._cursor_wrap = False
+        self._pen = None
+        self._pen_acs = None
+        self._output = []
+        # bytes written and sent since the last keystroke, and in the last
+        # keystroke that wrote something
+        self.written = self.sent = 0
+        self.last = (0, 0)
+
+    # file-like
+
+    def write(self, text):
+        self.written += len(text.encode(self.encoding, "replace"))
+        s = self._pending_input + text
+        incomplete = INCOMPLETE.search(s)
+        if incomplete:
+            self._pending_input = s[incomplete.start() :]
+            s = s[: incomplete.start()]
+        else:
+            self._pending_input = ""
+        for match in TOKEN.finditer(s):
+            self._token(match)
+        return len(text)
+
+    def flush(self):
+        # the frame is sent by end_frame()
+        pass
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def isatty(self):
+        return self.stream.isatty()
+
+    # the model of the screen
+
+    def _token(self, match):
+        token = match.group(0)
+        if match.group(2):
+            self._csi(match.group(1), match.group(2), token)
+        elif token[0] == "\x1b":
+            self._escape(token)
+        elif token == "\n":
+            self._line_feed()
+            self._x = 0
+        elif token == "\r":
+            self._x, self._wrap = 0, False
+        elif token == "\b":
+            self._x, self._wrap = max(self._x - 1, 0), False
+        elif token < " " or token == "\x7f":
+            self._passthrough(token)
+        else:
+            self._text(token)
+
+    def _text(self, text):
+        self._last_char = text[-1]
+        for char in text:
+            if self._wrap:
+                self._x, self._wrap = 0, False
+                self._line_feed()
+            self._screen[self._y][self._x] = _cell(
+                char, self._acs, self._attributes
+            )
+            self._dirty.add(self._y)
+            if self._x == self.width - 1:
+                self._wrap = True
+            else:
+                self._x += 1
+
+    def _line_feed(self):
+        self._wrap = False
+        if self._y == self._region[1]:
+            self._scroll(1)
+        elif self._y < self.height - 1:
+            self._y += 1
+
+    def _reverse_line_feed(self):
+        self._wrap = False
+        if self._y == self._region[0]:
+            self._scroll(-1)
+        elif self._y > 0:
+            self._y -= 1
+
+    def _scroll(self, lines):
+        """scroll the region of both screens, and the terminal"""
+        top, bottom = self._region
+        if lines > 0:
+            self._move_to(0, bottom)
+            self._send("\n")
+        else:
+            self._move_to(0, top)
+            self._send("\x1bM")
+        for screen in (self._screen, self._terminal):
+            rows = screen[top : bottom + 1]
+            if lines > 0:
+                rows = rows[1:] + [[BLANK] * self.width]
+            else:
+                rows = [[BLANK] * self.width] + rows[:-1]
+            screen[top : bottom + 1] = rows
+        self._dirty.update(range(top, bottom + 1))
+
+    def _csi(self, params, command, token):
+        if params.startswith("?"):
+            if params in ("?1049", "?47", "?1047"):
+                # the alternate screen is blank, the normal screen unknown
+                # (and it's not drawn again)
+                cell = BLANK if command == "h" else None
+                self._screen = [[cell] * self.width for _ in self._screen]
+                self._terminal = [[cell] * self.width for _ in self._screen]
+                self._dirty = set()
+            elif params == "?25":
+                self._cursor_visible = command == "h"
+            self._passthrough(token)
+            return
+        numbers = [int(p) if p.isdigit() else 0 for p in params.split(";")]
+        n = numbers[0] or 1
+        if command in "Hf":
+            row = numbers[0] or 1
+            column = numbers[1] if len(numbers) > 1 and numbers[1] else 1
+            self._goto(column - 1, row - 1)
+        elif command == "G":
+            self._goto(n - 1, self._y)
+        elif command == "d":
+            self._goto(self._x, n - 1)
+        elif command == "A":
+            self._goto(self._x, self._y - n)
+        elif command == "B":
+            self._goto(self._x, self._y + n)
+        elif command == "C":
+            self._goto(self._x + n, self._y)
+        elif command == "D":
+            self._goto(self._x - n, self._y)
+        elif command == "b" and self._last_char:
+            self._text(self._last_char * n)
+        elif command == "m":
+            self._attributes = sgr_attributes(self._attributes, params)
+        elif command == "K":
+            start, end = {1: (0, self._x + 1), 2: (0, self.width)}.get(
+                numbers[0], (self._x, self.width)
+            )
+            self._erase(self._y, start, end)
+        elif command == "J":
+            if numbers[0] == 0:
+                self._erase(self._y, self._x, self.width)
+                rows = range(self._y + 1, self.height)
+            elif numbers[0] == 1:
+                self._erase(self._y, 0, self._x + 1)
+                rows = range(self._y)
+            else:
+                rows = range(self.height)
+            for y in rows:
+                self._erase(y, 0, self.width)
+        elif command == "r":
+            top = numbers[0] or 1
+            bottom = numbers[1] if len(numbers) > 1 and numbers[1] else 0
+            self._region = (top - 1, (bottom or self.height) - 1)
+            self._passthrough(token)
+            # it moves the cursor home
+            self._cursor = (0, 0)
+            self._cursor_wrap = False
+            self._goto(0, 0)
+        else:
+            self._passthrough(token)
+
+    def _escape(self, token):
+        if token == "\x1b7":
+            self._saved = (self._x, self._y, self._attributes, self._acs)
+        elif token == "\x1b8":
+            self._x, self._y, self._attributes, self._acs = self._saved
+            self._wrap = False
+        elif token == SMACS:
+            self._acs = True
+        elif token == RMACS:
+            self._acs = False
+        elif token == "\x1bM":
+            self._reverse_line_feed()
+        elif token == "\x1bD":
+            self._line_feed()
+        elif token == "\x1bE":
+            self._line_feed()
+            self._x = 0
+        else:
+            self._passthrough(token)
+
+    def _goto(self, x, y):
+        self._x = min(max(x, 0), self.width - 1)
+        self._y = min(max(y, 0), self.height - 1)
+        self._wrap = False
+
+    def _erase(self, y, start, end):
+        blank = _cell(" ", False, (None, self._attributes[1], frozenset()))
+        self._screen[y][start:end] = [blank] * (end - start)
+        self._dirty.add(y)
+
+    def resize(self):
+        """the terminal has been resized (the cells out of it are lost)"""
+        width, height = self.term.width, self.term.height
+        for screen, blank in ((self._screen, BLANK), (self._terminal, None)):
+            del screen[height:]
+            for row in screen:
+                del row[width:]
+                row += [blank] * (width - len(row))
+            screen += [[blank] * width for _ in range(height - len(screen))]
+        self.width, self.height = width, height
+        self._region = (0, height - 1)
+        self._goto(self._x, self._y)
+        self._cursor = (None, None)
+        self._dirty = set(range(height))
+
+    # the output to the terminal
+
+    def _passthrough(self, sequence):
+        """send a sequence as it's written (it doesn't change the cells)"""
+        self._send(sequence)
+
+    def _send(self, s):
+        self._output.append(s)
+
+    def _move_to(self, x, y):
+        self._send(self._move(x, y))
+        self._cursor = (x, y)
+        self._cursor_wrap = False
+
+    def _move(self, x, y):
+        """returns the shortest sequence to move the cursor to x, y"""
+        cx, cy = self._cursor
+        if (cx, cy) == (x, y) and not self._cursor_wrap:
+            return ""
+        moves = ["\x1b[%d;%dH" % (y + 1, x + 1) if x else "\x1b[%dH" % (y + 1)]
+        if cx is not None and not self._cursor_wrap:
+            dy = y - cy
+            if dy == 0:
+                moves.append(self._move_x(cx, x, y))
+                moves.append("\r" + self._move_x(0, x, y))
+            else:
+                if dy > 0:
+                    vertical = "\x1b[%dB" % dy if dy > 1 else "\x1b[B"
+                else:
+                    vertical = "\x1b[%dA" % -dy if dy < -1 else "\x1b[A"
+                moves.append(vertical + self._move_x(cx, x, y))
+                # a line feed moves to the first column (ONLCR), and
+                # scrolls at the bottom of the region
+                if 0 < dy <= 3 and not cy <= self._region[1] < y:
+                    moves.append("\n" * dy + self._move_x(0, x, y))
+        return min(moves, key=len)
+
+    def _move_x(self, cx, x, y):
+        """returns the shortest sequence to move the cursor from the column
+        cx to x in the row y"""
+        if cx == x:
+            return ""
+        moves = ["\x1b[%dG" % (x + 1)]
+        if x > cx:
+            moves.append("\x1b[%dC" % (x - cx) if x - cx > 1 else "\x1b[C")
+            cells = self._terminal[y][cx:x]
+            if x - cx < 8 and all(
+                cell is not None and not self._pen_sequence(cell)[0]
+                for cell in cells
+            ):
+                # write the chars that are already there
+                moves.append("".join(cell[0] for cell in cells))
+        else:
+            moves.append("\b" * (cx - x))
+            moves.append("\x1b[%dD" % (cx - x))
+        return min(moves, key=len)
+
+    def _pen_sequence(self, cell):
+        """returns the sequences to change the pen of the terminal to print
+        a cell, and the pen and the charset after them"""
+        char, acs, attributes = cell
+        s = ""
+        pen, pen_acs = self._pen, self._pen_acs
+        if char in ACS_CHARS and acs != pen_acs:
+            s += SMACS if acs else RMACS
+            pen_acs = acs
+        if pen is None or char != " " or UNDERLINE in pen[2] | attributes[2]:
+            new_pen = attributes
+        elif _background(pen) == _background(attributes):
+            new_pen = pen
+        else:
+            # only the background matters, keep the rest of the pen
+            fg, bg, flags = pen
+            flags = flags - {REVERSE}
+            if REVERSE in attributes[2]:
+                new_pen = (attributes[0], bg, flags | {REVERSE})
+            else:
+                new_pen = (fg, attributes[1], flags)
+        return s + sgr(pen, new_pen), new_pen, pen_acs
+
+    def _print_cell(self, cell, count):
+        """print count times a cell at the cursor"""
+        char = cell[0]
+        s, self._pen, self._pen_acs = self._pen_sequence(cell)
+        s += char
+        repeat = count - 1
+        rep = "\x1b[%db" % repeat
+        if self._rep and len(char.encode(self.encoding)) * repeat > len(rep):
+            s += rep
+        else:
+            s += char * repeat
+        x, y = self._cursor
+        self._terminal[y][x : x + count] = [cell] * count
+        if x + count >= self.width:
+            self._cursor = (self.width - 1, y)
+            self._cursor_wrap = True
+        else:
+            self._cursor = (x + count, y)
+        self._send(s)
+
+    def _erase_line(self, y, x):
+        """erase from x to the end of the row, with EL"""
+        self._move_to(x, y)
+        if self._pen is None or _background(self._pen) != ("bg", None):
+            self._send(sgr(self._pen, DEFAULT_ATTRIBUTES))
+            self._pen = DEFAULT_ATTRIBUTES
+        self._send("\x1b[K")
+        self._terminal[y][x:] = [BLANK] * (self.width - x)
+
+    def _update_row(self, y):
+        screen, terminal = self._screen[y], self._terminal[y]
+        # from where the row is blank (erased with EL)
+        blank = self.width
+        while blank > 0 and screen[blank - 1] == BLANK:
+            blank -= 1
+        x = 0
+        while x < self.width:
+            if screen[x] == terminal[x]:
+                x += 1
+                continue
+            if x >= blank and self.width - x > 3:
+                self._erase_line(y, x)
+                return
+            self._move_to(x, y)
+            cell = screen[x]
+            count = 1
+            while (
+                x + count < self.width
+                and screen[x + count] == cell
+                and (x + count < blank or cell != BLANK)
+            ):
+                count += 1
+            self._print_cell(cell, count)
+            x += count
+
+    def end_frame(self, budget=True):
+        """send the changes, up to the byte budget (unless budget is
+        False)"""
+        sent = 0
+        while self._dirty:
+            y = min(self._dirty)
+            self._dirty.discard(y)
+            self._update_row(y)
+            sent += sum(len(s.encode(self.encoding)) for s in self._output)
+            self._write()
+            if budget and self.budget and sent >= self.budget:
+                break
+        # the cursor where it's expected (for the input of text)
+        if self._cursor_visible and not self._dirty:
+            self._move_to(self._x, self._y)
+        self._write()
+
+    def _write(self):
+        s = "".join(self._output)
+        self._output = []
+        if s:
+            self.sent += len(s.encode(self.encoding, "replace"))
+            self.stream.write(s)
+            self.stream.flush()
+
+    @property
+    def pending(self):
+        """True if the last frame is not sent completely"""
+        return bool(self._dirty)
+
+    def keystroke(self):
+        """a key has been pressed, start counting the bytes of the next
+        one"""
+        if self.written:
+            self.last = (self.sent, self.written)
+        self.written = self.sent = 0
+
+    def overlay(self, x, y, text):
+        """print text directly, not counted in the bytes of the keystroke
+        (to report them)"""
+        sent = self.sent
+        for n, char in enumerate(text):
+            if x + n < self.width:
+                self._screen[y][x + n] = _cell(char, False, DEFAULT_ATTRIBUTES)
+        self._update_row(y)
+        self._move_to(self._x, self._y)
+        self._write()
+        self.sent = sent
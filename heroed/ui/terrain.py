@@ -13,6 +13,13 @@ The middle area and the lower area are represented the same way.
 from heroed import hero
 from heroed.utils import Point, clamp
 from heroed.ui.cursor import Cursor
+from heroed.screen import (
+    data_to_screen_width,
+    bytes_to_data,
+    data_to_bytes,
+    data_to_screen_str,
+    bytes_to_screen_str,
+)
 
 
 def data_to_screen_pos(x):
@@ -24,67 +31,6 @@ def data_to_screen_pos(x):
     return x * 3 // 2 + 8
 
 
-def data_to_screen_width(x):
-    """
-    Returns the width at screen of a data position.
-    It can be 1 column or 2 columns.
-    x       data position, from 0 to 31
-    returns screen columns occupied by given data position: 1 or 2.
-    """
-    return x % 2 + 1
-
-
-def bytes_to_data(bytes, reverse_rightside):
-    """
-    The 2 bytes are mirrored and reversed (screens are simmetrical).
-    bytes               2 bytes. 1st byte is "lateral" region, 2nd byte is
-                        "central" region.
-    reverse_rightside   (bool) if must reverse right side. This is set by the
-                        ALT_RIGHTSIDE_BIT, and only used in middle area (not
-                        in upper or lower areas).
-    returns bytearray with 4 bytes (data).
-
-    NOTE: The "normal" behavior is to mirror the rightside, but if
-    reverse_rightside is set, then that is not mirrored.
-    """
-    if reverse_rightside:
-        return bytearray(
-            (
-                bytes[0],
-                int("{:08b}".format(bytes[1])[::-1], 2),  # reverse bits
-                bytes[0],
-                int("{:08b}".format(bytes[1])[::-1], 2),  # reverse bits
-            )
-        )
-    else:
-        return bytearray(
-            (
-                bytes[0],
-                int("{:08b}".format(bytes[1])[::-1], 2),  # reverse bits
-                bytes[1],
-                int("{:08b}".format(bytes[0])[::-1], 2),  # reverse bits
-            )
-        )
-
-
-def data_to_bytes(data):
-    """
-    data    bytearray with 4 bytes (data). It uses bytes 0 and 2
-    returns bytearray with 2 bytes. 1st byte is "lateral" region, 2nd byte
-            is "central" region.
-    NOTE: It is not necesary to know if reverse_rightside was used, because
-    only first 2 bytes of data are used, and these are not affected by
-    reverse_rightside.
-    """
-    return bytearray(
-        (
-            data[0],
-            int("{:08b}".format(data[1])[::-1], 2)
-            # data[2]
-        )
-    )
-
-
 def invert_data_bit(data, bit, reversed_rightside):
     """
     Invert bit of data. This is automatically mirrored to the other half.
@@ -106,45 +52,6 @@ def invert_data_bit(data, bit, reversed_rightside):
             data[b // 8] = data[b // 8] ^ (0b10000000 >> (b % 8))
 
 
-def data_to_screen_str(data, reversed_rightside):
-    """
-    converts data to a string of 0 and 1, ready to print to screen.
-    data                bytearray with 4 bytes (data).
-    reversed_rightside  if reverse_rightside was set in the data. In this case,
-                        right side is offsetted in some specific way.
-    returns string of 64 chars length.
-    """
-    if reversed_rightside:
-        datastr_left = "".join("{:08b}".format(b) for b in data[0:2])
-        datastr_right = "".join("{:08b}".format(b) for b in data[2:4])
-        s = "11111111%s" % "".join(
-            c * data_to_screen_width(pos) for pos, c in enumerate(datastr_left)
-        )
-        s += "111111%s" % "".join(
-            c * data_to_screen_width(pos)
-            for pos, c in enumerate(datastr_right)
-        )
-        s += s[-2:]
-        return s
-    else:
-        datastr = "".join("{:08b}".format(b) for b in data)
-        return "11111111%s11111111" % "".join(
-            c * data_to_screen_width(pos) for pos, c in enumerate(datastr)
-        )
-
-
-def bytes_to_screen_str(bytes, reverse_rightside=False):
-    """
-    converts bytes to a string of 0 and 1, ready to print to screen.
-    bytes               2 bytes
-    reverse_rightside   see bytes_to_data()
-    returns string of 64 chars length.
-    """
-    return data_to_screen_str(
-        bytes_to_data(bytes, reverse_rightside), reverse_rightside
-    )
-
-
 class TerrainCursor(Cursor):
     def __init__(self):
         # (Point) Current cursor position. x is in "data" coords, y is 0 for
@@ -31,7 +31,7 @@ class Signals:
         # TODO: not tested...
         self._connections[signal].remove(fn)
 
-    def emit(self, signal):
-        """run all the functions connected to a signal"""
+    def emit(self, signal, *args):
+        """run all the functions connected to a signal, with the args"""
         for conn in self._connections[signal]:
-            conn()
+            conn(*args)
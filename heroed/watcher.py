@@ -0,0 +1,116 @@
+"""Detect the modifications of a file by other programs.
+
+In Linux, inotify is used (with ctypes), watching the directory of the file,
+so it's detected when the file is written and closed, or replaced by
+another file (renamed over it). Otherwise, the status of the file (size,
+modification time and inode) is polled.
+
+FileWatcher.changed() never blocks, so it's called from the main loop.
+"""
+
+import os
+import time
+import ctypes
+import ctypes.util
+import struct
+
+POLL_INTERVAL = 1.0  # seconds
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _inotify_init(directory):
+    """returns an inotify file descriptor that watches the directory, or
+    None if inotify is not available"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        inotify_init1 = libc.inotify_init1
+        inotify_add_watch = libc.inotify_add_watch
+    except (OSError, AttributeError, TypeError):
+        return None
+    fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+    if (
+        inotify_add_watch(
+            fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        < 0
+    ):
+        os.close(fd)
+        return None
+    return fd
+
+
+class FileWatcher:
+    def __init__(self, filename, poll_interval=POLL_INTERVAL):
+        self.filename = filename
+        self._name = os.fsencode(os.path.basename(filename))
+        self._poll_interval = poll_interval
+        self._fd = _inotify_init(os.path.dirname(os.path.abspath(filename)))
+        # for polling
+        self._status = self._file_status()
+        self._last_poll = time.monotonic()
+
+    @property
+    def uses_inotify(self):
+        return self._fd is not None
+
+    def _file_status(self):
+        try:
+            status = os.stat(self.filename)
+        except OSError:
+            return None
+        return (status.st_size, status.st_mtime_ns, status.st_ino)
+
+    def _read_events(self):
+        """returns True if there are events of the file"""
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if name == self._name or mask & IN_Q_OVERFLOW:
+                    changed = True
+
+    def changed(self):
+        """returns True if the file has been modified since the last call.
+        It's not considered modified while it doesn't exist (it's being
+        replaced).
+        """
+        if self._fd is not None:
+            # the events are reliable, even if the status is the same
+            return self._read_events() and os.path.isfile(self.filename)
+        now = time.monotonic()
+        if now - self._last_poll < self._poll_interval:
+            return False
+        self._last_poll = now
+        status = self._file_status()
+        if status is None or status == self._status:
+            return False
+        self._status = status
+        return True
+
+    def reset(self):
+        """forget the modifications until now (made by this program)"""
+        if self._fd is not None:
+            self._read_events()
+        self._status = self._file_status()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
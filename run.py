@@ -1,3 +1,9 @@
+import multiprocessing
+
 from heroed import main_editor
 
-main_editor()
+if __name__ == "__main__":
+    # the command line tools use a process pool, which in a frozen
+    # executable (PyInstaller) must not run the editor again
+    multiprocessing.freeze_support()
+    main_editor()